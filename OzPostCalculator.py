@@ -1,71 +1,31 @@
-import csv
-import json
-import os
 import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
-import requests
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from tkinter import messagebox, filedialog
 
+from postage_engine import (
+    BatchWriter, CONFIG_PATH, CSV_FIELDS, DEFAULT_API_URL, DEFAULT_MAX_IN_FLIGHT, DEFAULT_RATE_LIMIT,
+    DEFAULT_RATE_TABLE_PATH, EXPORT_FORMATS, HISTORY_PAGE_SIZE, PRICING_MODES, QUOTE_CACHE_PATH,
+    QUOTE_CACHE_TTL, QuoteCache, QuoteEngine, QuoteHistory, cost_value, count_data_rows,
+    describe_error, eta_days, export_history, is_postcode, load_config, make_record, read_batch_rows,
+    save_config, service_combinations, ServiceCatalogue, size_band, validate_parcel,
+)
+from postage_rates import RateTable, RateTableError
+from api_telemetry import PHASES
+
 # ----------------------------
 # App Constants / Defaults
 # ----------------------------
 APP_TITLE = "Postage Calculator"
 THEME = "cyborg"  # Dark theme per your preference
-CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".auspost_postage_calculator.json")
-
-# Default API URL (can be changed in Settings tab)
-DEFAULT_API_URL = "https://digitalapi.auspost.com.au/postage/parcel/domestic"
-
-# Service options grouped logically
-SERVICE_OPTIONS = {
-    "AUS_PARCEL_EXPRESS": [
-        "AUS_PARCEL_EXPRESS_SATCHEL_SMALL",
-        "AUS_PARCEL_EXPRESS_PACKAGE_SMALL",
-        "AUS_PARCEL_EXPRESS_SATCHEL_500G"
-    ],
-    "AUS_PARCEL_REGULAR": [
-        "AUS_PARCEL_REGULAR_SATCHEL_SMALL",
-        "AUS_PARCEL_REGULAR_PACKAGE_SMALL",
-        "AUS_PARCEL_REGULAR_SATCHEL_500G"
-    ]
-}
-
-# CSV Export Header (consistent ordering)
-CSV_FIELDS = [
-    "timestamp", "from_postcode", "to_postcode", "length_cm", "width_cm",
-    "height_cm", "weight_kg", "service_code", "suboption_code", "cost", "eta"
-]
-
-
-# ----------------------------
-# Utility: Config Load/Save
-# ----------------------------
-def load_config():
-    cfg = {
-        "api_key": "",
-        "api_url": DEFAULT_API_URL,
-    }
-    if os.path.exists(CONFIG_PATH):
-        try:
-            with open(CONFIG_PATH, "r", encoding="utf-8") as fh:
-                file_cfg = json.load(fh)
-                cfg.update({k: file_cfg.get(k, v) for k, v in cfg.items()})
-        except Exception:
-            # Keep defaults if file is corrupted
-            pass
-    return cfg
-
-
-def save_config(api_key: str, api_url: str):
-    cfg = {"api_key": api_key.strip(), "api_url": api_url.strip()}
-    try:
-        with open(CONFIG_PATH, "w", encoding="utf-8") as fh:
-            json.dump(cfg, fh, ensure_ascii=False, indent=2)
-        return True, "Settings saved."
-    except Exception as e:
-        return False, f"Failed to save settings: {e}"
+PREVIEW_ROWS = 8   # rows in the Recent Calculations preview
+DIAG_WINDOWS = {"Last 5 minutes": 300, "Last hour": 3600, "Last 24 hours": 24 * 3600}
+DIAG_RECENT_ROWS = 200   # calls listed on the Diagnostics tab
+DIAG_REFRESH_MS = 2000   # while the Diagnostics tab is showing
+DIAG_PHASE_LABELS = {"dns": "DNS", "connect": "Connect", "tls": "TLS", "ttfb": "TTFB", "total": "Total"}
 
 
 # ----------------------------
@@ -75,9 +35,25 @@ class PostageCalculatorApp:
     def __init__(self, root: ttk.Window):
         self.root = root
         self.root.title(APP_TITLE)
-        self.history = []
+        self.history = QuoteHistory()
+        self._hist_oldest_id = None   # keyset cursor for the History tab
+        self._hist_more = True
+        self._hist_loading = False
         self.cfg = load_config()
-        self._api_lock = threading.Lock()
+        cache = QuoteCache()
+        cache.load()
+        self.engine = QuoteEngine(self.cfg.get("api_url", DEFAULT_API_URL), self.cfg.get("api_key", ""),
+                                  self.cfg.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT), cache=cache,
+                                  rate_limit=self.cfg.get("rate_limit", DEFAULT_RATE_LIMIT))
+        self._load_rate_table()
+        self.catalogue = ServiceCatalogue()
+        self.catalogue.load()
+        self._route = None  # (from, to, size band) the service comboboxes currently reflect
+        self._batch_cancel = None  # threading.Event while a batch runs
+        self._export_cancel = None  # threading.Event while a history export runs
+        self._export_win = None  # the open export dialog, if any
+        self._export_thread = None
+        self._closing = False  # set by _on_close: workers must not touch Tk or the history any more
 
         # ------------- Main Layout -------------
         self._build_ui()
@@ -85,6 +61,41 @@ class PostageCalculatorApp:
         # ------------- Key Bindings -------------
         self.root.bind("<Return>", lambda e: self.calculate_postage())
         self.root.bind("<Control-s>", lambda e: self.export_csv())
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # Window is up; refresh the service listing without blocking it
+        if self.catalogue.default_stale():
+            self._fetch_services()
+
+    def _load_rate_table(self):
+        """Compile the configured rate table for local pricing; falls back to API pricing on error."""
+        mode = self.cfg.get("pricing_mode", "api")
+        rates = None
+        if mode != "api":
+            try:
+                rates = RateTable.load(self.cfg.get("rate_table") or DEFAULT_RATE_TABLE_PATH)
+            except RateTableError as e:
+                messagebox.showwarning("Rate Table", f"{e}\n\nUsing the AusPost API instead.")
+                mode = "api"
+        self.engine.set_pricing(mode, rates)
+        return rates
+
+    def _needs_api_key(self):
+        return self.engine.mode != "local"
+
+    def _on_close(self):
+        self._closing = True
+        for ev in (self._batch_cancel, self._export_cancel):
+            if ev is not None:
+                ev.set()
+        if self._export_thread is not None:
+            # It stops at the next row once cancelled; let it finish before the history closes under it
+            self._export_thread.join(timeout=5)
+        self.engine.shutdown()
+        self.engine.cache.save()
+        self.catalogue.save()
+        self.history.close()
+        self.root.destroy()
 
     # ----------------------------------------
     # UI Construction
@@ -97,10 +108,12 @@ class PostageCalculatorApp:
         self.tab_calc = ttk.Frame(self.notebook)
         self.tab_hist = ttk.Frame(self.notebook)
         self.tab_settings = ttk.Frame(self.notebook)
+        self.tab_diag = ttk.Frame(self.notebook)
 
         self.notebook.add(self.tab_calc, text="Calculator")
         self.notebook.add(self.tab_hist, text="History & Export")
         self.notebook.add(self.tab_settings, text="Settings")
+        self.notebook.add(self.tab_diag, text="Diagnostics")
 
         # Status Bar
         self.status_var = ttk.StringVar(value="Ready.")
@@ -111,6 +124,7 @@ class PostageCalculatorApp:
         self._build_calculator_tab()
         self._build_history_tab()
         self._build_settings_tab()
+        self._build_diagnostics_tab()
 
     def _build_calculator_tab(self):
         # Horizontal Paned Layout: Left (Form), Right (Result/Preview)
@@ -138,6 +152,8 @@ class PostageCalculatorApp:
 
         self._add_labeled_entry(addr_grp, "From Postcode:*", self.var_from, col=0, row=0, width=12)
         self._add_labeled_entry(addr_grp, "To Postcode:*", self.var_to, col=1, row=0, width=12)
+        self.var_from.trace_add("write", self._route_changed)
+        self.var_to.trace_add("write", self._route_changed)
 
         # Group: Package
         pkg_grp = ttk.Labelframe(left_inner, text="Package (Dimensions in cm, Weight in kg)", padding=10)
@@ -152,6 +168,8 @@ class PostageCalculatorApp:
         self._add_labeled_entry(pkg_grp, "Width:*", self.var_wid, col=1, row=0, width=10)
         self._add_labeled_entry(pkg_grp, "Height:*", self.var_hei, col=2, row=0, width=10)
         self._add_labeled_entry(pkg_grp, "Weight:*", self.var_wei, col=0, row=1, width=10)
+        for v in (self.var_len, self.var_wid, self.var_hei, self.var_wei):
+            v.trace_add("write", self._route_changed)  # the size band picks the service listing too
 
         # Group: Service
         svc_grp = ttk.Labelframe(left_inner, text="Service", padding=10)
@@ -159,7 +177,7 @@ class PostageCalculatorApp:
 
         ttk.Label(svc_grp, text="Service Code:*").grid(row=0, column=0, sticky=W, padx=(0, 6), pady=4)
         self.service_code = ttk.Combobox(svc_grp, state="readonly", width=34)
-        self.service_code["values"] = list(SERVICE_OPTIONS.keys())
+        self.service_code["values"] = list(self.catalogue.default)
         self.service_code.bind("<<ComboboxSelected>>", self.update_suboptions)
         self.service_code.grid(row=0, column=1, sticky=EW, pady=4)
 
@@ -176,8 +194,32 @@ class PostageCalculatorApp:
         self.btn_calc = ttk.Button(btn_row, text="Calculate Postage", bootstyle=PRIMARY, command=self.calculate_postage)
         self.btn_calc.pack(side=LEFT)
 
+        ttk.Button(btn_row, text="Compare All Services", bootstyle=INFO,
+                   command=self.compare_services).pack(side=LEFT, padx=(8, 0))
         ttk.Button(btn_row, text="Clear Form", bootstyle=SECONDARY, command=self._clear_form).pack(side=LEFT, padx=8)
 
+        self.var_bypass_cache = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_row, text="Bypass cache", variable=self.var_bypass_cache,
+                        bootstyle="round-toggle").pack(side=LEFT, padx=8)
+
+        # Batch quoting
+        batch_grp = ttk.Labelframe(left_inner, text="Batch Quote (CSV)", padding=10)
+        batch_grp.pack(fill=X, pady=(12, 0))
+
+        batch_btns = ttk.Frame(batch_grp)
+        batch_btns.pack(fill=X)
+        self.btn_batch = ttk.Button(batch_btns, text="Quote CSV...", bootstyle=INFO, command=self.batch_quote_csv)
+        self.btn_batch.pack(side=LEFT)
+        self.btn_batch_cancel = ttk.Button(batch_btns, text="Cancel", bootstyle=DANGER, state=DISABLED,
+                                           command=self.cancel_batch)
+        self.btn_batch_cancel.pack(side=LEFT, padx=8)
+
+        self.batch_progress = ttk.Progressbar(batch_grp, mode="determinate", bootstyle=INFO)
+        self.batch_progress.pack(fill=X, pady=(8, 0))
+        self.batch_status = ttk.StringVar(value="Columns: from_postcode, to_postcode, length_cm, width_cm, "
+                                                "height_cm, weight_kg, service_code, suboption_code")
+        ttk.Label(batch_grp, textvariable=self.batch_status, bootstyle=SECONDARY, wraplength=420).pack(anchor=W, pady=(4, 0))
+
         # --- Right: Results / Preview ---
         right_inner = ttk.Frame(right, padding=10)
         right_inner.pack(fill=BOTH, expand=True)
@@ -226,25 +268,35 @@ class PostageCalculatorApp:
 
         cols = ("timestamp", "from_postcode", "to_postcode", "length_cm", "width_cm",
                 "height_cm", "weight_kg", "service_code", "suboption_code", "cost", "eta")
-        self.history_tree = ttk.Treeview(outer, columns=cols, show="headings", bootstyle=PRIMARY)
+        tree_frame = ttk.Frame(outer)
+        tree_frame.pack(fill=BOTH, expand=True)
+        self.history_tree = ttk.Treeview(tree_frame, columns=cols, show="headings", bootstyle=PRIMARY)
         for c in cols:
             self.history_tree.heading(c, text=c.replace("_", " ").title())
         # Column widths
         widths = [140, 80, 80, 80, 80, 80, 80, 170, 170, 80, 120]
         for c, w in zip(cols, widths):
             self.history_tree.column(c, width=w, anchor=W)
-        self.history_tree.pack(fill=BOTH, expand=True)
+        self.history_scroll = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.history_tree.yview)
+        self.history_tree.configure(yscrollcommand=self._on_history_scroll)
+        self.history_scroll.pack(side=RIGHT, fill=Y)
+        self.history_tree.pack(side=LEFT, fill=BOTH, expand=True)
 
         btn_row = ttk.Frame(outer)
         btn_row.pack(fill=X, pady=(10, 0))
 
         ttk.Button(btn_row, text="Recalculate Selected", bootstyle=INFO, command=self.recalculate_selected).pack(side=LEFT)
         ttk.Button(btn_row, text="Copy Selected", bootstyle=SECONDARY, command=self.copy_selected_to_clipboard).pack(side=LEFT, padx=8)
-        ttk.Button(btn_row, text="Export to CSV", bootstyle=SUCCESS, command=self.export_csv).pack(side=LEFT, padx=8)
+        ttk.Button(btn_row, text="Export...", bootstyle=SUCCESS, command=self.export_csv).pack(side=LEFT, padx=8)
         ttk.Button(btn_row, text="Clear History", bootstyle=DANGER, command=self.clear_history).pack(side=LEFT, padx=8)
 
-        hint = ttk.Label(outer, text="Shortcut: Ctrl+S to export CSV", bootstyle=SECONDARY)
-        hint.pack(anchor=E, pady=(6, 0))
+        footer = ttk.Frame(outer)
+        footer.pack(fill=X, pady=(6, 0))
+        self.history_count_var = ttk.StringVar(value="")
+        ttk.Label(footer, textvariable=self.history_count_var, bootstyle=SECONDARY).pack(side=LEFT)
+        hint = ttk.Label(footer, text="Shortcut: Ctrl+S to export history", bootstyle=SECONDARY)
+        hint.pack(side=RIGHT)
+        self._reload_history()
 
     def _build_settings_tab(self):
         outer = ttk.Frame(self.tab_settings, padding=12)
@@ -261,10 +313,18 @@ class PostageCalculatorApp:
         self.var_api_key = ttk.StringVar(value=self.cfg.get("api_key", ""))
         ttk.Entry(api_grp, textvariable=self.var_api_key, show="•").grid(row=1, column=1, sticky=EW, pady=4)
 
+        ttk.Label(api_grp, text="Max Concurrent Requests:").grid(row=2, column=0, sticky=W, pady=4)
+        self.var_max_in_flight = ttk.IntVar(value=self.cfg.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+        ttk.Spinbox(api_grp, from_=1, to=32, textvariable=self.var_max_in_flight, width=6).grid(row=2, column=1, sticky=W, pady=4)
+
+        ttk.Label(api_grp, text="Rate Limit (req/s, 0 = off):").grid(row=3, column=0, sticky=W, pady=4)
+        self.var_rate_limit = ttk.StringVar(value=str(self.cfg.get("rate_limit", DEFAULT_RATE_LIMIT)))
+        ttk.Entry(api_grp, textvariable=self.var_rate_limit, width=8).grid(row=3, column=1, sticky=W, pady=4)
+
         api_grp.columnconfigure(1, weight=1)
 
         btn_row = ttk.Frame(api_grp)
-        btn_row.grid(row=2, column=0, columnspan=2, sticky=E, pady=(6, 0))
+        btn_row.grid(row=4, column=0, columnspan=2, sticky=E, pady=(6, 0))
 
         ttk.Button(btn_row, text="Save", bootstyle=SUCCESS, command=self.save_settings).pack(side=LEFT, padx=(0, 8))
         ttk.Button(btn_row, text="Test Connection", bootstyle=INFO, command=self.test_connection).pack(side=LEFT)
@@ -274,6 +334,81 @@ class PostageCalculatorApp:
                          bootstyle=SECONDARY, anchor=W)
         info.pack(fill=X, pady=(8, 0))
 
+        pricing_grp = ttk.Labelframe(outer, text="Pricing", padding=12)
+        pricing_grp.pack(fill=X, pady=(12, 0))
+        ttk.Label(pricing_grp, text="Quote With:").grid(row=0, column=0, sticky=W, pady=4)
+        self.var_pricing_mode = ttk.StringVar(value=PRICING_MODES[self.engine.mode])
+        ttk.Combobox(pricing_grp, textvariable=self.var_pricing_mode, values=list(PRICING_MODES.values()),
+                     state="readonly").grid(row=0, column=1, sticky=EW, pady=4)
+        ttk.Label(pricing_grp, text="Rate Table:").grid(row=1, column=0, sticky=W, pady=4)
+        self.var_rate_table = ttk.StringVar(value=self.cfg.get("rate_table") or DEFAULT_RATE_TABLE_PATH)
+        ttk.Entry(pricing_grp, textvariable=self.var_rate_table).grid(row=1, column=1, sticky=EW, pady=4)
+        ttk.Button(pricing_grp, text="Browse...", bootstyle=SECONDARY,
+                   command=self._browse_rate_table).grid(row=1, column=2, padx=(8, 0), pady=4)
+        ttk.Button(pricing_grp, text="Reload Table", bootstyle=INFO,
+                   command=self.reload_rate_table).grid(row=0, column=2, padx=(8, 0), pady=4)
+        self.pricing_stats_var = ttk.StringVar(value="")
+        ttk.Label(pricing_grp, textvariable=self.pricing_stats_var, bootstyle=SECONDARY).grid(
+            row=2, column=0, columnspan=3, sticky=W, pady=(4, 0))
+        pricing_grp.columnconfigure(1, weight=1)
+
+        cache_grp = ttk.Labelframe(outer, text="Quote Cache", padding=12)
+        cache_grp.pack(fill=X, pady=(12, 0))
+        self.cache_stats_var = ttk.StringVar(value="")
+        ttk.Label(cache_grp, textvariable=self.cache_stats_var).pack(side=LEFT)
+        ttk.Button(cache_grp, text="Clear Cache", bootstyle=DANGER, command=self.clear_quote_cache).pack(side=RIGHT)
+        ttk.Label(outer, text=f"Cache file: {QUOTE_CACHE_PATH} (entries expire after {QUOTE_CACHE_TTL // 3600} h)",
+                  bootstyle=SECONDARY, anchor=W).pack(fill=X, pady=(8, 0))
+        self._refresh_cache_stats()
+
+    def _build_diagnostics_tab(self):
+        outer = ttk.Frame(self.tab_diag, padding=10)
+        outer.pack(fill=BOTH, expand=True)
+
+        top = ttk.Frame(outer)
+        top.pack(fill=X)
+        ttk.Label(top, text="Window:").pack(side=LEFT)
+        self.var_diag_window = ttk.StringVar(value=next(iter(DIAG_WINDOWS)))
+        cb = ttk.Combobox(top, textvariable=self.var_diag_window, values=list(DIAG_WINDOWS), state="readonly", width=16)
+        cb.pack(side=LEFT, padx=(6, 12))
+        cb.bind("<<ComboboxSelected>>", lambda e: self._refresh_diagnostics(force=True))
+        ttk.Button(top, text="Refresh", bootstyle=INFO,
+                   command=lambda: self._refresh_diagnostics(force=True)).pack(side=LEFT)
+        ttk.Button(top, text="Export...", bootstyle=SUCCESS, command=self.export_diagnostics).pack(side=LEFT, padx=8)
+        ttk.Button(top, text="Reset", bootstyle=DANGER, command=self.reset_diagnostics).pack(side=LEFT)
+
+        self.diag_summary_var = ttk.StringVar(value="")
+        ttk.Label(outer, textvariable=self.diag_summary_var, anchor=W).pack(fill=X, pady=(8, 4))
+
+        cols = ("Phase", "Calls", "Mean", "p50", "p90", "p99", "Max")
+        self.diag_phase_tree = ttk.Treeview(outer, columns=cols, show="headings", height=len(PHASES),
+                                            bootstyle=PRIMARY)
+        for c in cols:
+            self.diag_phase_tree.heading(c, text=c)
+            self.diag_phase_tree.column(c, width=90, anchor=W if c == "Phase" else E)
+        self.diag_phase_tree.pack(fill=X)
+        ttk.Label(outer, text="Times in ms; p50/p90/p99 are estimates from latency buckets. DNS/Connect/TLS "
+                              "only count calls that opened a connection; TTFB and Total are measured from "
+                              "the start of the request.",
+                  bootstyle=SECONDARY, anchor=W).pack(fill=X, pady=(4, 8))
+
+        cols = ("time", "call", "status", "reused", "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms",
+                "bytes", "error")
+        tree_frame = ttk.Frame(outer)
+        tree_frame.pack(fill=BOTH, expand=True)
+        self.diag_calls_tree = ttk.Treeview(tree_frame, columns=cols, show="headings", bootstyle=PRIMARY)
+        widths = [140, 110, 60, 60, 70, 80, 70, 70, 70, 70, 140]
+        for c, w in zip(cols, widths):
+            self.diag_calls_tree.heading(c, text=c.replace("_ms", "").replace("_", " ").title())
+            self.diag_calls_tree.column(c, width=w, anchor=W)
+        scroll = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.diag_calls_tree.yview)
+        self.diag_calls_tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=RIGHT, fill=Y)
+        self.diag_calls_tree.pack(side=LEFT, fill=BOTH, expand=True)
+
+        self._diag_seen = None  # telemetry.total at the last redraw
+        self.root.after(DIAG_REFRESH_MS, self._tick_diagnostics)
+
     # ----------------------------------------
     # UI Helpers
     # ----------------------------------------
@@ -298,61 +433,11 @@ class PostageCalculatorApp:
     # ----------------------------------------
     def _validate_inputs(self):
         # Required: from, to, length, width, height, weight, service_code
-        from_pc = self.var_from.get().strip()
-        to_pc = self.var_to.get().strip()
-        length = self.var_len.get().strip()
-        width = self.var_wid.get().strip()
-        height = self.var_hei.get().strip()
-        weight = self.var_wei.get().strip()
-        svc = self.service_code.get().strip()
-        subopt = self.suboption_code.get().strip()
-
-        # Postcode validation (AU: 4 digits)
-        def is_postcode(pc):
-            return pc.isdigit() and len(pc) == 4
-
-        errors = []
-        if not is_postcode(from_pc):
-            errors.append("From Postcode must be 4 digits.")
-        if not is_postcode(to_pc):
-            errors.append("To Postcode must be 4 digits.")
-
-        def parse_positive_float(name, val):
-            try:
-                f = float(val)
-                if f <= 0:
-                    raise ValueError
-                return f
-            except Exception:
-                errors.append(f"{name} must be a positive number.")
-                return None
-
-        l = parse_positive_float("Length", length)
-        w = parse_positive_float("Width", width)
-        h = parse_positive_float("Height", height)
-        kg = parse_positive_float("Weight (kg)", weight)
-
-        if not svc:
-            errors.append("Service Code is required.")
-
-        if errors:
-            return None, errors
-
-        grams = int(round(kg * 1000))  # Convert kg → grams
-
-        payload = {
-            "from_postcode": from_pc,
-            "to_postcode": to_pc,
-            "length": l,
-            "width": w,
-            "height": h,
-            "weight": str(grams),  # API expects grams as string
-            "service_code": svc
-        }
-        if subopt:
-            payload["suboption_code"] = subopt
-
-        return payload, None
+        return validate_parcel(
+            self.var_from.get(), self.var_to.get(),
+            self.var_len.get(), self.var_wid.get(), self.var_hei.get(), self.var_wei.get(),
+            self.service_code.get(), self.suboption_code.get(),
+        )
 
     # ----------------------------------------
     # API Interaction
@@ -365,55 +450,27 @@ class PostageCalculatorApp:
 
         api_key = self.var_api_key.get().strip()
         api_url = self.var_api_url.get().strip() or DEFAULT_API_URL
-        if not api_key:
+        if not api_key and self._needs_api_key():
             messagebox.showwarning("Missing API Key", "Please set your API key in Settings.")
             self.notebook.select(self.tab_settings)
             return
 
-        headers = {"AUTH-KEY": api_key}
         self.btn_calc.config(state=DISABLED)
         self.status_var.set("Calculating...")
 
-        def worker():
+        def done(fut):
+            # Runs on a pool thread (or inline for cache hits); update UI in main thread
             try:
-                with self._api_lock:
-                    r = requests.get(api_url, headers=headers, params={
-                        # The API expects numeric params as strings; convert precisely
-                        "from_postcode": payload["from_postcode"],
-                        "to_postcode": payload["to_postcode"],
-                        "length": str(payload["length"]),
-                        "width": str(payload["width"]),
-                        "height": str(payload["height"]),
-                        "weight": payload["weight"],
-                        "service_code": payload["service_code"],
-                        **({"suboption_code": payload["suboption_code"]} if "suboption_code" in payload else {})
-                    }, timeout=20)
-
-                r.raise_for_status()
-                # Robust JSON parsing
-                try:
-                    data = r.json()
-                except Exception:
-                    raise ValueError("Invalid JSON response from API.")
-
-                # The AusPost response typically nests under 'postage_result'
-                res = data.get("postage_result", data)
-                cost = res.get("total_cost") or res.get("cost") or "N/A"
-                eta = res.get("delivery_time") or res.get("eta") or "No ETA"
-
-                # Update UI in main thread
-                self.root.after(0, self._handle_success, payload, cost, eta)
-            except requests.HTTPError as e:
-                body = e.response.text if hasattr(e, "response") and e.response is not None else str(e)
-                self.root.after(0, self._handle_error, f"HTTP Error: {e}\n{body}")
-            except requests.Timeout:
-                self.root.after(0, self._handle_error, "Request timed out. Please try again.")
+                cost, eta = fut.result()
+                self.root.after(0, self._handle_success, payload, cost, eta, fut.source)
             except Exception as e:
-                self.root.after(0, self._handle_error, f"API Error: {e}")
+                self.root.after(0, self._handle_error, describe_error(e))
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.engine.configure(api_url, api_key)
+        self.engine.quote(self.catalogue.with_option(payload),
+                          use_cache=not self.var_bypass_cache.get()).add_done_callback(done)
 
-    def _handle_success(self, payload, cost, eta):
+    def _handle_success(self, payload, cost, eta, source="api"):
         self.btn_calc.config(state=NORMAL)
         self.result_cost.set(f"${cost}")
         self.result_eta.set(eta)
@@ -421,25 +478,255 @@ class PostageCalculatorApp:
         sub = payload.get("suboption_code", "")
         svc_label = f"{svc}" + (f" → {sub}" if sub else "")
         self.result_service.set(svc_label)
-        self.status_var.set("Calculation complete.")
+        self.status_var.set({"cache": "Calculation complete (cached).",
+                             "local": "Calculation complete (local rates)."}.get(source, "Calculation complete."))
+        self._refresh_cache_stats()
 
         # Add to history
-        record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "from_postcode": payload["from_postcode"],
-            "to_postcode": payload["to_postcode"],
-            "length_cm": payload["length"],
-            "width_cm": payload["width"],
-            "height_cm": payload["height"],
-            "weight_kg": round(int(payload["weight"]) / 1000, 3),
-            "service_code": payload["service_code"],
-            "suboption_code": payload.get("suboption_code", ""),
-            "cost": cost,
-            "eta": eta
-        }
-        self.history.append(record)
-        self._refresh_preview()
-        self._refresh_history_tree([record])  # Append last one
+        record = self.history.add(make_record(payload, cost, eta))
+        self._add_history_rows(record)
+
+    # ----------------------------------------
+    # Compare All Services
+    # ----------------------------------------
+    def compare_services(self):
+        """Quote the parcel for every service/suboption at once; rows fill in as results arrive."""
+        services = self._route_services()
+        payload, errors = validate_parcel(self.var_from.get(), self.var_to.get(), self.var_len.get(),
+                                          self.var_wid.get(), self.var_hei.get(), self.var_wei.get(),
+                                          self.service_code.get() or next(iter(services), ""))
+        if errors:
+            messagebox.showwarning("Validation Error", "\n".join(errors))
+            return
+        api_key = self.var_api_key.get().strip()
+        api_url = self.var_api_url.get().strip() or DEFAULT_API_URL
+        if not api_key and self._needs_api_key():
+            messagebox.showwarning("Missing API Key", "Please set your API key in Settings.")
+            self.notebook.select(self.tab_settings)
+            return
+
+        win = ttk.Toplevel(self.root)
+        win.title(f"Compare Services: {payload['from_postcode']} → {payload['to_postcode']}, "
+                  f"{int(payload['weight']) / 1000:g} kg")
+        win.transient(self.root)
+        frm = ttk.Frame(win, padding=12)
+        frm.pack(fill=BOTH, expand=True)
+
+        cols = ("service_code", "suboption_code", "cost", "eta", "status")
+        tree = ttk.Treeview(frm, columns=cols, show="headings", height=10, bootstyle=INFO)
+        for c, w, anchor in zip(cols, (190, 260, 80, 160, 110), (W, W, E, W, W)):
+            tree.column(c, width=w, anchor=anchor)
+        tree.tag_configure("cheapest", foreground="#00bc8c")
+        tree.tag_configure("fastest", foreground="#3498db")
+        tree.tag_configure("best", foreground="#f39c12")
+        tree.pack(fill=BOTH, expand=True)
+        summary = ttk.StringVar(value="Quoting...")
+        ttk.Label(frm, textvariable=summary, bootstyle=SECONDARY).pack(anchor=W, pady=(6, 0))
+        ttk.Label(frm, text="Green = cheapest, blue = fastest, orange = both. Click a heading to sort.",
+                  bootstyle=SECONDARY).pack(anchor=W)
+
+        results = {}   # iid -> {"cost", "eta", "status"}
+        combos = service_combinations(services)
+        for svc, sub in combos:
+            iid = f"{svc}|{sub}"
+            results[iid] = {"cost": None, "eta": "", "status": "Pending"}
+            tree.insert("", "end", iid=iid, values=(svc, sub or "—", "", "", "Pending"))
+        sort_state = {"col": None, "reverse": False}
+        t0 = time.perf_counter()
+
+        def highlight():
+            priced = {k: r for k, r in results.items() if cost_value(r["cost"]) is not None}
+            cheapest = min((cost_value(r["cost"]) for r in priced.values()), default=None)
+            days = [eta_days(r["eta"]) for r in priced.values()]
+            fastest = min((d for d in days if d is not None), default=None)
+            for iid, r in results.items():
+                is_cheap = iid in priced and cost_value(r["cost"]) == cheapest
+                is_fast = iid in priced and fastest is not None and eta_days(r["eta"]) == fastest
+                tags = ("best",) if is_cheap and is_fast else ("cheapest",) if is_cheap else \
+                    ("fastest",) if is_fast else ()
+                tree.item(iid, tags=tags)
+
+        def sort_by(col):
+            reverse = sort_state["col"] == col and not sort_state["reverse"]
+            sort_state.update(col=col, reverse=reverse)
+
+            def key(iid):
+                r = results[iid]
+                if col == "cost":
+                    v = cost_value(r["cost"])
+                elif col == "eta":
+                    v = eta_days(r["eta"])
+                else:
+                    v = tree.set(iid, col)
+                return (v is None, v if v is not None else 0)
+            for i, iid in enumerate(sorted(results, key=key, reverse=reverse)):
+                tree.move(iid, "", i)
+
+        for c in cols:
+            tree.heading(c, text=c.replace("_", " ").title(), command=lambda c=c: sort_by(c))
+
+        def arrived(iid, cost, eta, status):
+            if not win.winfo_exists():
+                return
+            results[iid].update(cost=cost, eta=eta, status=status)
+            svc, sub = iid.split("|", 1)
+            tree.item(iid, values=(svc, sub or "—", f"${cost}" if cost is not None else "", eta, status))
+            highlight()
+            if sort_state["col"]:
+                sort_state["reverse"] = not sort_state["reverse"]  # re-apply the same order
+                sort_by(sort_state["col"])
+            pending = sum(r["status"] == "Pending" for r in results.values())
+            ok = sum(cost_value(r["cost"]) is not None for r in results.values())
+            summary.set(f"{len(results) - pending}/{len(results)} done, {ok} priced "
+                        f"in {time.perf_counter() - t0:.2f}s" + ("" if pending else "."))
+
+        def use_selected():
+            sel = tree.selection()
+            if not sel:
+                return
+            svc, sub = sel[0].split("|", 1)
+            self.service_code.set(svc)
+            self.update_suboptions()
+            self.suboption_code.set(sub)
+            win.destroy()
+
+        ttk.Button(frm, text="Use Selected Service", bootstyle=PRIMARY, command=use_selected).pack(anchor=E, pady=(6, 0))
+
+        self.engine.configure(api_url, api_key)
+        use_cache = not self.var_bypass_cache.get()
+        for svc, sub in combos:
+            p = dict(payload, service_code=svc)
+            if sub:
+                p = self.catalogue.with_option(dict(p, suboption_code=sub))
+
+            def done(fut, iid=f"{svc}|{sub}"):
+                try:
+                    cost, eta = fut.result()
+                    self.root.after(0, arrived, iid, cost, eta,
+                                    {"cache": "Cached", "local": "Local rates"}.get(fut.source, "API"))
+                except Exception as e:
+                    msg = describe_error(e).split("\n")[0]
+                    self.root.after(0, arrived, iid, None, msg, "Failed")
+
+            self.engine.quote(p, use_cache=use_cache).add_done_callback(done)
+
+    # ----------------------------------------
+    # Batch Quoting
+    # ----------------------------------------
+    def batch_quote_csv(self):
+        if self._batch_cancel is not None:
+            return
+        api_key = self.var_api_key.get().strip()
+        api_url = self.var_api_url.get().strip() or DEFAULT_API_URL
+        if not api_key and self._needs_api_key():
+            messagebox.showwarning("Missing API Key", "Please set your API key in Settings.")
+            self.notebook.select(self.tab_settings)
+            return
+        src = filedialog.askopenfilename(title="Select parcels CSV",
+                                         filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not src:
+            return
+        out = filedialog.asksaveasfilename(title="Save quotes CSV", defaultextension=".csv",
+                                           filetypes=[("CSV files", "*.csv")])
+        if not out:
+            return
+
+        cancel = self._batch_cancel = threading.Event()
+        use_cache = not self.var_bypass_cache.get()
+        self.btn_batch.config(state=DISABLED)
+        self.btn_batch_cancel.config(state=NORMAL)
+        self.batch_progress.config(value=0, maximum=1)
+        self.status_var.set("Batch quoting...")
+
+        def worker():
+            writer = None
+            t0 = time.perf_counter()
+            done = 0
+            last_ui = 0.0
+            try:
+                total = count_data_rows(src)
+                self.root.after(0, lambda: self.batch_progress.config(maximum=max(total, 1)))
+                self.engine.configure(api_url, api_key)
+                writer = BatchWriter(out)
+                # Keep a small window of calls in flight; results are written
+                # here (one thread) in completion order.
+                window = self.engine.max_in_flight * 2
+                pending = {}  # future -> (line_no, raw, payload)
+
+                def drain(block):
+                    nonlocal done, last_ui
+                    if not pending:
+                        return
+                    finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        line_no, raw, payload = pending.pop(fut)
+                        try:
+                            cost, eta = fut.result()
+                            writer.write(make_record(payload, cost, eta))
+                        except Exception as e:
+                            writer.fail(line_no, describe_error(e).replace("\n", " "), raw)
+                        done += 1
+                    now = time.perf_counter()
+                    if now - last_ui >= 0.25:  # throttle UI updates
+                        last_ui = now
+                        self.root.after(0, self._batch_progress_update, done, total, writer.failed, now - t0)
+
+                for line_no, raw, payload, errors in read_batch_rows(src):
+                    if cancel.is_set():
+                        break
+                    if errors:
+                        writer.fail(line_no, "; ".join(errors), raw)
+                        done += 1
+                        continue
+                    quote = self.engine.quote(self.catalogue.with_option(payload), use_cache=use_cache)
+                    pending[quote] = (line_no, raw, payload)
+                    drain(block=len(pending) >= window)
+                while pending:
+                    if cancel.is_set():
+                        for fut in pending:
+                            fut.cancel()
+                        break
+                    drain(block=True)
+            except Exception as e:
+                msg = f"Batch failed: {e}"
+                self.root.after(0, lambda: messagebox.showerror("Batch Quote", msg))
+            finally:
+                if writer is not None:
+                    writer.close()
+                elapsed = time.perf_counter() - t0
+                self.root.after(0, self._batch_finished, writer, done, elapsed, cancel.is_set())
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def cancel_batch(self):
+        if self._batch_cancel is not None:
+            self._batch_cancel.set()
+            self.batch_status.set("Cancelling...")
+
+    def _batch_progress_update(self, done, total, failed, elapsed):
+        rate = done / elapsed if elapsed > 0 else 0.0
+        self.batch_progress.config(value=done)
+        self.batch_status.set(f"{done:,}/{total:,} rows  |  {rate:.1f} rows/s  |  {failed:,} failed")
+
+    def _batch_finished(self, writer, done, elapsed, cancelled):
+        self._batch_cancel = None
+        self._refresh_cache_stats()
+        self.engine.submit(self.engine.cache.save)
+        self.btn_batch.config(state=NORMAL)
+        self.btn_batch_cancel.config(state=DISABLED)
+        if writer is None:
+            self.status_var.set("Batch failed.")
+            return
+        self.batch_progress.config(value=done)
+        rate = done / elapsed if elapsed > 0 else 0.0
+        summary = (f"{'Cancelled' if cancelled else 'Done'}: {writer.ok:,} quoted, {writer.failed:,} failed "
+                   f"in {elapsed:.1f}s ({rate:.1f} rows/s)")
+        self.batch_status.set(summary)
+        self.status_var.set(f"Batch quotes written to {writer.out_path}")
+        detail = f"{summary}\n\nQuotes: {writer.out_path}"
+        if writer.failed:
+            detail += f"\nFailures: {writer.fail_path}"
+        messagebox.showinfo("Batch Quote", detail)
 
     def _handle_error(self, msg):
         self.btn_calc.config(state=NORMAL)
@@ -449,58 +736,185 @@ class PostageCalculatorApp:
     # ----------------------------------------
     # History Management
     # ----------------------------------------
-    def _refresh_preview(self):
-        # Show last 8 results in preview
-        for i in self.preview_tree.get_children():
-            self.preview_tree.delete(i)
-        for rec in self.history[-8:]:
-            self.preview_tree.insert("", "end", values=(
-                rec["timestamp"], rec["from_postcode"], rec["to_postcode"],
+    # Both trees show newest first. New quotes are inserted at the top; the
+    # History tab pulls older pages from the store as it is scrolled.
+    def _preview_values(self, rec):
+        return (rec["timestamp"], rec["from_postcode"], rec["to_postcode"],
                 f"{rec['service_code']}" + (f"→{rec['suboption_code']}" if rec['suboption_code'] else ""),
-                f"${rec['cost']}", rec["eta"]
-            ))
-
-    def _refresh_history_tree(self, new_records=None):
-        # If new_records provided, append; else rebuild entirely
-        if new_records:
-            for rec in new_records:
-                self.history_tree.insert("", "end", values=tuple(rec.get(k, "") for k in CSV_FIELDS))
-        else:
-            for i in self.history_tree.get_children():
-                self.history_tree.delete(i)
-            for rec in self.history:
-                self.history_tree.insert("", "end", values=tuple(rec.get(k, "") for k in CSV_FIELDS))
+                f"${rec['cost']}", rec["eta"])
+
+    def _add_history_rows(self, rec):
+        self.preview_tree.insert("", 0, values=self._preview_values(rec))
+        for iid in self.preview_tree.get_children()[PREVIEW_ROWS:]:
+            self.preview_tree.delete(iid)
+        self.history_tree.insert("", 0, iid=str(rec["id"]), values=tuple(rec.get(k, "") for k in CSV_FIELDS))
+        if self._hist_oldest_id is None:
+            self._hist_oldest_id = rec["id"]
+        self._update_history_count()
+
+    def _reload_history(self):
+        self.preview_tree.delete(*self.preview_tree.get_children())
+        self.history_tree.delete(*self.history_tree.get_children())
+        self._hist_oldest_id = None
+        self._hist_more = True
+        for rec in self.history.page(limit=PREVIEW_ROWS):
+            self.preview_tree.insert("", "end", values=self._preview_values(rec))
+        self._load_history_page()
+        self._update_history_count()
+
+    def _load_history_page(self):
+        self._hist_loading = False
+        if not self._hist_more:
+            return
+        rows = self.history.page(self._hist_oldest_id, HISTORY_PAGE_SIZE)
+        for rec in rows:
+            self.history_tree.insert("", "end", iid=str(rec["id"]), values=tuple(rec.get(k, "") for k in CSV_FIELDS))
+        if rows:
+            self._hist_oldest_id = rows[-1]["id"]
+        self._hist_more = len(rows) == HISTORY_PAGE_SIZE
+
+    def _on_history_scroll(self, first, last):
+        self.history_scroll.set(first, last)
+        if float(last) > 0.9 and self._hist_more and not self._hist_loading:
+            self._hist_loading = True
+            self.root.after_idle(self._load_history_page)
+
+    def _update_history_count(self):
+        self.history_count_var.set(f"{self.history.count():,} quotes stored in {self.history.path}")
 
     def clear_history(self):
-        if not self.history:
+        if not self.history.count():
             messagebox.showinfo("Clear History", "No entries to clear.")
             return
         if messagebox.askyesno("Clear History", "Are you sure you want to clear all history?"):
             self.history.clear()
-            self._refresh_preview()
-            self._refresh_history_tree()
+            self._reload_history()
             self.status_var.set("History cleared.")
 
     def export_csv(self):
-        if not self.history:
-            messagebox.showinfo("Export", "No history to export.")
+        """Export dialog: filters + format; the export itself streams from the store on a worker thread."""
+        if self._export_cancel is not None:
+            if self._export_win is not None and self._export_win.winfo_exists():
+                self._export_win.lift()
+            else:
+                self.status_var.set("The previous export is still stopping; try again in a moment.")
             return
-        f = filedialog.asksaveasfilename(
-            title="Export CSV",
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv")]
-        )
-        if not f:
+        if not self.history.count():
+            messagebox.showinfo("Export", "No history to export.")
             return
-        try:
-            with open(f, "w", newline="", encoding="utf-8") as fh:
-                writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS)
-                writer.writeheader()
-                writer.writerows(self.history)
-            messagebox.showinfo("Export", "Export complete.")
-            self.status_var.set(f"Exported to {f}")
-        except Exception as e:
-            messagebox.showerror("Export Error", str(e))
+
+        win = self._export_win = ttk.Toplevel(self.root)
+        win.title("Export History")
+        win.transient(self.root)
+        frm = ttk.Frame(win, padding=12)
+        frm.pack(fill=BOTH, expand=True)
+
+        v_date_from, v_date_to = ttk.StringVar(), ttk.StringVar()
+        v_from, v_to = ttk.StringVar(), ttk.StringVar()
+        v_svc = ttk.StringVar()
+        v_fmt = ttk.StringVar(value=EXPORT_FORMATS["csv"])
+        self._add_labeled_entry(frm, "From Date (YYYY-MM-DD):", v_date_from, 0, 0)
+        self._add_labeled_entry(frm, "To Date (YYYY-MM-DD):", v_date_to, 1, 0)
+        self._add_labeled_entry(frm, "From Postcode:", v_from, 0, 1)
+        self._add_labeled_entry(frm, "To Postcode:", v_to, 1, 1)
+        ttk.Label(frm, text="Service:").grid(row=2, column=0, sticky=W, padx=(0, 6), pady=4)
+        ttk.Combobox(frm, textvariable=v_svc, values=[""] + list(self.catalogue.default), state="readonly",
+                     width=26).grid(row=2, column=1, columnspan=3, sticky=W, pady=4)
+        ttk.Label(frm, text="Format:").grid(row=3, column=0, sticky=W, padx=(0, 6), pady=4)
+        ttk.Combobox(frm, textvariable=v_fmt, values=list(EXPORT_FORMATS.values()), state="readonly",
+                     width=26).grid(row=3, column=1, columnspan=3, sticky=W, pady=4)
+
+        progress = ttk.Progressbar(frm, mode="determinate", bootstyle=SUCCESS)
+        progress.grid(row=4, column=0, columnspan=4, sticky=EW, pady=(10, 4))
+        status = ttk.StringVar(value="Blank filters export everything.")
+        ttk.Label(frm, textvariable=status, bootstyle=SECONDARY).grid(row=5, column=0, columnspan=4, sticky=W)
+        frm.columnconfigure(3, weight=1)
+
+        btns = ttk.Frame(frm)
+        btns.grid(row=6, column=0, columnspan=4, sticky=E, pady=(10, 0))
+        btn_export = ttk.Button(btns, text="Export...", bootstyle=SUCCESS)
+        btn_cancel = ttk.Button(btns, text="Cancel Export", bootstyle=DANGER, state=DISABLED)
+        btn_export.pack(side=LEFT)
+        btn_cancel.pack(side=LEFT, padx=8)
+
+        def alive():
+            return win.winfo_exists()
+
+        def on_progress(done, total):
+            if alive():
+                progress.config(value=done, maximum=max(total, 1))
+                status.set(f"{done:,} / {total:,} rows")
+
+        def on_finished(path, done, completed, error):
+            self._export_cancel = None
+            if error is not None:
+                self.status_var.set("Export failed.")
+                messagebox.showerror("Export Error", error, parent=win if alive() else self.root)
+            elif completed:
+                self.status_var.set(f"Exported {done:,} rows to {path}")
+            else:
+                self.status_var.set("Export cancelled.")
+            if alive():
+                btn_export.config(state=NORMAL)
+                btn_cancel.config(state=DISABLED)
+                status.set(f"Done: {done:,} rows written." if completed and error is None else "Stopped.")
+
+        def start():
+            filters = {"date_from": v_date_from.get().strip(), "date_to": v_date_to.get().strip(),
+                       "from_postcode": v_from.get().strip(), "to_postcode": v_to.get().strip(),
+                       "service_code": v_svc.get().strip()}
+            errors = []
+            for key, label in (("date_from", "From Date"), ("date_to", "To Date")):
+                try:
+                    if filters[key]:
+                        datetime.strptime(filters[key], "%Y-%m-%d")
+                except ValueError:
+                    errors.append(f"{label} must be YYYY-MM-DD.")
+            for key, label in (("from_postcode", "From Postcode"), ("to_postcode", "To Postcode")):
+                if filters[key] and not is_postcode(filters[key]):
+                    errors.append(f"{label} must be 4 digits.")
+            if errors:
+                messagebox.showwarning("Export", "\n".join(errors), parent=win)
+                return
+            fmt = next(k for k, v in EXPORT_FORMATS.items() if v == v_fmt.get())
+            path = filedialog.asksaveasfilename(
+                parent=win, title="Export History", defaultextension=f".{fmt}",
+                filetypes=[("CSV files", "*.csv")] if fmt == "csv" else [("Gzip JSON Lines", "*.jsonl.gz")])
+            if not path:
+                return
+            cancel = self._export_cancel = threading.Event()
+            btn_export.config(state=DISABLED)
+            btn_cancel.config(state=NORMAL)
+            progress.config(value=0)
+            status.set("Exporting...")
+
+            def worker():
+                done, completed, error = 0, False, None
+                try:
+                    done, completed = export_history(
+                        self.history, path, fmt, filters, cancel=cancel,
+                        progress=lambda d, t: self._closing or self.root.after(0, on_progress, d, t))
+                except Exception as e:
+                    error = str(e)
+                if not self._closing:
+                    self.root.after(0, on_finished, path, done, completed, error)
+
+            self._export_thread = threading.Thread(target=worker, daemon=True)
+            self._export_thread.start()
+
+        def cancel_export():
+            if self._export_cancel is not None:
+                self._export_cancel.set()
+                status.set("Cancelling...")
+
+        def close():
+            cancel_export()
+            self._export_win = None
+            win.destroy()
+
+        btn_export.config(command=start)
+        btn_cancel.config(command=cancel_export)
+        win.protocol("WM_DELETE_WINDOW", close)
 
     def recalculate_selected(self):
         sel = self.history_tree.selection()
@@ -543,14 +957,74 @@ class PostageCalculatorApp:
     # Settings
     # ----------------------------------------
     def save_settings(self):
-        ok, msg = save_config(self.var_api_key.get(), self.var_api_url.get() or DEFAULT_API_URL)
+        try:
+            max_in_flight = max(1, int(self.var_max_in_flight.get()))
+        except Exception:
+            messagebox.showwarning("Settings", "Max Concurrent Requests must be a whole number.")
+            return
+        try:
+            rate_limit = max(0.0, float(self.var_rate_limit.get()))
+        except Exception:
+            messagebox.showwarning("Settings", "Rate Limit must be a number.")
+            return
+        ok, msg = save_config(self.var_api_key.get(), self.var_api_url.get() or DEFAULT_API_URL, max_in_flight,
+                              rate_limit, self._selected_pricing_mode(), self.var_rate_table.get())
         if ok:
             self.cfg = load_config()
+            self.engine.resize(max_in_flight)
+            self.engine.limiter.configure(rate_limit)
+            self.engine.configure(self.cfg["api_url"], self.cfg["api_key"])
+            self._load_rate_table()
+            self.var_pricing_mode.set(PRICING_MODES[self.engine.mode])
+            self._refresh_cache_stats()
             self.status_var.set(msg)
             messagebox.showinfo("Settings", msg)
         else:
             messagebox.showerror("Settings", msg)
 
+    def _selected_pricing_mode(self):
+        label = self.var_pricing_mode.get()
+        return next((k for k, v in PRICING_MODES.items() if v == label), "api")
+
+    def _browse_rate_table(self):
+        path = filedialog.askopenfilename(title="Select rate table",
+                                          filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if path:
+            self.var_rate_table.set(path)
+
+    def reload_rate_table(self):
+        """Recompile the rate table from the path in Settings (not saved until Save)."""
+        mode = self._selected_pricing_mode()
+        try:
+            rates = RateTable.load(self.var_rate_table.get().strip() or DEFAULT_RATE_TABLE_PATH)
+        except RateTableError as e:
+            messagebox.showerror("Rate Table", str(e))
+            return
+        self.engine.set_pricing(mode, rates)
+        self._refresh_cache_stats()
+        self.status_var.set(f"Rate table {rates.version or ''} loaded ({len(rates.services)} services).")
+
+    def _refresh_cache_stats(self):
+        rates = self.engine.rates
+        if self.engine.mode == "api" or rates is None:
+            self.pricing_stats_var.set("Every quote is fetched from the AusPost API.")
+        else:
+            text = f"Table {rates.version or '(unversioned)'}: {len(rates.services)} services, {len(rates.lanes):,} lanes"
+            if self.engine.mode == "verify":
+                text += f"  |  {self.engine.verified:,} verified, {self.engine.mismatched:,} mismatched"
+            self.pricing_stats_var.set(text)
+        st = self.engine.cache.stats()
+        rate = "n/a" if st["hit_rate"] is None else f"{st['hit_rate']:.0%}"
+        self.cache_stats_var.set(f"{st['entries']:,} entries  |  {st['hits']:,} hits / {st['misses']:,} misses "
+                                 f"({rate})  |  {st['evictions']:,} evicted  |  "
+                                 f"{self.engine.coalesced:,} coalesced")
+
+    def clear_quote_cache(self):
+        self.engine.cache.clear()
+        self.engine.submit(self.engine.cache.save)
+        self._refresh_cache_stats()
+        self.status_var.set("Quote cache cleared.")
+
     def test_connection(self):
         api_key = self.var_api_key.get().strip()
         api_url = self.var_api_url.get().strip() or DEFAULT_API_URL
@@ -559,10 +1033,13 @@ class PostageCalculatorApp:
             return
 
         self.status_var.set("Testing connection...")
-        def worker():
+        self.engine.configure(api_url, api_key)
+        session = self.engine.session
+        def test():
             try:
                 # Minimal ping: perform a GET with deliberately incomplete params to check auth/URL.
-                r = requests.get(api_url, headers={"AUTH-KEY": api_key}, params={"from_postcode": "2000"}, timeout=12)
+                with self.engine.telemetry.call("test_connection"):
+                    r = session.get(api_url, params={"from_postcode": "2000"}, timeout=12)
                 # If 401/403, we still learn that the endpoint/key format is recognized.
                 status = r.status_code
                 if status == 200:
@@ -573,16 +1050,75 @@ class PostageCalculatorApp:
                     msg = f"Endpoint reachable (HTTP {status})."
                 self.root.after(0, lambda: (messagebox.showinfo("Test Connection", msg), self.status_var.set(msg)))
             except Exception as e:
-                self.root.after(0, lambda: (messagebox.showerror("Test Connection", str(e)), self.status_var.set("Connection test failed.")))
+                err = str(e)
+                self.root.after(0, lambda: (messagebox.showerror("Test Connection", err), self.status_var.set("Connection test failed.")))
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.engine.submit(test)
+
+    # ----------------------------------------
+    # Diagnostics
+    # ----------------------------------------
+    def _tick_diagnostics(self):
+        if self.notebook.select() == str(self.tab_diag):
+            self._refresh_diagnostics()
+        self.root.after(DIAG_REFRESH_MS, self._tick_diagnostics)
+
+    def _refresh_diagnostics(self, force=False):
+        telemetry = self.engine.telemetry
+        if not force and telemetry.total == self._diag_seen:
+            return
+        self._diag_seen = telemetry.total
+        st = telemetry.summary(DIAG_WINDOWS.get(self.var_diag_window.get(), 300))
+
+        def pct(v):
+            return "n/a" if v is None else f"{v:.1%}"
+
+        statuses = ", ".join(f"{k}: {v:,}" for k, v in st["statuses"].items()) or "none"
+        self.diag_summary_var.set(
+            f"{st['calls']:,} calls ({st['calls_per_min']}/min)  |  errors {st['errors']:,} ({pct(st['error_rate'])}), "
+            f"timeouts {st['timeouts']:,}  |  reused connections {pct(st['reused_share'])}  |  "
+            f"avg payload {st['mean_bytes'] or 0:,} B  |  status {statuses}")
+
+        self.diag_phase_tree.delete(*self.diag_phase_tree.get_children())
+        for phase in PHASES:
+            h = st["phases"][phase]
+            cells = [h["count"]] + ["" if h[k] is None else f"{h[k]:.1f}"
+                                    for k in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")]
+            self.diag_phase_tree.insert("", END, values=[DIAG_PHASE_LABELS[phase]] + cells)
+
+        self.diag_calls_tree.delete(*self.diag_calls_tree.get_children())
+        for rec in reversed(telemetry.recent_calls(DIAG_RECENT_ROWS)):
+            row = dict(rec.to_dict(), reused="yes" if rec.reused else "no")
+            self.diag_calls_tree.insert("", END, values=["" if row[c] is None else row[c]
+                                                         for c in self.diag_calls_tree["columns"]])
+
+    def export_diagnostics(self):
+        path = filedialog.asksaveasfilename(
+            title="Export API Diagnostics",
+            defaultextension=".json",
+            filetypes=[("JSON (summaries + calls)", "*.json"), ("CSV (calls)", "*.csv")],
+            initialfile=f"auspost_api_diagnostics_{datetime.now():%Y%m%d_%H%M%S}.json",
+        )
+        if not path:
+            return
+        try:
+            n = self.engine.telemetry.export(path)
+        except OSError as e:
+            messagebox.showerror("Export", f"Could not write {path}:\n{e}")
+            return
+        self.status_var.set(f"Exported {n:,} API calls to {path}")
+
+    def reset_diagnostics(self):
+        self.engine.telemetry.reset()
+        self._refresh_diagnostics(force=True)
+        self.status_var.set("API diagnostics reset.")
 
     # ----------------------------------------
     # Events
     # ----------------------------------------
     def update_suboptions(self, event=None):
         selected = self.service_code.get()
-        options = SERVICE_OPTIONS.get(selected, [])
+        options = list(self._route_services().get(selected, {}))
         self.suboption_code["values"] = options
         if options:
             self.suboption_code.set(options[0])
@@ -590,6 +1126,74 @@ class PostageCalculatorApp:
             self.suboption_code.set("")
 
 
+    # ----------------------------------------
+    # Service Catalogue
+    # ----------------------------------------
+    def _form_parcel(self):
+        """The form's dimensions and weight in listing units, or None until they are valid."""
+        parcel, _ = validate_parcel("3000", "2000", self.var_len.get(), self.var_wid.get(),
+                                    self.var_hei.get(), self.var_wei.get(), "-")
+        return {k: parcel[k] for k in ("length", "width", "height", "weight")} if parcel else None
+
+    def _form_route(self):
+        """(from, to, parcel) for the service listing, or None until both postcodes are valid."""
+        from_pc, to_pc = self.var_from.get().strip(), self.var_to.get().strip()
+        if not (is_postcode(from_pc) and is_postcode(to_pc)):
+            return None
+        return from_pc, to_pc, self._form_parcel()
+
+    @staticmethod
+    def _route_key(route):
+        return route and (route[0], route[1], size_band(route[2]))
+
+    def _route_services(self):
+        route = self._form_route()
+        return self.catalogue.services_for(*route) if route else self.catalogue.default
+
+    def _route_changed(self, *_):
+        route = self._form_route()
+        key = self._route_key(route)
+        if key == self._route:
+            return
+        self._route = key
+        self._apply_services()
+        if route and self.catalogue.lookup(*route) is None:
+            self._fetch_services(route)
+
+    def _apply_services(self):
+        services = self._route_services()
+        self.service_code["values"] = list(services)
+        if self.service_code.get() and self.service_code.get() not in services:
+            self.service_code.set("")
+            self.suboption_code.set("")
+            self.suboption_code["values"] = []
+        elif self.service_code.get():
+            subs = list(services.get(self.service_code.get(), {}))
+            self.suboption_code["values"] = subs
+            if self.suboption_code.get() not in subs:
+                self.suboption_code.set(subs[0] if subs else "")
+
+    def _fetch_services(self, route=None):
+        """List services for route (or overall) on the engine pool; comboboxes update when it lands."""
+        if self.engine.mode == "local" or not self.var_api_key.get().strip():
+            return
+        # The form's parcel size when it is valid (the service code is not part of a listing)
+        from_pc, to_pc, dims = route or (None, None, self._form_parcel())
+        self.engine.configure(self.var_api_url.get().strip() or DEFAULT_API_URL, self.var_api_key.get().strip())
+
+        def done(fut):
+            if fut.exception() is None:
+                self.root.after(0, self._services_arrived, route)
+
+        self.engine.submit(self.catalogue.fetch, self.engine, from_pc, to_pc, dims).add_done_callback(done)
+
+    def _services_arrived(self, route):
+        if route is None or self._route_key(route) == self._route:
+            self._apply_services()
+        if route is None:
+            self.status_var.set(f"Service list refreshed ({len(self.catalogue.default)} services).")
+
+
 # ----------------------------
 # Run App
 # ----------------------------
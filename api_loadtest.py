@@ -0,0 +1,283 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from perf_metrics import BUCKETS_MS, Histogram, percentile
+# --------------------------
+# Load test for one HTTP request
+# --------------------------
+# Drives a single request (method, URL, requests kwargs) from a pool of worker
+# threads sharing one keep-alive connection pool, either closed-loop (N
+# workers, each sending as soon as its last response arrives) or paced to a
+# target requests/s. Both ramp up linearly over --ramp-up seconds. snapshot()
+# can be polled from another thread (the API client's Load Test tab does) and
+# returns throughput, exact latency percentiles, an error breakdown and a
+# perf_metrics latency histogram.
+#
+#   python api_loadtest.py https://shop.example/rest/V1/products?searchCriteria= \
+#       --concurrency 16 --duration 30 --ramp-up 5
+#   python api_loadtest.py --local --rps 200 --duration 10
+#
+# --local starts a small echo server in-process (--local-latency ms) and
+# targets it, to check the tool itself.
+
+MAX_BEHIND_S = 1.0  # paced mode: slots more than this late are skipped and counted as missed
+
+
+class LoadTest:
+    """One load-test run; start() returns at once, stop() ends it early.
+
+    rps=None runs `concurrency` closed-loop workers. With rps set, the same
+    workers take send slots from a shared schedule at the target rate, so
+    concurrency is the ceiling on requests in flight; slots the workers cannot
+    reach in time are skipped and counted as "missed" rather than bursting.
+    """
+
+    def __init__(self, method, url, concurrency=8, rps=None, duration=10.0, ramp_up=0.0, **request_kwargs):
+        self.method = method
+        self.url = url
+        self.concurrency = max(1, int(concurrency))
+        self.rps = float(rps) if rps else None
+        self.duration = float(duration)
+        self.ramp_up = max(0.0, min(float(ramp_up), self.duration))
+        self.kwargs = request_kwargs
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.latencies = []        # ms, successful and failed responses alike, in completion order
+        self._sorted_ms = []       # latencies as of the last snapshot, ascending
+        self._snap_lock = threading.Lock()
+        self.histogram = Histogram()
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.recent = deque()      # completion times for the current-rate window
+        self.sent = self.completed = self.ok = self.bytes = self.missed = 0
+        self.started = None
+        self.finished = None
+        self._next_slot = None
+
+    # ---------- RUNNING ----------
+    def start(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.started = time.perf_counter()
+        self._next_slot = self.started
+        self._threads = [threading.Thread(target=self._worker, args=(i,), daemon=True, name=f"load-{i}")
+                         for i in range(self.concurrency)]
+        for t in self._threads:
+            t.start()
+        self._joiner = threading.Thread(target=self._join, daemon=True)
+        self._joiner.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self.started is not None and self.finished is None
+
+    def wait(self, timeout=None):
+        """Block until the run ends (or timeout); True once it has."""
+        self._joiner.join(timeout)
+        return not self._joiner.is_alive()
+
+    def _join(self):
+        for t in self._threads:
+            t.join()
+        self.session.close()
+        self.finished = time.perf_counter()
+
+    def _rate_at(self, t):
+        if self.ramp_up and t < self.ramp_up:
+            return max(1.0, self.rps * t / self.ramp_up)
+        return self.rps
+
+    def _take_slot(self):
+        """Paced mode: the next send time (perf_counter), or None when the run is over."""
+        with self._lock:
+            now = time.perf_counter()
+            if now - self.started >= self.duration:
+                return None
+            while now - self._next_slot > MAX_BEHIND_S:
+                self._next_slot += 1.0 / self._rate_at(self._next_slot - self.started)
+                self.missed += 1
+            slot = self._next_slot
+            self._next_slot += 1.0 / self._rate_at(slot - self.started)
+        return slot if slot - self.started < self.duration else None
+
+    def _worker(self, index):
+        deadline = self.started + self.duration
+        if self.rps is None and self.ramp_up:
+            # Closed loop: workers join one by one across the ramp-up
+            if self._stop.wait(self.ramp_up * index / self.concurrency):
+                return
+        while not self._stop.is_set():
+            if self.rps is not None:
+                slot = self._take_slot()
+                if slot is None or self._stop.wait(max(0.0, slot - time.perf_counter())):
+                    return
+            elif time.perf_counter() >= deadline:
+                return
+            self._send()
+
+    def _send(self):
+        with self._lock:
+            self.sent += 1
+        status, error, size = None, None, 0
+        t0 = time.perf_counter()
+        try:
+            r = self.session.request(self.method, self.url, **self.kwargs)
+            size = len(r.content)
+            status = r.status_code
+            if status >= 400:
+                error = f"HTTP {status}"
+        except Exception as e:  # RequestException, or e.g. an auth hook failing; counted, never fatal
+            error = type(e).__name__
+        ms = (time.perf_counter() - t0) * 1000.0
+        done = time.perf_counter()
+        with self._lock:
+            self.completed += 1
+            self.latencies.append(ms)
+            self.histogram.record(ms)
+            self.bytes += size
+            self.recent.append(done)
+            if status is not None:
+                self.statuses[status] += 1
+            if error:
+                self.errors[error] += 1
+            else:
+                self.ok += 1
+
+    # ---------- REPORTING ----------
+    def snapshot(self):
+        """Plain dict of the run so far; safe to call from any thread."""
+        now = self.finished or time.perf_counter()
+        with self._snap_lock:
+            with self._lock:
+                # Only the latencies since the last snapshot are copied under the lock workers record with
+                fresh = self.latencies[len(self._sorted_ms):]
+                while self.recent and self.recent[0] < now - 1.0:
+                    self.recent.popleft()
+                current = len(self.recent)
+                elapsed = now - self.started if self.started else 0.0
+                snap = {
+                    "method": self.method, "url": self.url, "running": self.running,
+                    "mode": "rps" if self.rps else "concurrency", "concurrency": self.concurrency,
+                    "target_rps": self.rps, "duration": self.duration, "ramp_up": self.ramp_up,
+                    "elapsed_s": round(elapsed, 2),
+                    "sent": self.sent, "completed": self.completed, "ok": self.ok,
+                    "failed": self.completed - self.ok, "missed": self.missed,
+                    "in_flight": self.sent - self.completed, "bytes": self.bytes,
+                    "rps_current": current if self.running else None,
+                    "rps_avg": round(self.completed / elapsed, 1) if elapsed else None,
+                    "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+                    "errors": dict(self.errors.most_common()),
+                    "histogram": list(self.histogram.counts),
+                }
+            # Sorted outside the workers' lock; timsort merges the two ascending runs in linear time
+            latencies = self._sorted_ms = sorted(self._sorted_ms + sorted(fresh))
+        snap.update({"p50_ms": percentile(latencies, 50), "p90_ms": percentile(latencies, 90),
+                     "p99_ms": percentile(latencies, 99),
+                     "max_ms": round(latencies[-1], 2) if latencies else None,
+                     "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None})
+        return snap
+
+
+def histogram_labels():
+    """Axis labels for snapshot()["histogram"], one per perf_metrics bucket."""
+    return [f"≤{b:g}" if b != float("inf") else f">{BUCKETS_MS[-2]:g}" for b in BUCKETS_MS]
+
+
+# ----------------------------
+# Local echo server (checking the tool)
+# ----------------------------
+def serve_echo(host="127.0.0.1", port=0, latency_ms=0.0, fail_rate=0.0):
+    """Answer every method with a small JSON echo after ~latency_ms; returns the server (shutdown() to stop)."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            if latency_ms:
+                time.sleep(latency_ms / 1000.0 * random.uniform(0.5, 1.5))
+            status = 503 if fail_rate and random.random() < fail_rate else 200
+            data = json.dumps({"method": self.command, "path": self.path, "received": len(body)}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test one HTTP request.")
+    ap.add_argument("url", nargs="?")
+    ap.add_argument("--method", default="GET")
+    ap.add_argument("--header", action="append", default=[], help="'Key: value' (repeatable)")
+    ap.add_argument("--json", help="JSON request body")
+    ap.add_argument("--concurrency", type=int, default=8, help="workers (the in-flight ceiling with --rps)")
+    ap.add_argument("--rps", type=float, help="pace to this many requests/s instead of closed-loop")
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--ramp-up", type=float, default=0.0)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--insecure", action="store_true", help="skip TLS verification")
+    ap.add_argument("--local", action="store_true", help="target an in-process echo server")
+    ap.add_argument("--local-latency", type=float, default=20.0, help="echo server latency in ms (--local)")
+    ap.add_argument("--out", help="write the final snapshot JSON here")
+    args = ap.parse_args()
+
+    url = args.url
+    if args.local:
+        server = serve_echo(latency_ms=args.local_latency)
+        url = f"http://127.0.0.1:{server.server_port}/echo"
+    if not url:
+        ap.error("a URL (or --local) is required")
+    headers = dict(h.split(":", 1) for h in args.header)
+    test = LoadTest(args.method.upper(), url, args.concurrency, args.rps, args.duration, args.ramp_up,
+                    headers={k.strip(): v.strip() for k, v in headers.items()},
+                    json=json.loads(args.json) if args.json else None,
+                    timeout=args.timeout, verify=not args.insecure).start()
+    try:
+        while not test.wait(1.0):
+            s = test.snapshot()
+            print(f"  {s['elapsed_s']:6.1f}s  {s['completed']:,} done  {s['rps_current']} req/s  "
+                  f"p50 {s['p50_ms']} ms  p99 {s['p99_ms']} ms  errors {s['failed']:,}")
+    except KeyboardInterrupt:
+        test.stop()
+        test.wait()
+    s = test.snapshot()
+    missed = f", {s['missed']:,} missed slots" if s["missed"] else ""
+    print(f"{s['completed']:,} requests in {s['elapsed_s']}s: {s['rps_avg']} req/s, {s['ok']:,} ok, "
+          f"{s['failed']:,} failed{missed}")
+    print(f"  latency ms  p50 {s['p50_ms']}  p90 {s['p90_ms']}  p99 {s['p99_ms']}  max {s['max_ms']}")
+    if s["errors"]:
+        print("  errors      " + ", ".join(f"{k}: {v}" for k, v in s["errors"].items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(s, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import csv
+import json
+import socket
+import threading
+import time
+from collections import Counter, deque
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from perf_metrics import Histogram
+# --------------------------
+# Outbound API call telemetry
+# --------------------------
+# Per-call timings for requests sessions: DNS, TCP connect and TLS handshake
+# (only on calls that opened a new connection), time to first byte, total,
+# HTTP status, payload bytes and error type. Calls are recorded into one
+# perf_metrics.Histogram per phase per minute, kept for a rolling window, plus
+# a ring of the most recent calls for the diagnostics view and exports.
+#
+#   telemetry = ApiTelemetry()
+#   session.mount("https://", TimedAdapter(pool_maxsize=8))
+#   with telemetry.call("fetch_quote"):
+#       session.get(url, timeout=(5, 20))
+#   telemetry.summary(3600)   -> plain dict, JSON-serialisable
+#
+# Timing only happens inside telemetry.call(); other requests on a
+# TimedAdapter cost one thread-local lookup.
+
+PHASES = ("dns", "connect", "tls", "ttfb", "total")
+TELEMETRY_WINDOW = 24 * 3600   # seconds of per-minute histograms kept
+TELEMETRY_RECENT = 2000        # individual calls kept for the call log / export
+CALL_FIELDS = ["time", "call", "status", "error", "reused", "dns_ms", "connect_ms", "tls_ms",
+               "ttfb_ms", "total_ms", "bytes"]
+
+_active = threading.local()
+
+
+def current_call():
+    """The CallRecord being timed on this thread, or None."""
+    return getattr(_active, "rec", None)
+
+
+def _ms(t0):
+    return (time.perf_counter() - t0) * 1000.0
+
+
+class CallRecord:
+    __slots__ = ("name", "started", "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms",
+                 "status", "bytes", "error", "reused")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.dns_ms = self.connect_ms = self.tls_ms = self.ttfb_ms = self.total_ms = None
+        self.status = None
+        self.bytes = 0
+        self.error = ""
+        self.reused = True  # cleared when the call has to open a connection
+
+    @property
+    def timeout(self):
+        return "Timeout" in self.error
+
+    def to_dict(self):
+        def r(v):
+            return None if v is None else round(v, 2)
+        return {"time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "call": self.name, "status": self.status, "error": self.error, "reused": self.reused,
+                "dns_ms": r(self.dns_ms), "connect_ms": r(self.connect_ms), "tls_ms": r(self.tls_ms),
+                "ttfb_ms": r(self.ttfb_ms), "total_ms": r(self.total_ms), "bytes": self.bytes}
+
+
+# ---------- CONNECTION TIMING ----------
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        rec = current_call()
+        if rec is None:
+            return super()._new_conn()
+        rec.reused = False
+        host = self._dns_host
+        t0 = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            rec.dns_ms = _ms(t0)
+            return super()._new_conn()  # let urllib3 raise its NameResolutionError
+        rec.dns_ms = _ms(t0)
+        # Connect to the addresses just resolved (same order and fallback as
+        # urllib3) so the lookup is not repeated; SNI and Host still use self.host
+        t0 = time.perf_counter()
+        err = None
+        try:
+            for *_, addr in infos:
+                self._dns_host = addr[0]
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    err = e
+            raise err
+        finally:
+            self._dns_host = host
+            rec.connect_ms = _ms(t0)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        rec = current_call()
+        t0 = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            if rec is not None and rec.connect_ms is not None:
+                rec.tls_ms = max(0.0, _ms(t0) - (rec.dns_ms or 0.0) - rec.connect_ms)
+
+
+class _TimedHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """HTTPAdapter that fills in the current CallRecord: phases, status and payload size.
+
+    Non-streamed bodies are read here so total_ms covers the download; requests
+    would read them straight after anyway.
+    """
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPPool, "https": _TimedHTTPSPool}
+
+    def send(self, request, stream=False, **kwargs):
+        rec = current_call()
+        if rec is None:
+            return super().send(request, stream=stream, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+            rec.ttfb_ms = _ms(t0)
+            rec.status = response.status_code
+            if stream:
+                rec.bytes = int(response.headers.get("Content-Length") or 0)
+            else:
+                rec.bytes = len(response.content)
+            return response
+        finally:
+            rec.total_ms = _ms(t0)
+
+
+# ---------- AGGREGATION ----------
+class _Minute:
+    __slots__ = ("minute", "phases", "calls", "errors", "timeouts", "statuses", "bytes", "reused")
+
+    def __init__(self, minute):
+        self.minute = minute
+        self.phases = {p: Histogram() for p in PHASES}
+        self.calls = self.errors = self.timeouts = self.bytes = self.reused = 0
+        self.statuses = Counter()
+
+
+class _CallSpan:
+    __slots__ = ("telemetry", "rec", "prev", "t0")
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.rec = CallRecord(name)
+
+    def __enter__(self):
+        self.prev = current_call()
+        _active.rec = self.rec
+        self.t0 = time.perf_counter()
+        return self.rec
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.rec = self.prev
+        rec = self.rec
+        if rec.total_ms is None:
+            rec.total_ms = _ms(self.t0)
+        if exc_type is not None:
+            rec.error = exc_type.__name__
+        self.telemetry.record(rec)
+        return False
+
+
+class ApiTelemetry:
+    def __init__(self, window=TELEMETRY_WINDOW, recent=TELEMETRY_RECENT):
+        self.window = window
+        self._lock = threading.Lock()
+        self._recent_max = recent
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.recent = deque(maxlen=self._recent_max)
+            self._minutes = deque()  # _Minute, oldest first
+            self.total = 0           # calls ever recorded (the views use it to skip redraws)
+            self.started = time.time()
+
+    # ---------- RECORDING ----------
+    def call(self, name):
+        """Context manager timing one HTTP call made on a TimedAdapter session."""
+        return _CallSpan(self, name)
+
+    def record(self, rec):
+        minute = int(rec.started // 60)
+        with self._lock:
+            if not self._minutes or self._minutes[-1].minute != minute:
+                self._minutes.append(_Minute(minute))
+                while self._minutes and self._minutes[0].minute <= minute - self.window // 60:
+                    self._minutes.popleft()
+            m = self._minutes[-1]
+            for phase in PHASES:
+                ms = getattr(rec, phase + "_ms")
+                if ms is not None:
+                    m.phases[phase].record(ms)
+            m.calls += 1
+            m.bytes += rec.bytes
+            m.reused += rec.reused
+            if rec.error:
+                m.errors += 1
+                m.timeouts += rec.timeout
+            m.statuses[str(rec.status or rec.error or "none")] += 1
+            self.recent.append(rec)
+            self.total += 1
+
+    # ---------- REPORTING ----------
+    def summary(self, seconds=None):
+        """Aggregates over the last `seconds` (default: the whole window)."""
+        seconds = min(seconds or self.window, self.window)
+        since = int((time.time() - seconds) // 60)
+        phases = {p: Histogram() for p in PHASES}
+        calls = errors = timeouts = nbytes = reused = 0
+        statuses = Counter()
+        with self._lock:
+            for m in self._minutes:
+                if m.minute < since:
+                    continue
+                for p in PHASES:
+                    phases[p].merge(m.phases[p])
+                calls += m.calls
+                errors += m.errors
+                timeouts += m.timeouts
+                nbytes += m.bytes
+                reused += m.reused
+                statuses.update(m.statuses)
+        return {
+            "seconds": seconds,
+            "calls": calls,
+            "calls_per_min": round(calls / (seconds / 60.0), 2),
+            "errors": errors,
+            "error_rate": round(errors / calls, 4) if calls else None,
+            "timeouts": timeouts,
+            "statuses": dict(sorted(statuses.items())),
+            "bytes": nbytes,
+            "mean_bytes": round(nbytes / calls) if calls else None,
+            "reused_share": round(reused / calls, 4) if calls else None,
+            "phases": {p: h.to_dict() for p, h in phases.items()},
+        }
+
+    def recent_calls(self, n=None):
+        with self._lock:
+            calls = list(self.recent)
+        return calls[-n:] if n else calls
+
+    def export(self, path):
+        """Write the call log (.csv) or summaries plus the call log (.json)."""
+        calls = [rec.to_dict() for rec in self.recent_calls()]
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            if path.lower().endswith(".csv"):
+                w = csv.DictWriter(fh, fieldnames=CALL_FIELDS)
+                w.writeheader()
+                w.writerows(calls)
+            else:
+                json.dump({"exported": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           "last_5_min": self.summary(300), "last_hour": self.summary(3600),
+                           "window": self.summary(), "calls": calls}, fh, indent=2)
+        return len(calls)
@@ -0,0 +1,303 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+from datetime import datetime
+
+from prod_dash import ProductDashboard
+from product_store import SQLiteStore
+# --------------------------
+# prod_dash benchmarks
+# --------------------------
+# Generates synthetic product CSVs and times the dashboard hot paths headlessly:
+# import (_import_file), load (_load_data), search (_apply_search), sort
+# (sort_by_column), page render (_update_table / _update_cards, only when a Tk
+# display is available) and export (_write_csv).
+#
+# Usage:
+#   python bench_prod_dash.py                                  # 10k + 100k rows, all variants
+#   python bench_prod_dash.py --rows 1000000 10000000 --variant utf8-comma
+#   python bench_prod_dash.py --compare bench_results/old.json  # print ratios vs a previous run
+#
+# Results are written as JSON (one record per rows/variant/stage) to
+# bench_results/ unless --out is given.
+
+# name -> (file encoding, delimiter)
+VARIANTS = {
+    "utf8-comma": ("utf-8", ","),
+    "utf8bom-semicolon": ("utf-8-sig", ";"),
+    "cp1252-tab": ("cp1252", "\t"),
+    "utf16-pipe": ("utf-16", "|"),
+}
+
+# Spellings the importer's header map should recognise
+HEADER_SYNONYMS = {
+    "sku": ["sku", "Product Code", "item_code", "SKU"],
+    "name": ["name", "Title", "Product Name", "item-name"],
+    "price": ["price", "Unit Price", "RRP", "sell_price"],
+    "stock": ["stock", "QTY", "On Hand", "quantity"],
+    "category": ["category", "Cat", "Segment"],
+    "status": ["status", "Enabled", "State"],
+    "image_path": ["image_path", "Image URL", "img"],
+    "description": ["description", "Long Description", "Details"],
+}
+
+CATEGORIES = ["Tools", "Garden", "Kitchen", "Outdoor", "Lighting", "Storage", "Café Supplies"]
+WORDS = ["steel", "compact", "deluxe", "cordless", "premium", "garden", "LED", "oak", "pro", "mini"]
+
+
+# ----------------------------
+# Synthetic catalogue
+# ----------------------------
+def generate_catalogue(path, rows, encoding="utf-8", delimiter=",", dirty=0.05, seed=42):
+    """Stream `rows` synthetic products to path; returns the number of deliberately bad rows."""
+    rnd = random.Random(seed)
+    fields = list(HEADER_SYNONYMS)
+    header = [rnd.choice(HEADER_SYNONYMS[f]) for f in fields] + ["Supplier Notes"]  # extra column is ignored
+    bad = 0
+    with open(path, "w", newline="", encoding=encoding) as fh:
+        writer = csv.writer(fh, delimiter=delimiter, lineterminator="\r\n")
+        writer.writerow(header)
+        for i in range(rows):
+            price = round(rnd.uniform(1, 2500), 2)
+            rec = [
+                f"SKU-{i:08d}",
+                " ".join(rnd.choice(WORDS) for _ in range(3)).title(),
+                f"{price:.2f}",
+                str(rnd.randint(0, 500)),
+                rnd.choice(CATEGORIES),
+                rnd.choice(["enabled", "disabled"]),
+                "",
+                "Synthetic product for benchmarking.",
+                "",
+            ]
+            if rnd.random() < dirty:
+                kind = rnd.randrange(6)
+                if kind == 0:
+                    rec[1] = rec[1][:3] + "\x00" + rec[1][3:]   # null byte
+                elif kind == 1:
+                    rec[2] = f"${price:,.2f}"                   # currency + thousands separator
+                elif kind == 2:
+                    rec[2] = f"€{price:.2f}"
+                elif kind == 3:
+                    rec[3] = "N/A"
+                elif kind == 4:
+                    rec[7] = "Line one\r\nLine two\rLine three"  # embedded CRLF / CR
+                else:
+                    rec[0] = ""                                  # missing SKU -> rejected
+                    bad += 1
+            writer.writerow(rec)
+    return bad
+
+
+# ----------------------------
+# Headless dashboard
+# ----------------------------
+class _Null:
+    """Stands in for widgets when there is no display."""
+    def __getattr__(self, name):
+        return lambda *a, **k: None
+
+
+class _Var:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def make_dashboard(db_path, root=None, page_size=48):
+    """Build a ProductDashboard on db_path without dialogs; widgets only when root is given."""
+    d = ProductDashboard.__new__(ProductDashboard)
+    d.root = root if root is not None else _Null()
+    d.page_size = page_size
+    d.current_page = 0
+    d.sort_column = None
+    d.sort_reverse = False
+    d.all_data = []
+    d.filtered_data = []
+    d.image_cache = {}
+    d.store = SQLiteStore(db_path)
+    d.conn = d.store.acquire()
+    d.store.setup_schema(d.conn)
+    if root is not None:
+        d.view_mode = tk.StringVar(master=root, value="table")
+        d.search_text = tk.StringVar(master=root, value="")
+        d.page_size_var = tk.IntVar(master=root, value=page_size)
+        d._setup_theme()
+        d._setup_ui()
+    else:
+        d.view_mode = _Var("table")
+        d.search_text = _Var("")
+        d.stats_label = d.status_label = d.page_label = _Null()
+        d._refresh_view = lambda: None
+    return d
+
+
+def _try_tk_root():
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        return root
+    except tk.TclError:
+        return None
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def timed(results, rows, variant, stage, fn, count=None):
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    n = count if count is not None else rows
+    results.append({
+        "rows": rows, "variant": variant, "stage": stage,
+        "seconds": round(elapsed, 6),
+        "rows_per_s": round(n / elapsed, 1) if elapsed > 0 and n else None,
+    })
+    print(f"  {stage:<14} {elapsed:9.3f}s" + (f"  {n / elapsed:12,.0f} rows/s" if elapsed > 0 and n else ""))
+    return out
+
+
+def run_case(workdir, rows, variant, root, results):
+    enc, delim = VARIANTS[variant]
+    csv_path = os.path.join(workdir, f"catalogue-{rows}-{variant}.csv")
+    db_path = os.path.join(workdir, f"products-{rows}-{variant}.db")
+    out_path = os.path.join(workdir, f"export-{rows}-{variant}.csv")
+    print(f"{rows:,} rows, {variant}")
+
+    bad = timed(results, rows, variant, "generate", lambda: generate_catalogue(csv_path, rows, enc, delim))
+    d = make_dashboard(db_path, root)
+    try:
+        conn = d.store.acquire()
+        try:
+            _, _, skipped, _ = timed(results, rows, variant, "import", lambda: d._import_file(conn, csv_path))
+        finally:
+            d.store.release(conn)
+        timed(results, rows, variant, "load", d._load_data)
+        loaded = len(d.all_data)
+        results[-1]["loaded"] = loaded
+        results[-1]["skipped"] = skipped
+        results[-1]["expected_skipped"] = bad
+        if loaded != rows - bad:
+            print(f"  !! loaded {loaded:,} rows, expected {rows - bad:,}")
+
+        # Time filtering/sorting without rendering, then the render separately
+        refresh = d._refresh_view
+        d._refresh_view = lambda: None
+        d.search_text.set("kitchen")
+        timed(results, rows, variant, "search", d._apply_search, count=loaded)
+        d.search_text.set("")
+        timed(results, rows, variant, "search_clear", d._apply_search, count=loaded)
+        timed(results, rows, variant, "sort_price", lambda: d.sort_by_column("price"), count=loaded)
+        timed(results, rows, variant, "sort_name", lambda: d.sort_by_column("name"), count=loaded)
+        d._refresh_view = refresh
+
+        if root is not None:
+            d.view_mode.set("table")
+            timed(results, rows, variant, "render_table", lambda: (d._update_table(), root.update_idletasks()),
+                  count=d.page_size)
+            d.view_mode.set("cards")
+            d._show_cards()
+            timed(results, rows, variant, "render_cards", lambda: (d._update_cards(), root.update_idletasks()),
+                  count=d.page_size)
+            for w in root.winfo_children():
+                w.destroy()
+
+        timed(results, rows, variant, "export", lambda: d._write_csv(out_path, d.filtered_data), count=loaded)
+    finally:
+        d.store.release(d.conn)
+        d.store.close()
+        rejects_path = os.path.splitext(csv_path)[0] + ".rejects.csv"
+        for p in (csv_path, rejects_path, out_path, db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    old = {(r["rows"], r["variant"], r["stage"]): r["seconds"] for r in baseline["results"]}
+    print(f"\nvs {baseline['meta'].get('commit')} (ratio > 1.0 means slower now)")
+    for r in current["results"]:
+        prev = old.get((r["rows"], r["variant"], r["stage"]))
+        if prev:
+            print(f"  {r['rows']:>10,} {r['variant']:<18} {r['stage']:<14} {r['seconds'] / prev:6.2f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark prod_dash import/search/sort/render/export paths.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--variant", default=",".join(VARIANTS),
+                    help="comma-separated subset of: " + ", ".join(VARIANTS))
+    ap.add_argument("--no-render", action="store_true", help="skip Tk render timings")
+    ap.add_argument("--out", help="results JSON path (default bench_results/bench-<commit>-<time>.json)")
+    ap.add_argument("--workdir", help="where to put generated CSV/DB files (default: temp dir)")
+    ap.add_argument("--compare", help="previous results JSON to compare against")
+    args = ap.parse_args()
+
+    variants = [v.strip() for v in args.variant.split(",") if v.strip()]
+    unknown = [v for v in variants if v not in VARIANTS]
+    if unknown:
+        ap.error(f"unknown variant(s): {', '.join(unknown)}")
+
+    root = None if args.no_render else _try_tk_root()
+    if root is None:
+        print("No Tk display; render stages skipped.")
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "render": root is not None,
+        },
+        "results": [],
+    }
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_prod_dash_")
+    for rows in args.rows:
+        for variant in variants:
+            run_case(workdir, rows, variant, root, report["results"])
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out = args.out or os.path.join("bench_results", f"bench-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+    if root is not None:
+        root.destroy()
+
+
+if __name__ == "__main__":
+    main()
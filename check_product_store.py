@@ -0,0 +1,125 @@
+import os
+import queue
+import shutil
+import sys
+import tempfile
+
+from product_store import DBAPIStore, SQLiteStore, _to_format
+# --------------------------
+# product_store checks against the SQLite stand-in
+# --------------------------
+# Exercises what PostgresStore shares with the local backend without needing
+# a PostgreSQL server: pool acquire/release, the "?" -> "%s" paramstyle
+# wrapper (against a recording fake driver) and the change-journal triggers.
+#
+#   python check_product_store.py      -> exit status 1 if any check fails
+
+
+def check_pool(store):
+    a = store.acquire()
+    b = store.acquire()
+    assert a is not b
+    try:
+        store.acquire(timeout=0.1)
+    except queue.Empty:
+        pass
+    else:
+        raise AssertionError("acquire beyond max_size should time out")
+    a.execute("INSERT INTO products (sku, name) VALUES ('POOL-1', 'uncommitted')")
+    store.release(a)
+    assert store.acquire() is a, "the idle pool should hand back the released connection"
+    n = a.execute("SELECT COUNT(*) FROM products WHERE sku = 'POOL-1'").fetchone()[0]
+    assert n == 0, "release should roll back an open transaction"
+    store.release(a)
+    store.release(b)
+    with store.connection() as conn:
+        assert conn in (a, b)
+
+
+class _RecordingCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def execute(self, sql, params=()):
+        self.log.append((sql, tuple(params)))
+
+    def executemany(self, sql, seq):
+        self.log.append((sql, [tuple(p) for p in seq]))
+
+
+class _RecordingConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return _RecordingCursor(self.log)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _FormatStore(DBAPIStore):
+    def setup_schema(self, conn):
+        pass
+
+
+def check_paramstyle():
+    assert _to_format("SELECT * FROM products WHERE sku = ? AND name LIKE '10%'") == \
+        "SELECT * FROM products WHERE sku = %s AND name LIKE '10%%'"
+    store = _FormatStore(_RecordingConnection, max_size=1, paramstyle="format")
+    conn = store.acquire()
+    conn.execute("BEGIN")
+    conn.execute("UPDATE products SET stock = ? WHERE id = ?", (5, 1))
+    conn.cursor().executemany("DELETE FROM products WHERE id = ?", [(1,), (2,)])
+    assert conn.log == [("UPDATE products SET stock = %s WHERE id = %s", (5, 1)),
+                        ("DELETE FROM products WHERE id = %s", [(1,), (2,)])], conn.log
+    store.release(conn)
+
+
+def check_journal(store):
+    with store.connection() as conn:
+        bid = store.begin_batch(conn, "check")
+        conn.execute("INSERT INTO products (sku, name, price, stock) VALUES ('J-1', 'Widget', 9.5, 3)")
+        pid = conn.execute("SELECT id FROM products WHERE sku = 'J-1'").fetchone()[0]
+        conn.execute("UPDATE products SET stock = 4 WHERE id = ?", (pid,))
+        conn.commit()
+
+        bid2 = store.begin_batch(conn, "check 2")
+        conn.execute("UPDATE products SET stock = 4 WHERE id = ?", (pid,))  # no change: not journaled
+        conn.execute("UPDATE products SET price = 10 WHERE id = ?", (pid,))
+        conn.execute("DELETE FROM products WHERE id = ?", (pid,))
+        conn.commit()
+
+        rows = conn.execute("SELECT batch_id, op, product_id, price, stock FROM product_changes "
+                            "WHERE product_id = ? ORDER BY id", (pid,)).fetchall()
+        got = [tuple(r) for r in rows]
+        # One row per product per batch: the first change keeps the pre-batch values
+        assert got == [(bid, "I", pid, None, None), (bid2, "U", pid, 9.5, 4)], got
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="check_product_store_")
+    store = SQLiteStore(os.path.join(workdir, "products.db"), max_size=2)
+    failed = 0
+    try:
+        with store.connection() as conn:
+            store.setup_schema(conn)
+        for name, check in (("pool", lambda: check_pool(store)), ("paramstyle", check_paramstyle),
+                            ("journal", lambda: check_journal(store))):
+            try:
+                check()
+                print(f"ok    {name}")
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL  {name}: {e}")
+    finally:
+        store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import base64
+import hashlib
+import os
+import ssl
+import threading
+import time
+from email.message import Message
+from http.cookiejar import LoadError, LWPCookieJar
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.auth import AuthBase
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, get_encoding_from_headers
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+# --------------------------
+# Pooled sessions and auth for the API client
+# --------------------------
+# SessionPool keeps one keep-alive requests.Session per base URL
+# (scheme://host:port). Each session has its own connection pool of
+# pool_size, and all of them share one cookie jar, which is saved to a file
+# between runs. With http2 on, and httpx plus h2 installed, sessions send
+# through Http2Adapter and talk HTTP/2 to servers that offer it over TLS.
+# Other servers fall back to HTTP/1.1.
+#
+# Auth objects are cached too, one per kind for the current credentials, so
+# Basic and Bearer headers are encoded once.
+# TokenLogin posts username/password to a token endpoint, for example
+# Magento's /rest/V1/integration/admin/token. It reuses the bearer token for
+# every request to that base URL and logs in again only when the token is
+# older than TOKEN_TTL or a request comes back 401.
+
+DEFAULT_POOL_SIZE = 10
+TOKEN_TTL = 3 * 3600          # Magento admin tokens last 4 hours by default
+LOGIN_TIMEOUT = (5, 30)       # (connect, read) seconds for token requests
+MAGENTO_TOKEN_PATH = "/rest/V1/integration/admin/token"
+# Connection-specific headers HTTP/2 forbids (requests adds Connection: keep-alive)
+_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"}
+
+
+def base_url(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+# ---------- AUTH ----------
+class HeaderAuth(AuthBase):
+    """Sets a fixed Authorization header."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self, r):
+        r.headers["Authorization"] = self.value
+        return r
+
+
+class TokenLogin(AuthBase):
+    """Bearer token from a login endpoint, cached per base URL and refreshed on expiry or a 401.
+
+    Thread-safe: concurrent requests that find the token missing or rejected
+    wait for a single login rather than each making one.
+    """
+
+    def __init__(self, pool, token_url, username, password, verify=True, ttl=TOKEN_TTL):
+        self.pool = pool
+        self.token_url = token_url or MAGENTO_TOKEN_PATH
+        self.username = username
+        self.password = password
+        self.verify = verify
+        self.ttl = ttl
+        self.logins = 0
+        self._tokens = {}  # base URL -> (token, expires)
+        self._lock = threading.Lock()
+
+    def token(self, base, stale=None):
+        """The cached token for base, logging in first if there is none, it expired or it is `stale`."""
+        with self._lock:
+            token, expires = self._tokens.get(base, (None, 0.0))
+            if token is None or token == stale or time.time() >= expires:
+                token = self._login(base)
+                self._tokens[base] = (token, time.time() + self.ttl)
+            return token
+
+    def _login(self, base):
+        url = urljoin(base + "/", self.token_url)
+        r = self.pool.get(url).post(url, json={"username": self.username, "password": self.password},
+                                    timeout=LOGIN_TIMEOUT, verify=self.verify)
+        r.raise_for_status()
+        token = r.json()
+        if isinstance(token, dict):
+            token = token.get("access_token") or token.get("token")
+        if not isinstance(token, str) or not token:
+            raise requests.RequestException(f"{url} did not return a token")
+        self.logins += 1
+        return token
+
+    def __call__(self, r):
+        base = base_url(r.url)
+        token = self.token(base)
+        r.headers["Authorization"] = f"Bearer {token}"
+
+        def retry_on_401(response, **kwargs):
+            return self._handle_401(response, base, token, **kwargs)
+        r.register_hook("response", retry_on_401)
+        return r
+
+    def _handle_401(self, r, base, token, **kwargs):
+        """Response hook: on a 401, get a fresh token and resend once (as requests' HTTPDigestAuth does)."""
+        if r.status_code != 401 or getattr(r.request, "_token_retried", False):
+            return r
+        r.content
+        r.close()
+        prep = r.request.copy()
+        prep._token_retried = True
+        extract_cookies_to_jar(prep._cookies, r.request, r.raw)
+        prep.prepare_cookies(prep._cookies)
+        prep.headers["Authorization"] = f"Bearer {self.token(base, stale=token)}"
+        retried = r.connection.send(prep, **kwargs)
+        retried.history.append(r)
+        retried.request = prep
+        return retried
+
+
+# ---------- HTTP/2 ----------
+class _Http2Raw:
+    """Stands in for urllib3's response as Response.raw: streams the httpx body, exposes headers for cookies."""
+
+    def __init__(self, response):
+        self._response = response
+        self.version = 20 if response.http_version == "HTTP/2" else 11
+        msg = Message()
+        for k, v in response.headers.multi_items():
+            msg[k] = v  # appends, so repeated Set-Cookie headers survive
+        self._original_response = type("_Original", (), {"msg": msg})()
+
+    def stream(self, chunk_size, decode_content=True):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.TimeoutException as e:
+            raise requests.ReadTimeout(e) from e
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(e) from e
+
+    def read(self, amt=None, decode_content=True):
+        return b""  # Response.content reads through stream(); redirects call this to drain
+
+    def close(self):
+        self._response.close()
+
+
+class Http2Adapter(BaseAdapter):
+    """requests transport adapter that sends through httpx with HTTP/2 enabled.
+
+    Proxy settings are not applied.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        super().__init__()
+        self._limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._clients = {}  # (verify, cert) -> httpx.Client
+        self._lock = threading.Lock()
+
+    def _client(self, verify, cert):
+        key = (verify if isinstance(verify, str) else bool(verify), cert)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                ctx = ssl.create_default_context(cafile=verify if isinstance(verify, str) else DEFAULT_CA_BUNDLE_PATH)
+                if not verify:
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                if cert:
+                    ctx.load_cert_chain(*(cert if isinstance(cert, tuple) else (cert,)))
+                client = self._clients[key] = httpx.Client(http2=True, verify=ctx, limits=self._limits,
+                                                           trust_env=False, follow_redirects=False)
+            return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        client = self._client(verify, cert)
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS]
+        try:
+            sent = client.build_request(request.method, request.url, headers=headers, content=request.body,
+                                        timeout=httpx.Timeout(connect=connect, read=read, write=read,
+                                                              pool=connect))
+            response = client.send(sent, stream=True)
+        except (httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            raise requests.ConnectTimeout(e, request=request) from e
+        except httpx.TimeoutException as e:
+            raise requests.ReadTimeout(e, request=request) from e
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(e, request=request) from e
+
+        r = requests.Response()
+        r.status_code = response.status_code
+        r.reason = response.reason_phrase
+        r.headers = CaseInsensitiveDict(response.headers.items())
+        r.encoding = get_encoding_from_headers(r.headers)
+        r.raw = _Http2Raw(response)
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        extract_cookies_to_jar(r.cookies, request, r.raw)
+        return r
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+# ---------- SESSIONS ----------
+class SessionPool:
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, http2=False, cookie_file=None):
+        self.pool_size = pool_size
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.cookies = LWPCookieJar(cookie_file)
+        if cookie_file and os.path.exists(cookie_file):
+            try:
+                self.cookies.load(ignore_discard=True)
+            except (OSError, LoadError):
+                pass
+        self._sessions = {}  # base URL -> Session
+        self._auth = {}      # kind -> (credentials digest, AuthBase); only the current credentials per kind
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size, http2):
+        """Apply new pool settings; open sessions are closed so the next request picks them up."""
+        http2 = http2 and HTTP2_AVAILABLE
+        with self._lock:
+            if (pool_size, http2) == (self.pool_size, self.http2):
+                return
+            self.pool_size, self.http2 = pool_size, http2
+            old = list(self._sessions.values())
+            self._sessions.clear()
+        for session in old:
+            session.close()
+
+    def new_session(self, pool_size=None, hosts=1):
+        """A Session with the current settings and the shared cookie jar (the caller closes it)."""
+        size = max(1, pool_size or self.pool_size)
+        session = requests.Session()
+        session.cookies = self.cookies
+        if self.http2:
+            adapter = Http2Adapter(size)
+        else:
+            adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, url):
+        """The pooled Session for url's base URL."""
+        base = base_url(url)
+        with self._lock:
+            session = self._sessions.get(base)
+            if session is None:
+                session = self._sessions[base] = self.new_session()
+            return session
+
+    # ---------- AUTH ----------
+    def _cached(self, kind, credentials, make):
+        """The auth object for kind, rebuilt (replacing the old one) when the credentials change."""
+        digest = hashlib.sha256(repr(credentials).encode()).hexdigest()
+        with self._lock:
+            hit = self._auth.get(kind)
+            if hit is None or hit[0] != digest:
+                hit = self._auth[kind] = (digest, make())
+            return hit[1]
+
+    def basic_auth(self, username, password):
+        encoded = base64.b64encode(f"{username}:{password}".encode()).decode()
+        return self._cached("basic", encoded, lambda: HeaderAuth(f"Basic {encoded}"))
+
+    def bearer_auth(self, token):
+        return self._cached("bearer", token, lambda: HeaderAuth(f"Bearer {token}"))
+
+    def token_login(self, token_url, username, password, verify=True):
+        return self._cached("login", (token_url, username, password, verify),
+                            lambda: TokenLogin(self, token_url, username, password, verify))
+
+    # ---------- COOKIES ----------
+    def save_cookies(self):
+        if self.cookies.filename:
+            self.cookies.save(ignore_discard=True)
+
+    def clear_cookies(self):
+        self.cookies.clear()
+        self.save_cookies()
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+        self.save_cookies()
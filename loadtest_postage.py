@@ -0,0 +1,151 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from perf_metrics import percentile
+# --------------------------
+# Load test for postage_service.py
+# --------------------------
+# N client threads, each with its own keep-alive session, send /quote (or
+# /quotes with --bulk K) for --duration seconds or --requests total, then print
+# latency percentiles, requests/s, quotes/s and an error breakdown.
+#
+#   python loadtest_postage.py --url http://127.0.0.1:8080 --concurrency 32 --duration 20
+#   python loadtest_postage.py --spawn --mock-latency 80 --concurrency 64 --bulk 50
+#
+# --spawn starts mock_auspost.py and the service in-process on free ports, so
+# one command measures the whole stack offline. --unique bounds the number of
+# distinct parcels (lower = more cache hits / coalescing).
+
+SERVICES = ["AUS_PARCEL_REGULAR", "AUS_PARCEL_EXPRESS"]
+POSTCODES = ["2000", "2150", "2600", "3000", "3350", "4000", "4870", "5000", "6000", "7000", "0800"]
+
+
+def make_parcels(n, seed=7):
+    rnd = random.Random(seed)
+    return [{
+        "from_postcode": rnd.choice(POSTCODES), "to_postcode": rnd.choice(POSTCODES),
+        "length_cm": rnd.randint(5, 60), "width_cm": rnd.randint(5, 40), "height_cm": rnd.randint(2, 30),
+        "weight_kg": round(rnd.uniform(0.1, 15), 2), "service_code": rnd.choice(SERVICES),
+    } for _ in range(n)]
+
+
+def run(url, concurrency, duration=None, total=None, bulk=0, parcels=None, bypass_cache=False):
+    parcels = parcels or make_parcels(1000)
+    lock = threading.Lock()
+    latencies, errors = [], Counter()
+    counters = {"requests": 0, "quotes": 0, "sent": 0}
+    deadline = time.perf_counter() + duration if duration else None
+    endpoint = url.rstrip("/") + ("/quotes" if bulk else "/quote")
+
+    def take():
+        with lock:
+            if total is not None and counters["sent"] >= total:
+                return False
+            counters["sent"] += 1
+            return True
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        while (deadline is None or time.perf_counter() < deadline) and take():
+            if bulk:
+                body = {"parcels": [rnd.choice(parcels) for _ in range(bulk)], "bypass_cache": bypass_cache}
+            else:
+                body = dict(rnd.choice(parcels), bypass_cache=bypass_cache)
+            t0 = time.perf_counter()
+            try:
+                r = session.post(endpoint, json=body, timeout=(5, 60))
+                ms = (time.perf_counter() - t0) * 1000
+                ok_quotes = 0
+                if r.status_code == 200:
+                    ok_quotes = r.json().get("ok", 0) if bulk else 1
+                    failed = bulk - ok_quotes if bulk else 0
+                    err = f"partial ({failed} parcels failed)" if failed else None
+                else:
+                    err = f"HTTP {r.status_code}"
+            except requests.RequestException as e:
+                ms = (time.perf_counter() - t0) * 1000
+                ok_quotes, err = 0, type(e).__name__
+            with lock:
+                latencies.append(ms)
+                counters["requests"] += 1
+                counters["quotes"] += ok_quotes
+                if err:
+                    errors[err] += 1
+        session.close()
+
+    t_start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t_start
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint, "concurrency": concurrency, "bulk": bulk,
+        "seconds": round(elapsed, 3),
+        "requests": counters["requests"], "quotes": counters["quotes"],
+        "requests_per_s": round(counters["requests"] / elapsed, 1) if elapsed else None,
+        "quotes_per_s": round(counters["quotes"] / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(latencies, 50), "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99), "max_ms": round(latencies[-1], 2) if latencies else None,
+        "errors": dict(errors),
+    }
+
+
+def spawn_stack(mock_latency, max_in_flight, pricing):
+    """Mock AusPost + service in this process; returns the service base URL."""
+    import mock_auspost
+    from postage_service import PostageService, build_engine, serve_in_thread
+
+    mock = mock_auspost.serve(mock_auspost.RATES_PATH, port=0, latency_ms=mock_latency)
+    api_url = f"http://127.0.0.1:{mock.server_port}/postage/parcel/domestic/calculate.json"
+    engine = build_engine(api_url, "loadtest", max_in_flight=max_in_flight, rate_limit=0, pricing=pricing)
+    _, port = serve_in_thread(PostageService(engine))
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test the postage quoting service.")
+    ap.add_argument("--url", default="http://127.0.0.1:8080")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds (ignored with --requests)")
+    ap.add_argument("--requests", type=int, help="stop after this many requests")
+    ap.add_argument("--bulk", type=int, default=0, help="parcels per /quotes request (0 = single /quote)")
+    ap.add_argument("--unique", type=int, default=1000, help="distinct parcels to draw from")
+    ap.add_argument("--bypass-cache", action="store_true")
+    ap.add_argument("--spawn", action="store_true", help="start mock AusPost + service in-process")
+    ap.add_argument("--mock-latency", type=float, default=80.0, help="mock API latency in ms (--spawn)")
+    ap.add_argument("--max-in-flight", type=int, default=32, help="service API workers (--spawn)")
+    ap.add_argument("--pricing", default="api", help="service pricing mode (--spawn)")
+    ap.add_argument("--out", help="write the summary JSON here")
+    args = ap.parse_args()
+
+    url = spawn_stack(args.mock_latency, args.max_in_flight, args.pricing) if args.spawn else args.url
+    summary = run(url, args.concurrency, None if args.requests else args.duration, args.requests,
+                  args.bulk, make_parcels(args.unique), args.bypass_cache)
+
+    print(f"{summary['requests']:,} requests / {summary['quotes']:,} quotes in {summary['seconds']}s "
+          f"({args.concurrency} clients{f', {args.bulk} per request' if args.bulk else ''})")
+    print(f"  throughput  {summary['requests_per_s']} req/s, {summary['quotes_per_s']} quotes/s")
+    print(f"  latency ms  p50 {summary['p50_ms']}  p90 {summary['p90_ms']}  p99 {summary['p99_ms']}  "
+          f"max {summary['max_ms']}")
+    if summary["errors"]:
+        print("  errors      " + ", ".join(f"{k}: {v}" for k, v in summary["errors"].items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
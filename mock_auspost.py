@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from postage_rates import RateTable, RateTableError
+# --------------------------
+# Mock AusPost postage API
+# --------------------------
+# Serves GET /postage/parcel/domestic/calculate.json (any path works) priced
+# from a local rate table, in the AusPost response shape, so the calculator,
+# batch quoting and "local + verify" mode can be exercised offline. Paths
+# ending in service.json list the table's services, with surcharge codes as
+# suboptions of one option; a quote for a suboption must send both codes.
+#
+#   python mock_auspost.py --port 8765 --latency 80 --fail-rate 0.02 --rps 20
+#
+# then set the API URL in Settings to
+#   http://127.0.0.1:8765/postage/parcel/domestic/calculate.json
+#
+# --fail-rate returns random 503s and --rps answers 429 + Retry-After above the
+# given rate, to exercise the client's retries and circuit breaker.
+
+# The repo's sample table, found next to this file whatever the working directory
+RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "auspost_rates.json")
+# Surcharges are listed as suboptions of this one option
+MOCK_OPTION = "AUS_SERVICE_OPTION_STANDARD"
+
+
+class MockState:
+    def __init__(self, rates, latency_ms=0.0, fail_rate=0.0, rps=0.0, api_key=""):
+        self.rates = rates
+        self.latency = latency_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.rps = rps
+        self.api_key = api_key
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.requests = 0
+
+    def over_limit(self):
+        if self.rps <= 0:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            self.window_count += 1
+            return self.window_count > self.rps
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+            if state.api_key and self.headers.get("AUTH-KEY") != state.api_key:
+                return self._send(401, {"error": {"errorMessage": "Invalid AUTH-KEY"}})
+            if state.over_limit():
+                return self._send(429, {"error": {"errorMessage": "Too many requests"}}, {"Retry-After": "1"})
+            if state.latency:
+                time.sleep(state.latency * random.uniform(0.5, 1.5))
+            if state.fail_rate and random.random() < state.fail_rate:
+                return self._send(503, {"error": {"errorMessage": "Service unavailable"}})
+
+            url = urlparse(self.path)
+            if url.path.endswith("service.json"):
+                return self._send(200, {"services": {"service": [
+                    {"code": code, "name": code.replace("_", " ").title(),
+                     "options": {"option": [{"code": MOCK_OPTION, "name": "Standard Service", "suboptions": {
+                         "option": [{"code": sub, "name": sub.replace("_", " ").title()}
+                                    for sub in svc.surcharges]}}]}}
+                    for code, svc in state.rates.services.items()]}})
+
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                payload = {
+                    "from_postcode": q["from_postcode"],
+                    "to_postcode": q["to_postcode"],
+                    "length": float(q["length"]),
+                    "width": float(q["width"]),
+                    "height": float(q["height"]),
+                    "weight": str(int(float(q["weight"]))),
+                    "service_code": q["service_code"],
+                }
+                if q.get("suboption_code"):
+                    if q.get("option_code") != MOCK_OPTION:  # like the real API, a suboption needs its option
+                        raise ValueError(f"option_code {MOCK_OPTION} is required with suboption_code")
+                    payload["suboption_code"] = q["suboption_code"]
+                cost, eta = state.rates.quote(payload)
+            except (KeyError, ValueError, RateTableError) as e:
+                msg = f"Missing parameter {e}" if isinstance(e, KeyError) else str(e)
+                return self._send(400, {"error": {"errorMessage": msg}})
+            self._send(200, {"postage_result": {
+                "service": payload["service_code"],
+                "delivery_time": eta,
+                "total_cost": cost,
+                "costs": {"cost": {"item": "Postage", "cost": cost}},
+            }})
+
+    return Handler
+
+
+def serve(rates_path, host="127.0.0.1", port=8765, **opts):
+    """Start the mock in a background thread; returns the server (call shutdown() to stop)."""
+    state = MockState(RateTable.load(rates_path), **opts)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock AusPost domestic parcel postage API.")
+    ap.add_argument("--rates", default=RATES_PATH, help="rate table JSON")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="mean response latency in ms")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    ap.add_argument("--rps", type=float, default=0.0, help="answer 429 above this many requests/s (0 = off)")
+    ap.add_argument("--api-key", default="", help="require this AUTH-KEY header")
+    args = ap.parse_args()
+
+    server = serve(args.rates, args.host, args.port, latency_ms=args.latency, fail_rate=args.fail_rate,
+                   rps=args.rps, api_key=args.api_key)
+    print(f"Mock AusPost API on http://{args.host}:{server.server_port}/postage/parcel/domestic/calculate.json")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,65 @@ import json
 import os
 import requests
 import base64
+import csv
+import math
+import queue
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.exceptions import ReadTimeoutError
+
+from api_loadtest import LoadTest, histogram_labels
+from client_sessions import DEFAULT_POOL_SIZE, HTTP2_AVAILABLE, MAGENTO_TOKEN_PATH, SessionPool
+from request_store import PAGE_SIZE, RequestStore
+from response_body import PREVIEW_LIMIT, ResponseBody, pretty_json
 
 # Constants
-HISTORY_FILE = "request_history.json"
-request_history = []
+HISTORY_DB = "request_history.db"
+HISTORY_FILE = "request_history.json"   # pre-SQLite history, imported into HISTORY_DB once
+HISTORY_SINCE = {"Any time": None, "Today": 1, "Last 7 days": 7, "Last 30 days": 30}
+COOKIE_FILE = "api_client_cookies.txt"
+AUTH_MODES = ["Basic Auth", "Header", "Query Params", "Bearer Token", "Token Login"]
+MAX_POOL_SIZE = 100
+DEFAULT_CONNECT_TIMEOUT = 5    # seconds (Config tab)
+DEFAULT_READ_TIMEOUT = 30      # seconds between bytes from the server (Config tab)
+MAX_IN_FLIGHT = 8              # requests sent at once; more wait in the queue
+CHUNK_SIZE = 64 * 1024         # response bytes read between cancel checks
+ELAPSED_TICK_MS = 100
+RUNNER_ORDERS = ["In order", "Reverse", "Shuffled"]
+RUNNER_MAX_CONCURRENCY = 64
+RUNNER_MAX_ROWS = 5000         # rows shown in the Runner table; the report keeps every result
+RUNNER_POLL_MS = 100
+RUNNER_FIELDS = ["iteration", "index", "name", "method", "url", "status", "ok", "time_ms", "size", "error"]
+LOAD_MODES = ["Concurrency", "Target RPS"]
+LOAD_REFRESH_MS = 250
+store = RequestStore(HISTORY_DB, legacy_json=HISTORY_FILE)
+sessions = SessionPool(DEFAULT_POOL_SIZE, cookie_file=COOKIE_FILE)  # keep-alive session per base URL
+history_ids = []      # store ids of the History list rows, top (newest) first
+history_more = True   # more pages below the loaded rows
+history_loading = False  # a page load is queued
+history_total = 0
+imported_collection = []
+runner_run = None     # dict describing the collection run in progress
+runner_results = []   # rows from the last run, for the report
+runner_last_summary = None
+load_test = None      # api_loadtest.LoadTest while the Load Test tab is running one
+
+# Requests run on worker threads; widgets are only touched from root.after callbacks
+executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="request")
+in_flight = {}        # request id -> (cancel Event, start perf_counter, "METHOD url", progress)
+request_seq = 0
+shown_request = None  # id whose response the Response pane is waiting for
+elapsed_ticking = False
+response_body = None  # ResponseBody of the response on show (kept for Save Response)
+response_view = None  # ResponseBody being paged through when the response is over PREVIEW_LIMIT
+response_pages = []   # byte offsets of the pages shown so far; the last is on screen
+response_next = None  # offset of the next page, or None on the last
+
+
+class RequestCancelled(Exception):
+    pass
 
 # GUI setup
 root = tk.Tk()
@@ -40,6 +94,10 @@ url_entry.pack(side="left", padx=5)
 send_button = ttk.Button(top_frame, text="Send", bootstyle="success", command=lambda: make_request())
 send_button.pack(side="left", padx=5)
 
+cancel_button = ttk.Button(top_frame, text="Cancel", bootstyle="danger", state="disabled",
+                           command=lambda: cancel_requests())
+cancel_button.pack(side="left", padx=5)
+
 # Tabs
 notebook = ttk.Notebook(root)
 notebook.pack(fill="both", expand=True)
@@ -82,6 +140,21 @@ body_textbox.pack(fill="both", expand=True)
 # Response Section
 response_frame = ttk.LabelFrame(client_tab, text="Response", padding=5)
 response_frame.pack(fill="both", expand=True, pady=5)
+response_pager = ttk.Frame(response_frame)
+response_pager.pack(side="bottom", fill="x", pady=(5, 0))
+response_prev_button = ttk.Button(response_pager, text="◀ Prev", state="disabled",
+                                  command=lambda: show_response_page(-1))
+response_prev_button.pack(side="left")
+response_next_button = ttk.Button(response_pager, text="Next ▶", state="disabled",
+                                  command=lambda: show_response_page(1))
+response_next_button.pack(side="left", padx=5)
+response_page_label = ttk.Label(response_pager, text="")
+response_page_label.pack(side="left", padx=5)
+save_to_file_var = tk.BooleanVar(value=False)
+response_save_button = ttk.Button(response_pager, text="Save Response...", state="disabled",
+                                  command=lambda: save_response())
+response_save_button.pack(side="right")
+ttk.Checkbutton(response_pager, text="Save to file on send", variable=save_to_file_var).pack(side="right", padx=10)
 response_textbox = tk.Text(response_frame, wrap="word")
 response_textbox.pack(fill="both", expand=True)
 
@@ -94,6 +167,8 @@ response_time_label = ttk.Label(metrics_frame, text="Time: ")
 response_time_label.pack(side="left", padx=10)
 response_size_label = ttk.Label(metrics_frame, text="Size: ")
 response_size_label.pack(side="left", padx=10)
+elapsed_label = ttk.Label(metrics_frame, text="")
+elapsed_label.pack(side="right", padx=10)
 
 # Config Tab
 config_tab = ttk.Frame(notebook, padding=10)
@@ -109,7 +184,15 @@ password_entry.pack(fill="x")
 
 ttk.Label(config_tab, text="Auth Mode").pack(anchor="w")
 auth_mode = tk.StringVar(value="Basic Auth")
-ttk.Combobox(config_tab, textvariable=auth_mode, values=["Basic Auth", "Header", "Query Params"]).pack(fill="x")
+ttk.Combobox(config_tab, textvariable=auth_mode, values=AUTH_MODES).pack(fill="x")
+
+ttk.Label(config_tab, text="Access Token (Bearer Token mode, e.g. a Magento integration token)").pack(anchor="w")
+token_entry = ttk.Entry(config_tab, show="*")
+token_entry.pack(fill="x")
+
+ttk.Label(config_tab, text="Token URL (Token Login mode: posts username/password, relative to the request URL)").pack(anchor="w")
+token_url_var = tk.StringVar(value=MAGENTO_TOKEN_PATH)
+ttk.Entry(config_tab, textvariable=token_url_var).pack(fill="x")
 
 ssl_var = tk.BooleanVar(value=False)
 redirect_var = tk.BooleanVar(value=True)
@@ -118,9 +201,26 @@ pretty_var = tk.BooleanVar(value=True)
 
 ttk.Checkbutton(config_tab, text="Verify SSL", variable=ssl_var).pack(anchor="w")
 ttk.Checkbutton(config_tab, text="Follow Redirects", variable=redirect_var).pack(anchor="w")
-ttk.Checkbutton(config_tab, text="Batch Requests", variable=batch_var).pack(anchor="w")
+ttk.Checkbutton(config_tab, text="Batch Requests (Send runs the collection on the Runner tab)",
+                variable=batch_var).pack(anchor="w")
 ttk.Checkbutton(config_tab, text="Pretty Print JSON", variable=pretty_var).pack(anchor="w")
 
+ttk.Label(config_tab, text="Connect Timeout (s)").pack(anchor="w")
+connect_timeout_var = tk.StringVar(value=str(DEFAULT_CONNECT_TIMEOUT))
+ttk.Entry(config_tab, textvariable=connect_timeout_var, width=8).pack(anchor="w")
+ttk.Label(config_tab, text="Read Timeout (s)").pack(anchor="w")
+read_timeout_var = tk.StringVar(value=str(DEFAULT_READ_TIMEOUT))
+ttk.Entry(config_tab, textvariable=read_timeout_var, width=8).pack(anchor="w")
+
+ttk.Label(config_tab, text="Connection Pool Size (per host)").pack(anchor="w")
+pool_size_var = tk.StringVar(value=str(DEFAULT_POOL_SIZE))
+ttk.Entry(config_tab, textvariable=pool_size_var, width=8).pack(anchor="w")
+http2_var = tk.BooleanVar(value=False)
+ttk.Checkbutton(config_tab, text="HTTP/2" if HTTP2_AVAILABLE else "HTTP/2 (needs: pip install httpx[http2])",
+                variable=http2_var, state="normal" if HTTP2_AVAILABLE else "disabled").pack(anchor="w")
+ttk.Button(config_tab, text="Clear Cookies",
+           command=lambda: (sessions.clear_cookies(), update_status("Cookies cleared."))).pack(anchor="w", pady=5)
+
 ttk.Label(config_tab, text="Theme").pack(anchor="w")
 theme_var = tk.StringVar(value="flatly")
 ttk.Combobox(config_tab, textvariable=theme_var, values=style.theme_names(), width=20).pack(anchor="w")
@@ -130,28 +230,87 @@ ttk.Button(config_tab, text="Apply Theme", command=lambda: style.theme_use(theme
 history_tab = ttk.Frame(notebook, padding=10)
 notebook.add(history_tab, text="History")
 
-history_listbox = tk.Listbox(history_tab, height=20)
-history_listbox.pack(side="left", fill="y", padx=5)
+history_filter_frame = ttk.Frame(history_tab)
+history_filter_frame.pack(side="top", fill="x", pady=(0, 5))
+ttk.Label(history_filter_frame, text="Method").pack(side="left")
+history_method_var = tk.StringVar(value="All")
+ttk.Combobox(history_filter_frame, textvariable=history_method_var, state="readonly", width=8,
+             values=["All", "GET", "POST", "PATCH", "PUT", "DELETE"]).pack(side="left", padx=5)
+ttk.Label(history_filter_frame, text="URL starts with").pack(side="left")
+history_url_var = tk.StringVar()
+history_url_entry = ttk.Entry(history_filter_frame, textvariable=history_url_var, width=40)
+history_url_entry.pack(side="left", padx=5)
+history_since_var = tk.StringVar(value="Any time")
+ttk.Combobox(history_filter_frame, textvariable=history_since_var, values=list(HISTORY_SINCE), state="readonly",
+             width=12).pack(side="left", padx=5)
+ttk.Button(history_filter_frame, text="Filter", bootstyle="info", command=lambda: reload_history()).pack(side="left")
+
+history_buttons = ttk.Frame(history_tab)
+history_buttons.pack(side="bottom", fill="x", pady=5)
+
+history_listbox = tk.Listbox(history_tab, height=20, width=45)
+history_scroll = ttk.Scrollbar(history_tab, orient="vertical", command=history_listbox.yview)
+history_listbox.pack(side="left", fill="y", padx=(5, 0))
+history_scroll.pack(side="left", fill="y", padx=(0, 5))
 history_preview = tk.Text(history_tab, height=20, width=60)
 history_preview.pack(side="left", fill="both", expand=True)
 
-def populate_history():
+def history_filters():
+    days = HISTORY_SINCE.get(history_since_var.get())
+    since = None
+    if days:
+        midnight = time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
+        since = midnight - (days - 1) * 86400
+    return {"method": None if history_method_var.get() == "All" else history_method_var.get(),
+            "url_prefix": history_url_var.get().strip() or None, "since": since}
+
+def reload_history():
+    global history_more, history_total
     history_listbox.delete(0, tk.END)
-    for req in request_history:
-        history_listbox.insert(tk.END, req.get("name", "Unnamed"))
+    history_ids.clear()
+    history_more = True
+    history_preview.delete("1.0", tk.END)
+    history_total = store.count(**history_filters())
+    load_history_page()
 
-def load_history():
-    global request_history
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r") as f:
-            request_history = json.load(f)
-    populate_history()
+def load_history_page():
+    """Append the next page of matching entries below the loaded rows."""
+    global history_more, history_loading
+    history_loading = False
+    rows = store.page(before_id=history_ids[-1] if history_ids else None, **history_filters())
+    for entry_id, name in rows:
+        history_ids.append(entry_id)
+        history_listbox.insert(tk.END, name)
+    history_more = len(rows) == PAGE_SIZE
+    update_history_count()
+    on_history_scroll(*history_listbox.yview())  # still at the bottom: the page did not fill the view
+
+def on_history_scroll(first, last):
+    global history_loading
+    history_scroll.set(first, last)
+    if history_more and not history_loading and float(last) > 0.9:
+        history_loading = True
+        root.after_idle(load_history_page)
+
+def update_history_count():
+    history_count_label.config(text=f"{len(history_ids):,} of {history_total:,} shown")
+
+def add_history_entry(entry):
+    """Store a sent request and show it at the top if it matches the filters."""
+    global history_total
+    entry_id = store.add(entry)
+    f = history_filters()
+    if (f["method"] in (None, entry["method"])) and entry["url"].startswith(f["url_prefix"] or ""):
+        history_ids.insert(0, entry_id)
+        history_listbox.insert(0, entry["name"])
+        history_total += 1
+        update_history_count()
 
 def on_history_select(event=None):
     selection = history_listbox.curselection()
     if selection:
         index = selection[0]
-        req = request_history[index]
+        req = store.get(history_ids[index])
         preview = json.dumps(req, indent=2)
         history_preview.delete("1.0", tk.END)
         history_preview.insert(tk.END, preview)
@@ -159,34 +318,189 @@ def on_history_select(event=None):
 def export_collection():
     file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
     if file_path:
+        # Streamed from the store: same JSON list as before, without loading it all
+        n = 0
         with open(file_path, "w") as f:
-            json.dump(request_history, f, indent=2)
-        update_status(f"Exported collection to {file_path}")
+            f.write("[")
+            for entry in store.iter_entries():
+                f.write(",\n  " if n else "\n  ")
+                f.write(json.dumps(entry))
+                n += 1
+            f.write("\n]\n" if n else "]\n")
+        update_status(f"Exported collection of {n:,} requests to {file_path}")
 
 def delete_selected_request():
+    global history_total
     selection = history_listbox.curselection()
     if selection:
         index = selection[0]
-        del request_history[index]
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(request_history, f, indent=2)
-        populate_history()
+        store.delete(history_ids.pop(index))
+        history_listbox.delete(index)
+        history_total -= 1
+        update_history_count()
         history_preview.delete("1.0", tk.END)
 
+history_listbox.configure(yscrollcommand=on_history_scroll)
 history_listbox.bind("<<ListboxSelect>>", on_history_select)
+history_url_entry.bind("<Return>", lambda e: reload_history())
 
-history_buttons = ttk.Frame(history_tab)
-history_buttons.pack(side="bottom", fill="x", pady=5)
 ttk.Button(history_buttons, text="Export Collection", command=export_collection).pack(side="left", padx=5)
 ttk.Button(history_buttons, text="Delete Selected", command=delete_selected_request).pack(side="left", padx=5)
+history_count_label = ttk.Label(history_buttons, text="")
+history_count_label.pack(side="right", padx=5)
+
+# Runner Tab
+runner_tab = ttk.Frame(notebook, padding=10)
+notebook.add(runner_tab, text="Runner")
+
+runner_options = ttk.Frame(runner_tab)
+runner_options.pack(fill="x")
+ttk.Label(runner_options, text="Source").pack(side="left")
+runner_source_var = tk.StringVar(value="History")
+runner_source_box = ttk.Combobox(runner_options, textvariable=runner_source_var, values=["History"],
+                                 state="readonly", width=34)
+runner_source_box.pack(side="left", padx=5)
+ttk.Button(runner_options, text="Import Collection", bootstyle="info", command=lambda: import_collection()).pack(side="left", padx=5)
+ttk.Label(runner_options, text="Concurrency").pack(side="left", padx=(10, 0))
+runner_concurrency_var = tk.StringVar(value="4")
+ttk.Spinbox(runner_options, from_=1, to=RUNNER_MAX_CONCURRENCY, textvariable=runner_concurrency_var,
+            width=4).pack(side="left", padx=5)
+ttk.Label(runner_options, text="Order").pack(side="left")
+runner_order_var = tk.StringVar(value=RUNNER_ORDERS[0])
+ttk.Combobox(runner_options, textvariable=runner_order_var, values=RUNNER_ORDERS, state="readonly",
+             width=9).pack(side="left", padx=5)
+ttk.Label(runner_options, text="Iterations").pack(side="left")
+runner_iterations_var = tk.StringVar(value="1")
+ttk.Spinbox(runner_options, from_=1, to=1000, textvariable=runner_iterations_var, width=5).pack(side="left", padx=5)
+
+runner_buttons = ttk.Frame(runner_tab)
+runner_buttons.pack(fill="x", pady=5)
+runner_run_button = ttk.Button(runner_buttons, text="Run", bootstyle="success", command=lambda: run_collection())
+runner_run_button.pack(side="left", padx=5)
+runner_stop_button = ttk.Button(runner_buttons, text="Stop", bootstyle="danger", state="disabled",
+                                command=lambda: stop_collection())
+runner_stop_button.pack(side="left", padx=5)
+ttk.Button(runner_buttons, text="Export Report", command=lambda: export_runner_report()).pack(side="left", padx=5)
+runner_progress = ttk.Progressbar(runner_buttons, mode="determinate")
+runner_progress.pack(side="left", fill="x", expand=True, padx=5)
+
+runner_summary_label = ttk.Label(runner_tab, text="", anchor="w")
+runner_summary_label.pack(fill="x", pady=(0, 5))
+
+runner_table = ttk.Frame(runner_tab)
+runner_table.pack(fill="both", expand=True)
+runner_tree = ttk.Treeview(runner_table, columns=RUNNER_FIELDS, show="headings")
+for col, width in zip(RUNNER_FIELDS, [60, 50, 200, 60, 260, 60, 40, 70, 70, 200]):
+    runner_tree.heading(col, text=col.replace("_", " ").title())
+    runner_tree.column(col, width=width, anchor="w")
+runner_tree.tag_configure("failed", foreground="red")
+runner_scroll = ttk.Scrollbar(runner_table, orient="vertical", command=runner_tree.yview)
+runner_tree.configure(yscrollcommand=runner_scroll.set)
+runner_scroll.pack(side="right", fill="y")
+runner_tree.pack(side="left", fill="both", expand=True)
+
+# Load Test Tab
+load_tab = ttk.Frame(notebook, padding=10)
+notebook.add(load_tab, text="Load Test")
+
+load_options = ttk.Frame(load_tab)
+load_options.pack(fill="x")
+ttk.Label(load_options, text="Mode").pack(side="left")
+load_mode_var = tk.StringVar(value=LOAD_MODES[0])
+ttk.Combobox(load_options, textvariable=load_mode_var, values=LOAD_MODES, state="readonly",
+             width=12).pack(side="left", padx=5)
+ttk.Label(load_options, text="Workers").pack(side="left", padx=(10, 0))
+load_workers_var = tk.StringVar(value="8")
+ttk.Spinbox(load_options, from_=1, to=256, textvariable=load_workers_var, width=5).pack(side="left", padx=5)
+ttk.Label(load_options, text="Target RPS").pack(side="left")
+load_rps_var = tk.StringVar(value="50")
+ttk.Entry(load_options, textvariable=load_rps_var, width=7).pack(side="left", padx=5)
+ttk.Label(load_options, text="Duration (s)").pack(side="left")
+load_duration_var = tk.StringVar(value="30")
+ttk.Entry(load_options, textvariable=load_duration_var, width=6).pack(side="left", padx=5)
+ttk.Label(load_options, text="Ramp-up (s)").pack(side="left")
+load_ramp_var = tk.StringVar(value="5")
+ttk.Entry(load_options, textvariable=load_ramp_var, width=6).pack(side="left", padx=5)
+
+load_buttons = ttk.Frame(load_tab)
+load_buttons.pack(fill="x", pady=5)
+load_start_button = ttk.Button(load_buttons, text="Start", bootstyle="success", command=lambda: start_load_test())
+load_start_button.pack(side="left", padx=5)
+load_stop_button = ttk.Button(load_buttons, text="Stop", bootstyle="danger", state="disabled",
+                              command=lambda: load_test and load_test.stop())
+load_stop_button.pack(side="left", padx=5)
+ttk.Button(load_buttons, text="Export Results", command=lambda: export_load_test()).pack(side="left", padx=5)
+ttk.Label(load_buttons, text="Runs the request on the Client tab (Workers caps requests in flight at a target RPS).",
+          anchor="w").pack(side="left", padx=10)
+
+load_throughput_label = ttk.Label(load_tab, text="", anchor="w")
+load_throughput_label.pack(fill="x")
+load_latency_label = ttk.Label(load_tab, text="", anchor="w")
+load_latency_label.pack(fill="x")
+load_errors_label = ttk.Label(load_tab, text="", anchor="w")
+load_errors_label.pack(fill="x")
+load_canvas = tk.Canvas(load_tab, height=220, background="white", highlightthickness=0)
+load_canvas.pack(fill="both", expand=True, pady=5)
 
 # Request Logic
-def make_request():
+def build_auth(user, pwd, mode, headers, token="", token_url="", verify=True):
+    """(auth, params) for the Config tab's auth mode; Header mode adds to headers instead.
+
+    Auth objects are cached by the session pool, so a Token Login token is reused
+    across sends until it expires or is rejected.
+    """
+    auth = None
+    params = {}
+    if mode == "Basic Auth":
+        auth = sessions.basic_auth(user, pwd)
+    elif mode == "Header":
+        encoded = base64.b64encode(f"{user}:{pwd}".encode()).decode()
+        headers["Authorization"] = f"Basic {encoded}"
+    elif mode == "Query Params":
+        params = {"username": user, "password": pwd}
+    elif mode == "Bearer Token":
+        auth = sessions.bearer_auth(token)
+    elif mode == "Token Login":
+        auth = sessions.token_login(token_url, user, pwd, verify)
+    return auth, params
+
+def read_pool_settings():
+    """Apply the Config tab's pool size and HTTP/2 setting; False after telling the user they are invalid."""
+    try:
+        size = int(pool_size_var.get())
+        if not 1 <= size <= MAX_POOL_SIZE:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("Invalid Pool Size", f"Connection pool size must be 1-{MAX_POOL_SIZE}.")
+        return False
+    sessions.configure(size, http2_var.get())
+    return True
+
+def read_timeouts():
+    """(connect, read) from the Config tab, or None after telling the user they are invalid."""
+    try:
+        timeout = (float(connect_timeout_var.get()), float(read_timeout_var.get()))
+        if min(timeout) <= 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("Invalid Timeout", "Connect and read timeouts must be positive numbers of seconds.")
+        return None
+    return timeout
+
+def describe_error(e, timeout):
+    if isinstance(e, requests.ConnectTimeout):
+        return f"Could not connect within {timeout[0]:g}s."
+    # A body that stalls mid-download surfaces as ConnectionError(ReadTimeoutError)
+    if isinstance(e, requests.ReadTimeout) or (e.args and isinstance(e.args[0], ReadTimeoutError)):
+        return f"No response for {timeout[1]:g}s."
+    return str(e)
+
+def collect_request():
+    """The Client tab's request as (history entry, requests kwargs), or None after reporting bad input."""
     url = url_entry.get()
     method = method_var.get()
     verify = ssl_var.get()
     redirects = redirect_var.get()
-    pretty = pretty_var.get()
     user = username_entry.get()
     pwd = password_entry.get()
     mode = auth_mode.get()
@@ -205,58 +519,542 @@ def make_request():
             body = json.loads(body_input)
         except json.JSONDecodeError:
             messagebox.showerror("Invalid JSON", "Request body is not valid JSON.")
-            return
+            return None
     elif method == "GET":
         body_textbox.config(state="disabled")
     else:
         body_textbox.config(state="normal")
 
-    auth = None
-    params = {}
-    if mode == "Basic Auth":
-        auth = requests.auth.HTTPBasicAuth(user, pwd)
-    elif mode == "Header":
-        encoded = base64.b64encode(f"{user}:{pwd}".encode()).decode()
-        headers["Authorization"] = f"Basic {encoded}"
-    elif mode == "Query Params":
-        params = {"username": user, "password": pwd}
+    auth, params = build_auth(user, pwd, mode, headers, token_entry.get().strip(), token_url_var.get().strip(),
+                              verify)
+    timeout = read_timeouts()
+    if timeout is None or not read_pool_settings():
+        return None
+    entry = {"name": f"{method} {url}", "url": url, "method": method, "headers": headers, "body": body}
+    kwargs = {"headers": headers, "json": body, "auth": auth, "params": params, "verify": verify,
+              "allow_redirects": redirects, "timeout": timeout}
+    return entry, kwargs
+
+def make_request():
+    if batch_var.get():
+        notebook.select(runner_tab)
+        run_collection()
+        return
+    collected = collect_request()
+    if collected is None:
+        return
+    entry, kwargs = collected
+    method, url, timeout = entry["method"], entry["url"], kwargs.pop("timeout")
+    save_path = None
+    if save_to_file_var.get():
+        save_path = filedialog.asksaveasfilename(title="Save response to")
+        if not save_path:
+            return
+
+    global request_seq, shown_request
+    request_seq += 1
+    req_id = shown_request = request_seq
+    cancel = threading.Event()
+    progress = ["Downloading", 0, None]  # phase, bytes done, bytes expected
+    in_flight[req_id] = (cancel, time.perf_counter(), entry["name"], progress)
+    future = executor.submit(send_request, cancel, method, url, pretty_var.get(), timeout, save_path, progress,
+                             **kwargs)
+    future.add_done_callback(lambda f: root.after(0, finish_request, req_id, f, entry, timeout))
+    if not elapsed_ticking:
+        tick_elapsed()
+    update_in_flight()
+
+def fetch(cancel, method, url, timeout, session=None, body=None, progress=None, **kwargs):
+    """Worker thread: send and read the body in chunks, checking cancel. Returns (response, content, seconds).
+
+    session defaults to the pooled keep-alive session for url's host. With a ResponseBody
+    the chunks are written to it and content is None; progress (see make_request) is
+    kept current for the elapsed display.
+    """
+    start = time.perf_counter()
+    with (session or sessions.get(url)).request(method, url, stream=True, timeout=timeout, **kwargs) as response:
+        if progress is not None:
+            progress[2] = int(response.headers.get("Content-Length") or 0) or None
+        chunks = []
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if cancel.is_set():
+                raise RequestCancelled()
+            if body is None:
+                chunks.append(chunk)
+            else:
+                body.write(chunk)
+            if progress is not None:
+                progress[1] += len(chunk)
+    return response, None if body is not None else b"".join(chunks), time.perf_counter() - start
+
+def send_request(cancel, method, url, pretty, timeout, save_path, progress, **kwargs):
+    """Worker thread: stream the body to a ResponseBody and prepare it for display.
+
+    Returns (status, seconds, size, body, preview): preview is the whole text up to
+    PREVIEW_LIMIT, otherwise a ResponseBody (the body, or a pretty-printed copy) to page through.
+    """
+    body = ResponseBody(save_path)
+    try:
+        response, _, seconds = fetch(cancel, method, url, timeout, body=body, progress=progress, **kwargs)
+        body.encoding = response.encoding or "utf-8"
+        is_json = pretty and "application/json" in response.headers.get("Content-Type", "")
+        if body.size <= PREVIEW_LIMIT:
+            preview = body.text()
+            if is_json:
+                try:
+                    preview = json.dumps(json.loads(preview), indent=4)
+                except ValueError:
+                    pass
+        elif is_json:
+            def formatted(n):
+                if cancel.is_set():
+                    raise RequestCancelled()
+                progress[1] = n
+            progress[:] = ["Formatting", 0, body.size]
+            preview = ResponseBody()
+            try:
+                pretty_json(body, preview, progress=formatted)
+            except BaseException:
+                preview.close()
+                raise
+        else:
+            preview = body
+    except BaseException:
+        body.discard()
+        raise
+    return response.status_code, round(seconds, 2), body.size, body, preview
 
+def format_bytes(n):
+    for unit in ("bytes", "KB", "MB"):
+        if n < 1024 or unit == "MB":
+            return f"{n:,} {unit}" if unit == "bytes" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+def finish_request(req_id, future, entry, timeout):
+    if in_flight.pop(req_id, None) is None:
+        # Cancelled; the worker's result is dropped
+        if not future.cancelled() and future.exception() is None:
+            close_response(*future.result()[3:])
+        return
+    update_in_flight()
+    shown = req_id == shown_request
     try:
-        start = time.time()
-        response = requests.request(method, url, headers=headers, json=body, auth=auth, params=params, verify=verify, allow_redirects=redirects)
-        end = time.time()
-        duration = round(end - start, 2)
-        size = len(response.content)
+        status, duration, size, body, preview = future.result()
+    except Exception as e:
+        error = describe_error(e, timeout)
+    else:
+        error = None
+    if error:
+        if shown:
+            messagebox.showerror("Request Error", error)
+        else:
+            update_status(f"{entry['name']}: {error}")
+        return
 
-        response_code_label.config(text=f"Status Code: {response.status_code}", foreground="green")
+    saved = f", saved to {body.path}" if body.path else ""
+    if shown:
+        response_code_label.config(text=f"Status Code: {status}", foreground="green")
         response_time_label.config(text=f"Time: {duration}s", foreground="blue")
         response_size_label.config(text=f"Size: {size} bytes", foreground="purple")
+        show_response(body, preview)
+        if saved:
+            update_status(f"{entry['name']}: {format_bytes(size)}{saved}")
+    else:
+        update_status(f"{entry['name']}: {status} in {duration}s ({size} bytes{saved})")
+        close_response(body, preview)
 
-        response_textbox.config(state="normal")
-        response_textbox.delete("1.0", tk.END)
-        if pretty and "application/json" in response.headers.get("Content-Type", ""):
-            try:
-                formatted = json.dumps(response.json(), indent=4)
-                response_textbox.insert(tk.END, formatted)
-            except:
-                response_textbox.insert(tk.END, response.text)
-        else:
-            response_textbox.insert(tk.END, response.text)
-        response_textbox.config(state="disabled")
-
-        request_history.append({
-            "name": f"{method} {url}",
-            "url": url,
-            "method": method,
-            "headers": headers,
-            "body": body
-        })
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(request_history, f, indent=2)
-        populate_history()
+    add_history_entry(entry)
+
+def close_response(body, preview):
+    body.close()
+    if isinstance(preview, ResponseBody) and preview is not body:
+        preview.close()
+
+def show_response(body, preview):
+    """Put a finished response in the Response pane: whole, or its first page when over PREVIEW_LIMIT."""
+    global response_body, response_view
+    if response_body is not None:
+        close_response(response_body, response_view)
+    response_body = body
+    response_view = preview if isinstance(preview, ResponseBody) else None
+    response_save_button.config(state="normal")
+    response_pages.clear()
+    if response_view is None:
+        set_response_text(preview)
+        response_page_label.config(text="")
+        response_prev_button.config(state="disabled")
+        response_next_button.config(state="disabled")
+    else:
+        show_response_page(0)
+
+def show_response_page(step):
+    """Show the first page (0), the next (1) or the previous (-1) page of response_view."""
+    global response_next
+    if step > 0:
+        offset = response_next
+    elif step < 0:
+        response_pages.pop()
+        offset = response_pages.pop()
+    else:
+        offset = 0
+    text, response_next = response_view.page(offset)
+    response_pages.append(offset)
+    set_response_text(text)
+    end = response_next if response_next is not None else response_view.size
+    response_page_label.config(text=f"Showing {format_bytes(offset)}–{format_bytes(end)} of "
+                                     f"{format_bytes(response_view.size)}")
+    response_prev_button.config(state="normal" if len(response_pages) > 1 else "disabled")
+    response_next_button.config(state="normal" if response_next is not None else "disabled")
+
+def set_response_text(text):
+    response_textbox.config(state="normal")
+    response_textbox.delete("1.0", tk.END)
+    response_textbox.insert(tk.END, text)
+    response_textbox.config(state="disabled")
+
+def save_response():
+    if response_body is None:
+        return
+    file_path = filedialog.asksaveasfilename(title="Save response as")
+    if file_path:
+        response_body.save_as(file_path)
+        update_status(f"Saved {format_bytes(response_body.size)} response to {file_path}")
+
+def cancel_requests():
+    """Abandon every in-flight request; a worker stuck in connect/read is freed by its timeout."""
+    n = len(in_flight)
+    for cancel, *_ in in_flight.values():
+        cancel.set()
+    in_flight.clear()
+    update_in_flight()
+    update_status(f"Cancelled {n} request{'s' if n != 1 else ''}.")
+
+def update_in_flight():
+    cancel_button.config(state="normal" if in_flight else "disabled",
+                         text=f"Cancel ({len(in_flight)})" if len(in_flight) > 1 else "Cancel")
+    if not in_flight:
+        elapsed_label.config(text="")
+
+def tick_elapsed():
+    global elapsed_ticking
+    elapsed_ticking = bool(in_flight)
+    if not in_flight:
+        return
+    now = time.perf_counter()
+    current = in_flight.get(shown_request)
+    _, start, name, (phase, done, expected) = current if current else min(in_flight.values(), key=lambda v: v[1])
+    text = f"{name}: {now - start:.1f}s"
+    if done:
+        text += f", {phase.lower()} {format_bytes(done)}"
+        if expected and done <= expected:
+            text += f" of {format_bytes(expected)}"
+    if len(in_flight) > 1:
+        text += f" ({len(in_flight)} in flight)"
+    elapsed_label.config(text=text)
+    root.after(ELAPSED_TICK_MS, tick_elapsed)
+
+# Collection Runner
+def normalise_collection(data):
+    """History-style list of {name, url, method, headers, body} from our exports or a Postman v2 collection."""
+    if isinstance(data, list):
+        return [r for r in data if isinstance(r, dict) and r.get("url")]
+    entries = []
 
+    def walk(items):
+        for item in items:
+            if "item" in item:
+                walk(item["item"])
+                continue
+            req = item.get("request") or {}
+            if isinstance(req, str):
+                req = {"url": req}
+            url = req.get("url", "")
+            if isinstance(url, dict):
+                url = url.get("raw", "")
+            headers = {h["key"]: h.get("value", "") for h in req.get("header", [])
+                       if isinstance(h, dict) and h.get("key") and not h.get("disabled")}
+            entry = {"name": item.get("name") or url, "url": url, "method": req.get("method", "GET").upper(),
+                     "headers": headers, "body": None}
+            raw = (req.get("body") or {}).get("raw")
+            if raw:
+                try:
+                    entry["body"] = json.loads(raw)
+                except ValueError:
+                    entry["body"], entry["body_format"] = raw, "raw"
+            if url:
+                entries.append(entry)
+
+    walk(data.get("item", []) if isinstance(data, dict) else [])
+    return entries
+
+def import_collection():
+    global imported_collection
+    file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+    if not file_path:
+        return
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            entries = normalise_collection(json.load(f))
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Import Collection", f"Could not read {file_path}:\n{e}")
+        return
+    if not entries:
+        messagebox.showwarning("Import Collection", "No requests found in that file.")
+        return
+    imported_collection = entries
+    label = f"Imported: {os.path.basename(file_path)} ({len(entries)} requests)"
+    runner_source_box.config(values=["History", label])
+    runner_source_var.set(label)
+    update_status(f"Imported {len(entries)} requests from {file_path}")
+
+def run_collection():
+    global runner_run, runner_results
+    if runner_run is not None:
+        return
+    entries = list(store.iter_entries()) if runner_source_var.get() == "History" else list(imported_collection)
+    if not entries:
+        messagebox.showinfo("Runner", "No requests to run. Send some requests or import a collection first.")
+        return
+    timeout = read_timeouts()
+    if timeout is None:
+        return
+    try:
+        concurrency = int(runner_concurrency_var.get())
+        iterations = int(runner_iterations_var.get())
+        if not 1 <= concurrency <= RUNNER_MAX_CONCURRENCY or iterations < 1:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("Runner", f"Concurrency must be 1-{RUNNER_MAX_CONCURRENCY} and iterations at least 1.")
+        return
+
+    if not read_pool_settings():
+        return
+    auth_headers = {}
+    auth, params = build_auth(username_entry.get(), password_entry.get(), auth_mode.get(), auth_headers,
+                              token_entry.get().strip(), token_url_var.get().strip(), ssl_var.get())
+    options = {"auth": auth, "params": params, "verify": ssl_var.get(), "allow_redirects": redirect_var.get()}
+    jobs = []
+    for iteration in range(1, iterations + 1):
+        order = list(range(len(entries)))
+        if runner_order_var.get() == "Reverse":
+            order.reverse()
+        elif runner_order_var.get() == "Shuffled":
+            random.shuffle(order)
+        jobs.extend((iteration, i) for i in order)
+
+    session = sessions.new_session(concurrency, hosts=4)
+    run = runner_run = {"cancel": threading.Event(), "results": queue.SimpleQueue(), "session": session,
+                        "pool": ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="runner"),
+                        "total": len(jobs), "received": 0, "start": time.perf_counter(), "timeout": timeout}
+    for iteration, i in jobs:
+        run["pool"].submit(run_one, run, iteration, i, entries[i], auth_headers, options)
+    run["pool"].shutdown(wait=False)
+
+    runner_results = []
+    runner_tree.delete(*runner_tree.get_children())
+    runner_progress.config(maximum=len(jobs), value=0)
+    runner_run_button.config(state="disabled")
+    runner_stop_button.config(state="normal")
+    update_status(f"Running {len(entries)} requests x {iterations} with concurrency {concurrency}...")
+    root.after(RUNNER_POLL_MS, poll_runner)
+
+def run_one(run, iteration, index, entry, auth_headers, options):
+    """Worker thread: send one collection entry and queue its result row (None if the run was stopped)."""
+    if run["cancel"].is_set():
+        run["results"].put(None)
+        return
+    method = entry.get("method", "GET")
+    headers = dict(entry.get("headers") or {}, **auth_headers)
+    body = entry.get("body")
+    kwargs = dict(options, headers=headers)
+    if body is not None:
+        kwargs["data" if entry.get("body_format") == "raw" else "json"] = body
+    row = {"iteration": iteration, "index": index + 1, "name": entry.get("name") or entry["url"],
+           "method": method, "url": entry["url"], "status": "", "ok": False, "time_ms": "", "size": "",
+           "error": ""}
+    start = time.perf_counter()
+    try:
+        response, content, seconds = fetch(run["cancel"], method, entry["url"], run["timeout"],
+                                           session=run["session"], **kwargs)
+    except RequestCancelled:
+        run["results"].put(None)
+        return
     except Exception as e:
-        messagebox.showerror("Request Error", str(e))
+        row.update(time_ms=round((time.perf_counter() - start) * 1000, 1), error=describe_error(e, run["timeout"]))
+    else:
+        row.update(status=response.status_code, ok=response.status_code < 400, time_ms=round(seconds * 1000, 1),
+                   size=len(content))
+    run["results"].put(row)
+
+def poll_runner():
+    global runner_last_summary
+    run = runner_run
+    if run is None:
+        return
+    while True:
+        try:
+            row = run["results"].get_nowait()
+        except queue.Empty:
+            break
+        run["received"] += 1
+        if row is None:
+            continue
+        runner_results.append(row)
+        if len(runner_results) <= RUNNER_MAX_ROWS:
+            runner_tree.insert("", tk.END, values=[row[c] for c in runner_tree["columns"]],
+                               tags=() if row["ok"] else ("failed",))
+    runner_progress.config(value=run["received"])
+    summary = runner_last_summary = runner_summary(runner_results, time.perf_counter() - run["start"])
+    runner_summary_label.config(text=format_runner_summary(summary))
+    if run["received"] < run["total"]:
+        root.after(RUNNER_POLL_MS, poll_runner)
+        return
+    finish_runner(summary)
+
+def finish_runner(summary):
+    global runner_run
+    runner_run["session"].close()
+    stopped = runner_run["cancel"].is_set()
+    runner_run = None
+    runner_run_button.config(state="normal")
+    runner_stop_button.config(state="disabled")
+    update_status(("Run stopped: " if stopped else "Run finished: ") + format_runner_summary(summary))
+
+def stop_collection():
+    if runner_run is not None:
+        runner_run["cancel"].set()
+        update_status("Stopping run...")
+
+def runner_summary(rows, elapsed):
+    times = [r["time_ms"] for r in rows if r["time_ms"] != ""]
+    passed = sum(1 for r in rows if r["ok"])
+    return {"requests": len(rows), "passed": passed, "failed": len(rows) - passed,
+            "seconds": round(elapsed, 2), "requests_per_s": round(len(rows) / elapsed, 1) if elapsed else None,
+            "mean_ms": round(sum(times) / len(times), 1) if times else None,
+            "min_ms": min(times) if times else None, "max_ms": max(times) if times else None,
+            "bytes": sum(r["size"] for r in rows if r["size"] != "")}
+
+def format_runner_summary(s):
+    text = f"{s['requests']} requests: {s['passed']} passed, {s['failed']} failed in {s['seconds']}s"
+    if s["mean_ms"] is not None:
+        text += f" | mean {s['mean_ms']} ms, min {s['min_ms']} ms, max {s['max_ms']} ms | {s['requests_per_s']} req/s"
+    return text
+
+def export_runner_report():
+    if not runner_results:
+        messagebox.showinfo("Runner", "No results to export yet.")
+        return
+    file_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                             filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json")])
+    if not file_path:
+        return
+    rows = list(runner_results)
+    with open(file_path, "w", newline="", encoding="utf-8") as f:
+        if file_path.lower().endswith(".json"):
+            json.dump({"summary": runner_last_summary, "results": rows}, f, indent=2)
+        else:
+            writer = csv.DictWriter(f, fieldnames=RUNNER_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    update_status(f"Exported {len(rows)} results to {file_path}")
+
+# Load Test
+def start_load_test():
+    global load_test
+    if load_test is not None and load_test.running:
+        return
+    collected = collect_request()
+    if collected is None:
+        return
+    entry, kwargs = collected
+    paced = load_mode_var.get() == "Target RPS"
+    try:
+        workers = int(load_workers_var.get())
+        rps = float(load_rps_var.get()) if paced else None
+        duration = float(load_duration_var.get())
+        ramp_up = float(load_ramp_var.get() or 0)
+        if workers < 1 or duration <= 0 or ramp_up < 0 or (paced and rps <= 0):
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("Load Test", "Workers, duration and target RPS must be positive numbers.")
+        return
+    load_test = LoadTest(entry["method"], entry["url"], workers, rps, duration, ramp_up, **kwargs).start()
+    load_start_button.config(state="disabled")
+    load_stop_button.config(state="normal")
+    update_status(f"Load testing {entry['name']} for {duration:g}s...")
+    root.after(LOAD_REFRESH_MS, refresh_load_test)
+
+def refresh_load_test():
+    test = load_test
+    if test is None:
+        return
+    done = not test.running
+    s = test.snapshot()
+    current = f"{s['rps_current']} req/s now, " if s["rps_current"] is not None else ""
+    target = f" (target {s['target_rps']:g})" if s["target_rps"] else ""
+    missed = f", {s['missed']:,} slots missed - add workers" if s["missed"] else ""
+    load_throughput_label.config(
+        text=f"{s['elapsed_s']:.1f}s: {s['completed']:,} done, {s['in_flight']} in flight | "
+             f"{current}{s['rps_avg']} req/s avg{target}{missed}")
+    load_latency_label.config(text=f"Latency ms: p50 {s['p50_ms']}  p90 {s['p90_ms']}  p99 {s['p99_ms']}  "
+                                   f"max {s['max_ms']}  mean {s['mean_ms']}")
+    errors = ", ".join(f"{k}: {v:,}" for k, v in s["errors"].items()) or "none"
+    load_errors_label.config(text=f"{s['ok']:,} ok, {s['failed']:,} failed | errors: {errors}",
+                             foreground="red" if s["failed"] else "")
+    draw_latency_histogram(s["histogram"])
+    if not done:
+        root.after(LOAD_REFRESH_MS, refresh_load_test)
+        return
+    load_start_button.config(state="normal")
+    load_stop_button.config(state="disabled")
+    update_status(f"Load test finished: {s['completed']:,} requests, {s['rps_avg']} req/s, p99 {s['p99_ms']} ms")
+
+def draw_latency_histogram(counts):
+    load_canvas.delete("all")
+    used = [i for i, n in enumerate(counts) if n]
+    if not used:
+        return
+    lo, hi = used[0], used[-1]
+    labels = histogram_labels()[lo:hi + 1]
+    counts = counts[lo:hi + 1]
+    width = max(load_canvas.winfo_width(), 200)
+    height = max(load_canvas.winfo_height(), 120)
+    slot = width / len(counts)
+    top = max(counts)
+    every = max(1, math.ceil(70 / slot))  # label every n-th bar so the labels don't overlap
+    for i, (label, n) in enumerate(zip(labels, counts)):
+        x0, x1 = i * slot + slot * 0.15, (i + 1) * slot - slot * 0.15
+        bar = (height - 40) * n / top
+        load_canvas.create_rectangle(x0, height - 20 - bar, x1, height - 20, fill="#4582ec", outline="")
+        if every == 1:
+            load_canvas.create_text((x0 + x1) / 2, height - 26 - bar, text=f"{n:,}", anchor="s")
+        if i % every == 0:
+            load_canvas.create_text((x0 + x1) / 2, height - 18, text=f"{label} ms", anchor="n")
+
+def export_load_test():
+    if load_test is None:
+        messagebox.showinfo("Load Test", "Run a load test first.")
+        return
+    file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+    if file_path:
+        snap = load_test.snapshot()
+        snap["histogram"] = dict(zip(histogram_labels(), snap["histogram"]))
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(snap, f, indent=2)
+        update_status(f"Exported load test results to {file_path}")
+
+def on_close():
+    if load_test is not None:
+        load_test.stop()
+    stop_collection()
+    cancel_requests()
+    executor.shutdown(wait=False, cancel_futures=True)
+    store.close()
+    sessions.close()
+    if response_body is not None:
+        close_response(response_body, response_view)
+    root.destroy()
 
-load_history()
+root.protocol("WM_DELETE_WINDOW", on_close)
+reload_history()
 root.mainloop()
@@ -0,0 +1,198 @@
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+# --------------------------
+# Lightweight performance metrics
+# --------------------------
+# Timing spans with fixed-bucket latency histograms, counters and row
+# throughput. Histogram percentiles are estimates, interpolated within the
+# bucket. Everything is behind one `enabled` flag: when it is off, spans are a
+# shared no-op context manager and timed() wrappers make a single attribute
+# check before calling through.
+#
+#   METRICS = Metrics(enabled=True)
+#
+#   @METRICS.timed("load_data")
+#   def _load_data(self): ...
+#
+#   with METRICS.span("import_flush", rows=len(batch)):
+#       cur.executemany(...)
+#
+#   METRICS.count("thumb_cache_hit")
+#   METRICS.snapshot()  -> plain dict, JSON-serialisable
+
+# Upper bounds in milliseconds, ten log-spaced steps per decade (~26% apart) from
+# 0.1 ms to 10 s; the last bucket catches everything above
+BUCKETS_MS = tuple(float(f"{10 ** (e / 10):.3g}") for e in range(-10, 41)) + (float("inf"),)
+
+
+def percentile(sorted_ms, p):
+    """Nearest-rank percentile of an ascending list of exact samples, or None when empty."""
+    if not sorted_ms:
+        return None
+    k = min(len(sorted_ms) - 1, max(0, math.ceil(p * len(sorted_ms) / 100.0) - 1))
+    return round(sorted_ms[k], 2)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if self.min_ms is None or ms < self.min_ms:
+            self.min_ms = ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other):
+        """Add another histogram's observations into this one."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total_ms += other.total_ms
+        if other.min_ms is not None and (self.min_ms is None or other.min_ms < self.min_ms):
+            self.min_ms = other.min_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, p):
+        """Estimated p-th percentile: interpolated linearly inside the bucket that holds it.
+
+        The bucket's ends are clamped to the observed min/max, so one-bucket
+        histograms stay within the real range.
+        """
+        if not self.count:
+            return None
+        target = p / 100.0 * self.count
+        seen, lower = 0, 0.0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            if n and seen + n >= target:
+                lo, hi = max(lower, self.min_ms), min(bound, self.max_ms)
+                return round(lo + (hi - lo) * max(0.0, target - seen) / n, 3)
+            seen += n
+            lower = bound
+        return round(self.max_ms, 3)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "min_ms": round(self.min_ms, 3) if self.min_ms is not None else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "buckets": {("inf" if b == float("inf") else str(b)): n
+                        for b, n in zip(BUCKETS_MS, self.counts) if n},
+        }
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "rows", "t0")
+
+    def __init__(self, metrics, name, rows):
+        self.metrics = metrics
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0, self.rows)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}      # name -> Histogram
+            self.counters = {}   # name -> int
+            self.rows = {}       # name -> [rows, seconds]
+            self.started = time.time()
+
+    # ---------- RECORDING ----------
+    def span(self, name, rows=None):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, rows)
+
+    def timed(self, name):
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - t0)
+            return wrapper
+        return deco
+
+    def observe(self, name, seconds, rows=None):
+        with self._lock:
+            hist = self.spans.get(name)
+            if hist is None:
+                hist = self.spans[name] = Histogram()
+            hist.record(seconds * 1000.0)
+            if rows:
+                acc = self.rows.setdefault(name, [0, 0.0])
+                acc[0] += rows
+                acc[1] += seconds
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # ---------- REPORTING ----------
+    def hit_rate(self, prefix):
+        """Share of `<prefix>_hit` among `<prefix>_hit` + `<prefix>_miss`, or None."""
+        hits = self.counters.get(prefix + "_hit", 0)
+        total = hits + self.counters.get(prefix + "_miss", 0)
+        return hits / total if total else None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "spans": {k: h.to_dict() for k, h in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "throughput": {k: {"rows": r, "seconds": round(s, 3),
+                                   "rows_per_s": round(r / s, 1) if s else None}
+                               for k, (r, s) in sorted(self.rows.items())},
+            }
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh, indent=2)
@@ -0,0 +1,1129 @@
+import csv
+import gzip
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+from api_telemetry import ApiTelemetry, TimedAdapter
+from postage_rates import DEFAULT_RATE_TABLE_PATH, RateTableError
+# --------------------------
+# AusPost postage quoting (no UI)
+# --------------------------
+# Everything the calculator does that is not Tk: config, validation, the
+# QuoteEngine (thread pool + pooled session, rate limit, retries, circuit
+# breaker, single-flight, local rate tables), the TTL/LRU QuoteCache, the
+# SQLite QuoteHistory and CSV batch helpers. Used by OzPostCalculator.py and
+# postage_service.py.
+
+# ----------------------------
+# Constants / Defaults
+# ----------------------------
+CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".auspost_postage_calculator.json")
+
+# Default API URL (can be changed in Settings tab)
+DEFAULT_API_URL = "https://digitalapi.auspost.com.au/postage/parcel/domestic"
+
+# Max concurrent API calls (Settings tab); enough for a full service comparison in one round-trip
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Client-side rate limit / retries (Settings tab holds the quota)
+DEFAULT_RATE_LIMIT = 5.0        # requests per second; 0 disables the limiter
+DEFAULT_RATE_BURST = 10
+API_TIMEOUT = (5, 20)           # (connect, read) seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5              # seconds; doubled per attempt, full jitter
+BACKOFF_CAP = 30.0              # seconds; also the longest Retry-After honoured
+THROTTLE_FLOOR = 0.1            # a 429 halves the rate, down to this fraction of the limit
+THROTTLE_RECOVERY = 0.01        # each success wins back this fraction of the limit
+BREAKER_THRESHOLD = 5           # consecutive failures before the circuit opens
+BREAKER_COOLDOWN = 30.0         # seconds before a trial request is let through
+
+# Quote cache (persisted next to the config file)
+QUOTE_CACHE_PATH = os.path.join(os.path.dirname(CONFIG_PATH), ".auspost_quote_cache.json")
+QUOTE_CACHE_TTL = 12 * 3600    # seconds
+QUOTE_CACHE_MAX = 20000        # entries (LRU beyond this)
+
+# Service catalogue from the API's service listing (cached next to the config file)
+SERVICE_CATALOGUE_PATH = os.path.join(os.path.dirname(CONFIG_PATH), ".auspost_service_catalogue.json")
+SERVICE_CATALOGUE_TTL = 24 * 3600
+SERVICE_CATALOGUE_MAX_ROUTES = 2000
+# Parcel used when listing services before the form has valid dimensions
+CATALOGUE_PROBE = {"from_postcode": "3000", "to_postcode": "2000",
+                   "length": 22.0, "width": 16.0, "height": 7.7, "weight": "1500"}
+# Listings are cached per route and size band: which services are offered
+# depends on the weight step and the longest side (satchel sizes up to the
+# 22 kg / 105 cm domestic limits), not on the exact dimensions
+SERVICE_WEIGHT_BANDS_G = (500, 1000, 3000, 5000, 22000)
+SERVICE_LENGTH_BANDS_CM = (35, 60, 105)
+
+# Quote history (SQLite, next to the config file); the History tab loads it a page at a time
+QUOTE_HISTORY_PATH = os.path.join(os.path.dirname(CONFIG_PATH), ".auspost_quote_history.db")
+HISTORY_PAGE_SIZE = 200
+
+# History export formats: file-type key -> label
+EXPORT_FORMATS = {"csv": "CSV", "jsonl.gz": "JSON Lines (gzip)"}
+
+# Pricing: "api" (every quote hits the API), "local" (rate table only) or
+# "verify" (rate table answers, the API is called in the background to check it)
+PRICING_MODES = {"api": "AusPost API", "local": "Local rate table", "verify": "Local rate table + verify with API"}
+
+# Service options grouped logically
+SERVICE_OPTIONS = {
+    "AUS_PARCEL_EXPRESS": [
+        "AUS_PARCEL_EXPRESS_SATCHEL_SMALL",
+        "AUS_PARCEL_EXPRESS_PACKAGE_SMALL",
+        "AUS_PARCEL_EXPRESS_SATCHEL_500G"
+    ],
+    "AUS_PARCEL_REGULAR": [
+        "AUS_PARCEL_REGULAR_SATCHEL_SMALL",
+        "AUS_PARCEL_REGULAR_PACKAGE_SMALL",
+        "AUS_PARCEL_REGULAR_SATCHEL_500G"
+    ]
+}
+
+# CSV Export Header (consistent ordering)
+CSV_FIELDS = [
+    "timestamp", "from_postcode", "to_postcode", "length_cm", "width_cm",
+    "height_cm", "weight_kg", "service_code", "suboption_code", "cost", "eta"
+]
+
+
+# ----------------------------
+# Utility: Config Load/Save
+# ----------------------------
+def load_config():
+    cfg = {
+        "api_key": "",
+        "api_url": DEFAULT_API_URL,
+        "max_in_flight": DEFAULT_MAX_IN_FLIGHT,
+        "rate_limit": DEFAULT_RATE_LIMIT,
+        "pricing_mode": "api",
+        "rate_table": DEFAULT_RATE_TABLE_PATH,
+    }
+    if os.path.exists(CONFIG_PATH):
+        try:
+            with open(CONFIG_PATH, "r", encoding="utf-8") as fh:
+                file_cfg = json.load(fh)
+                cfg.update({k: file_cfg.get(k, v) for k, v in cfg.items()})
+        except Exception:
+            # Keep defaults if file is corrupted
+            pass
+    return cfg
+
+
+def save_config(api_key: str, api_url: str, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                rate_limit: float = DEFAULT_RATE_LIMIT, pricing_mode: str = "api",
+                rate_table: str = DEFAULT_RATE_TABLE_PATH):
+    cfg = {"api_key": api_key.strip(), "api_url": api_url.strip(), "max_in_flight": int(max_in_flight),
+           "rate_limit": float(rate_limit), "pricing_mode": pricing_mode, "rate_table": rate_table.strip()}
+    try:
+        with open(CONFIG_PATH, "w", encoding="utf-8") as fh:
+            json.dump(cfg, fh, ensure_ascii=False, indent=2)
+        return True, "Settings saved."
+    except Exception as e:
+        return False, f"Failed to save settings: {e}"
+
+
+# ----------------------------
+# Validation / Quoting (no UI)
+# ----------------------------
+def is_postcode(pc):
+    # Postcode validation (AU: 4 digits)
+    return pc.isdigit() and len(pc) == 4
+
+
+def validate_parcel(from_pc, to_pc, length, width, height, weight, svc, subopt=""):
+    """Validate raw form/CSV values. Returns (payload, None) or (None, errors)."""
+    from_pc, to_pc = str(from_pc or "").strip(), str(to_pc or "").strip()
+    svc, subopt = str(svc or "").strip(), str(subopt or "").strip()
+
+    errors = []
+    if not is_postcode(from_pc):
+        errors.append("From Postcode must be 4 digits.")
+    if not is_postcode(to_pc):
+        errors.append("To Postcode must be 4 digits.")
+
+    def parse_positive_float(name, val):
+        try:
+            f = float(str(val).strip())
+            if f <= 0:
+                raise ValueError
+            return f
+        except Exception:
+            errors.append(f"{name} must be a positive number.")
+            return None
+
+    l = parse_positive_float("Length", length)
+    w = parse_positive_float("Width", width)
+    h = parse_positive_float("Height", height)
+    kg = parse_positive_float("Weight (kg)", weight)
+
+    if not svc:
+        errors.append("Service Code is required.")
+
+    if errors:
+        return None, errors
+
+    grams = int(round(kg * 1000))  # Convert kg → grams
+
+    payload = {
+        "from_postcode": from_pc,
+        "to_postcode": to_pc,
+        "length": l,
+        "width": w,
+        "height": h,
+        "weight": str(grams),  # API expects grams as string
+        "service_code": svc
+    }
+    if subopt:
+        payload["suboption_code"] = subopt
+
+    return payload, None
+
+
+def build_params(payload):
+    # The API expects numeric params as strings; convert precisely
+    return {
+        "from_postcode": payload["from_postcode"],
+        "to_postcode": payload["to_postcode"],
+        "length": str(payload["length"]),
+        "width": str(payload["width"]),
+        "height": str(payload["height"]),
+        "weight": payload["weight"],
+        "service_code": payload["service_code"],
+        **({"option_code": payload["option_code"]} if "option_code" in payload else {}),
+        **({"suboption_code": payload["suboption_code"]} if "suboption_code" in payload else {})
+    }
+
+
+def parse_quote(data):
+    # The AusPost response typically nests under 'postage_result'
+    res = data.get("postage_result", data)
+    cost = res.get("total_cost") or res.get("cost") or "N/A"
+    eta = res.get("delivery_time") or res.get("eta") or "No ETA"
+    return cost, eta
+
+
+def make_session(api_key, pool_size=DEFAULT_MAX_IN_FLIGHT):
+    """Keep-alive session with the auth header set once and a pool sized for the engine.
+
+    The adapter feeds ApiTelemetry for calls made inside telemetry.call().
+    """
+    session = requests.Session()
+    session.headers.update({"AUTH-KEY": api_key})
+    adapter = TimedAdapter(pool_connections=2, pool_maxsize=max(1, pool_size), pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_quote(session, api_url, payload, timeout=API_TIMEOUT):
+    """One API round-trip. Returns (cost, eta); raises requests errors or ValueError."""
+    r = session.get(api_url, params=build_params(payload), timeout=timeout)
+    r.raise_for_status()
+    # Robust JSON parsing
+    try:
+        data = r.json()
+    except Exception:
+        raise ValueError("Invalid JSON response from API.")
+    return parse_quote(data)
+
+
+def service_combinations(options=None):
+    """Every (service_code, suboption_code) pair in options (default SERVICE_OPTIONS), plain service first."""
+    return [(svc, sub) for svc, subs in (options or SERVICE_OPTIONS).items() for sub in ("", *subs)]
+
+
+def eta_days(eta):
+    """Upper bound in days from an ETA string ("Next business day", "2-3 business days"), or None."""
+    text = str(eta or "").lower()
+    if "next" in text or "same" in text:
+        return 0 if "same" in text else 1
+    nums = [int(n) for n in re.findall(r"\d+", text)]
+    return max(nums) if nums else None
+
+
+def cost_value(cost):
+    try:
+        return float(str(cost).replace("$", "").replace(",", ""))
+    except ValueError:
+        return None
+
+
+def make_record(payload, cost, eta):
+    """History/CSV row in CSV_FIELDS layout."""
+    return {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "from_postcode": payload["from_postcode"],
+        "to_postcode": payload["to_postcode"],
+        "length_cm": payload["length"],
+        "width_cm": payload["width"],
+        "height_cm": payload["height"],
+        "weight_kg": round(int(payload["weight"]) / 1000, 3),
+        "service_code": payload["service_code"],
+        "suboption_code": payload.get("suboption_code", ""),
+        "cost": cost,
+        "eta": eta
+    }
+
+
+def describe_error(exc):
+    if isinstance(exc, (CircuitOpenError, RateTableError)):
+        return str(exc)
+    if isinstance(exc, requests.HTTPError):
+        body = exc.response.text if getattr(exc, "response", None) is not None else str(exc)
+        return f"HTTP Error: {exc}\n{body}"
+    if isinstance(exc, requests.Timeout):
+        return "Request timed out. Please try again."
+    return f"API Error: {exc}"
+
+
+# ----------------------------
+# Rate Limiting / Retries / Circuit Breaker
+# ----------------------------
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Client-side quota shared by all workers: `rate` tokens/s, up to `burst` saved.
+
+    `limit` is the configured rate; throttle() lowers `rate` below it when the
+    server answers 429 and recover() brings it back one success at a time.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_RATE_BURST):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+        self._paused_until = 0.0
+
+    def configure(self, rate, burst=DEFAULT_RATE_BURST):
+        with self._lock:
+            self.limit = self.rate = max(0.0, float(rate))
+            self.burst = max(1, int(burst))
+            self._tokens = float(self.burst)
+            self._last = time.monotonic()
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def throttle(self, seconds):
+        """After a 429: hold every caller back for `seconds`, then resume at half the rate, unsaved."""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._paused_until:  # the other workers' 429s from the same burst don't halve it again
+                self.rate = max(self.limit * THROTTLE_FLOOR, self.rate / 2)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+
+    def recover(self):
+        with self._lock:
+            if self.rate < self.limit:
+                self.rate = min(self.limit, self.rate + self.limit * THROTTLE_RECOVERY)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait_s = self._paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one trial call through after `cooldown`."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def retry_in(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+def retry_after_seconds(response):
+    """Seconds from a Retry-After header (delta or HTTP date, capped at BACKOFF_CAP), or None."""
+    value = (response.headers.get("Retry-After") if response is not None else None) or ""
+    value = value.strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return min(BACKOFF_CAP, float(value))
+    try:
+        seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+    except Exception:
+        return None
+    return min(BACKOFF_CAP, max(0.0, seconds))
+
+
+def backoff_delay(attempt, retry_after=None):
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))  # full jitter
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+# ----------------------------
+# Quote Cache (TTL + LRU)
+# ----------------------------
+def cache_key(api_url, params):
+    """Normalise the request params so 10, 10.0 and ' 10 ' share an entry."""
+    def norm(v):
+        v = str(v).strip()
+        try:
+            return repr(float(v))  # shortest exact form; "g" kept only 6 significant digits
+        except ValueError:
+            return v.upper()
+    return api_url.strip().rstrip("/") + "?" + "&".join(f"{k}={norm(v)}" for k, v in sorted(params.items()))
+
+
+class QuoteCache:
+    def __init__(self, ttl=QUOTE_CACHE_TTL, max_entries=QUOTE_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()   # key -> (expires_at, cost, eta)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, cost, eta):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, cost, eta)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": (self.hits / total) if total else None}
+
+    def load(self, path=QUOTE_CACHE_PATH):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                rows = json.load(fh)
+        except Exception:
+            return  # a corrupt cache is just a cold cache
+        now = time.time()
+        with self._lock:
+            for key, expires, cost, eta in rows:
+                if expires > now:
+                    self._data[key] = (expires, cost, eta)
+
+    def save(self, path=QUOTE_CACHE_PATH):
+        now = time.time()
+        with self._lock:
+            rows = [[k, exp, cost, eta] for k, (exp, cost, eta) in self._data.items() if exp > now]
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(rows, fh)
+            os.replace(tmp, path)
+        except Exception:
+            pass
+
+
+# ----------------------------
+# Service Catalogue
+# ----------------------------
+def service_list_url(api_url):
+    """.../postage/parcel/domestic[/calculate.json] -> .../postage/parcel/domestic/service.json"""
+    base = api_url.rstrip("/")
+    if base.endswith(".json"):
+        base = base.rsplit("/", 1)[0]
+    return base + "/service.json"
+
+
+def _as_list(value):
+    # The API collapses one-element lists into a bare object
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_service_list(data):
+    """{service code: {suboption code: parent option code}} from a service.json response.
+
+    A quote sends a suboption together with its option (option_code +
+    suboption_code), so only suboptions are offered, each with its parent.
+    """
+    services = {}
+    for svc in _as_list((data.get("services") or {}).get("service")):
+        code = svc.get("code")
+        if not code:
+            continue
+        subs = {}
+        for opt in _as_list((svc.get("options") or {}).get("option")):
+            for sub in _as_list((opt.get("suboptions") or {}).get("option")):
+                if opt.get("code") and sub.get("code"):
+                    subs.setdefault(sub["code"], opt["code"])
+        services[code] = subs
+    return services
+
+
+def fetch_services(session, api_url, parcel, timeout=API_TIMEOUT):
+    """One service-listing round-trip for parcel (validate_parcel layout, service ignored)."""
+    params = {k: str(parcel[k]) for k in ("from_postcode", "to_postcode", "length", "width", "height", "weight")}
+    r = session.get(service_list_url(api_url), params=params, timeout=timeout)
+    r.raise_for_status()
+    try:
+        data = r.json()
+    except Exception:
+        raise ValueError("Invalid JSON response from API.")
+    services = parse_service_list(data)
+    if not services:
+        raise ValueError("The API listed no services for this route.")
+    return services
+
+
+def size_band(parcel=None):
+    """Weight/length band of a parcel (grams, cm; default CATALOGUE_PROBE) for keying service listings."""
+    parcel = parcel or CATALOGUE_PROBE
+    longest = max(float(parcel[k]) for k in ("length", "width", "height"))
+    return (f"{bisect_left(SERVICE_WEIGHT_BANDS_G, float(parcel['weight']))}."
+            f"{bisect_left(SERVICE_LENGTH_BANDS_CM, longest)}")
+
+
+class ServiceCatalogue:
+    """Valid service/suboption codes, overall and per route and parcel size, from the API's service listing.
+
+    Listings are parse_service_list() dicts: service -> {suboption: parent option};
+    the built-in SERVICE_OPTIONS suboptions have no parent option.
+
+    lookup() is a dict hit on (from, to, size band) so the comboboxes fill instantly;
+    a miss (or an expired entry) returns None and the caller schedules fetch()
+    on the engine in the background. Until the first listing arrives the
+    built-in SERVICE_OPTIONS are used.
+    """
+
+    def __init__(self, ttl=SERVICE_CATALOGUE_TTL, max_routes=SERVICE_CATALOGUE_MAX_ROUTES):
+        self.ttl = ttl
+        self.max_routes = max_routes
+        self._lock = threading.Lock()
+        self.default = {k: dict.fromkeys(v, "") for k, v in SERVICE_OPTIONS.items()}
+        self.default_fetched = 0.0
+        self._routes = OrderedDict()  # (from, to, size_band) -> (fetched_at, services)
+
+    def default_stale(self):
+        return time.time() - self.default_fetched >= self.ttl
+
+    def lookup(self, from_pc, to_pc, parcel=None):
+        """Cached services for the route and parcel's size band (None: not listed yet or expired)."""
+        key = (from_pc, to_pc, size_band(parcel))
+        with self._lock:
+            hit = self._routes.get(key)
+            if hit is None or time.time() - hit[0] >= self.ttl:
+                return None
+            self._routes.move_to_end(key)
+            return hit[1]
+
+    def services_for(self, from_pc=None, to_pc=None, parcel=None):
+        return (self.lookup(from_pc, to_pc, parcel) if from_pc and to_pc else None) or self.default
+
+    def with_option(self, payload):
+        """payload plus the option_code its suboption belongs to (route listing first, then the default)."""
+        sub = payload.get("suboption_code")
+        if not sub:
+            return payload
+        for services in (self.lookup(payload["from_postcode"], payload["to_postcode"], payload), self.default):
+            option = (services or {}).get(payload["service_code"], {}).get(sub)
+            if option:
+                return dict(payload, option_code=option)
+        return payload
+
+    def fetch(self, engine, from_pc=None, to_pc=None, parcel=None):
+        """Blocking: list services for a route and parcel size (or the default probe) and remember them."""
+        probe = dict(CATALOGUE_PROBE, **(parcel or {}))
+        if from_pc and to_pc:
+            probe.update(from_postcode=from_pc, to_postcode=to_pc)
+        services = engine.call_api(fetch_services, engine.session, engine.api_url, probe)
+        with self._lock:
+            if from_pc and to_pc:
+                key = (from_pc, to_pc, size_band(probe))
+                self._routes[key] = (time.time(), services)
+                self._routes.move_to_end(key)
+                while len(self._routes) > self.max_routes:
+                    self._routes.popitem(last=False)
+            else:
+                self.default, self.default_fetched = services, time.time()
+        return services
+
+    def load(self, path=SERVICE_CATALOGUE_PATH):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except Exception:
+            return
+        def current(services):
+            # Older files listed bare codes per service, or were keyed by route only; those are dropped
+            return isinstance(services, dict) and all(isinstance(v, dict) for v in services.values())
+
+        with self._lock:
+            if data.get("default") and current(data["default"]):
+                self.default = data["default"]
+                self.default_fetched = float(data.get("default_fetched", 0))
+            for route in data.get("routes", []):
+                if len(route) == 5 and current(route[4]):
+                    from_pc, to_pc, band, fetched, services = route
+                    self._routes[(from_pc, to_pc, band)] = (fetched, services)
+
+    def save(self, path=SERVICE_CATALOGUE_PATH):
+        now = time.time()
+        with self._lock:
+            data = {
+                "default": self.default if self.default_fetched else None,
+                "default_fetched": self.default_fetched,
+                "routes": [[a, b, band, t, s] for (a, b, band), (t, s) in self._routes.items()
+                           if now - t < self.ttl],
+            }
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp, path)
+        except Exception:
+            pass
+
+
+# ----------------------------
+# Quote History (SQLite)
+# ----------------------------
+class QuoteHistory:
+    """Append-mostly quote log in SQLite, indexed by time, route and service.
+
+    Rows are CSV_FIELDS plus an autoincrement id; pages are fetched newest
+    first by id (keyset paging), so opening months of history costs one page.
+    """
+
+    def __init__(self, path=QUOTE_HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS quotes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                from_postcode TEXT, to_postcode TEXT,
+                length_cm REAL, width_cm REAL, height_cm REAL, weight_kg REAL,
+                service_code TEXT, suboption_code TEXT,
+                cost TEXT, eta TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_quotes_timestamp ON quotes(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_quotes_route ON quotes(from_postcode, to_postcode, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_quotes_service ON quotes(service_code, suboption_code, timestamp);
+        """)
+
+    def add(self, record):
+        """Store one make_record() dict; returns it with its new id."""
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO quotes ({', '.join(CSV_FIELDS)}) VALUES ({', '.join('?' * len(CSV_FIELDS))})",
+                [record.get(k, "") for k in CSV_FIELDS])
+        return dict(record, id=cur.lastrowid)
+
+    def add_many(self, records):
+        """Store several records in one transaction."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT INTO quotes ({', '.join(CSV_FIELDS)}) VALUES ({', '.join('?' * len(CSV_FIELDS))})",
+                ([r.get(k, "") for k in CSV_FIELDS] for r in records))
+
+    @staticmethod
+    def _where(filters):
+        """SQL WHERE fragment + args for export filters.
+
+        filters: date_from / date_to ("YYYY-MM-DD", inclusive), from_postcode,
+        to_postcode, service_code. Empty values are ignored.
+        """
+        f = filters or {}
+        clauses, args = [], []
+        if f.get("date_from"):
+            clauses.append("timestamp >= ?")
+            args.append(f["date_from"])
+        if f.get("date_to"):
+            clauses.append("timestamp < ?")
+            args.append((datetime.strptime(f["date_to"], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        for col in ("from_postcode", "to_postcode", "service_code"):
+            if f.get(col):
+                clauses.append(f"{col} = ?")
+                args.append(f[col])
+        return " AND ".join(clauses), args
+
+    def count(self, filters=None):
+        where, args = self._where(filters)
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM quotes" + (f" WHERE {where}" if where else ""),
+                                     args).fetchone()[0]
+
+    def page(self, before_id=None, limit=HISTORY_PAGE_SIZE):
+        """Newest-first rows with id < before_id (all rows when None)."""
+        sql = f"SELECT id, {', '.join(CSV_FIELDS)} FROM quotes"
+        args = []
+        if before_id is not None:
+            sql += " WHERE id < ?"
+            args.append(before_id)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, args)]
+
+    def iter_records(self, chunk=1000, filters=None):
+        """Matching rows oldest first, fetched chunk rows at a time."""
+        where, args = self._where(filters)
+        sql = (f"SELECT id, {', '.join(CSV_FIELDS)} FROM quotes WHERE id > ?"
+               + (f" AND {where}" if where else "") + " ORDER BY id LIMIT ?")
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(sql, [last_id, *args, chunk]).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield dict(r)
+            last_id = rows[-1]["id"]
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM quotes")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def export_history(history, path, fmt="csv", filters=None, progress=None, cancel=None, every=2000):
+    """Stream matching history rows to path as CSV or gzip JSON Lines.
+
+    Writes to <path>.part and renames on success, so a cancelled or failed
+    export leaves nothing behind. progress(done, total) is called every `every`
+    rows from the calling thread. Returns (rows written, completed).
+    """
+    total = history.count(filters)
+    tmp = path + ".part"
+    done = 0
+    try:
+        if fmt == "jsonl.gz":
+            fh = gzip.open(tmp, "wt", encoding="utf-8", newline="\n")
+
+            def write(rec):
+                fh.write(json.dumps({k: rec[k] for k in CSV_FIELDS}, ensure_ascii=False) + "\n")
+        else:
+            fh = open(tmp, "w", newline="", encoding="utf-8")
+            writer = csv.writer(fh)
+            writer.writerow(CSV_FIELDS)
+
+            def write(rec):
+                writer.writerow([rec[k] for k in CSV_FIELDS])
+
+        with fh:
+            for rec in history.iter_records(filters=filters):
+                if cancel is not None and cancel.is_set():
+                    break
+                write(rec)
+                done += 1
+                if progress is not None and done % every == 0:
+                    progress(done, total)
+        if cancel is not None and cancel.is_set():
+            os.remove(tmp)
+            return done, False
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if progress is not None:
+        progress(done, total)
+    return done, True
+
+
+# ----------------------------
+# Quote Engine (bounded concurrency)
+# ----------------------------
+class QuoteEngine:
+    """Runs API calls on a thread pool with at most max_in_flight at once.
+
+    The engine owns one pooled requests.Session (keep-alive, AUTH-KEY set once)
+    that is rebuilt whenever configure() sees a new URL or key, or the pool is
+    resized. quote()/submit() return futures; the UI hooks them up with
+    add_done_callback + root.after so widgets are only touched on the main thread.
+
+    quote() answers from the QuoteCache when it can: the future is already
+    resolved and has from_cache=True.
+
+    Every API call first takes a token from the shared TokenBucket and checks
+    the CircuitBreaker. 5xx responses, timeouts and connection errors count
+    against the breaker and are retried with exponential backoff and jitter,
+    honouring Retry-After. A 429 is not a failure: it throttles the bucket for
+    every worker (paused for Retry-After, then at a lower rate that recovers
+    with each success) and the call is retried once the pause is over.
+
+    Identical quotes (same cache_key) that are in flight at the same time are
+    coalesced: the first caller starts the API call and later callers get
+    their own future that resolves from it (coalesced=True). The call is only
+    cancelled once every waiting future has been cancelled.
+
+    With a RateTable set (set_pricing), "local" mode prices in-process and
+    returns a resolved future (source="local"); "verify" mode does the same
+    and also fetches the API quote in the background, counting mismatches.
+
+    Each HTTP attempt (retries included) is timed into self.telemetry.
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, api_key="", max_in_flight=DEFAULT_MAX_IN_FLIGHT, cache=None,
+                 rate_limit=DEFAULT_RATE_LIMIT, telemetry=None):
+        self.cache = cache if cache is not None else QuoteCache()
+        self.telemetry = telemetry if telemetry is not None else ApiTelemetry()
+        self.limiter = TokenBucket(rate_limit)
+        self.breaker = CircuitBreaker()
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="quote")
+        self.api_url = api_url
+        self.api_key = api_key
+        self.session = make_session(api_key, self.max_in_flight)
+        self._inflight = {}  # cache key -> [pool future, live waiters]
+        self._inflight_lock = threading.Lock()
+        self.coalesced = 0
+        self.mode = "api"
+        self.rates = None
+        self.verified = 0
+        self.mismatched = 0
+        self.mismatches = deque(maxlen=200)  # (params, local (cost, eta), api (cost, eta))
+
+    def set_pricing(self, mode, rates=None):
+        self.mode = mode if mode in PRICING_MODES else "api"
+        self.rates = rates
+
+    def configure(self, api_url, api_key):
+        if api_url == self.api_url and api_key == self.api_key:
+            return
+        self.api_url = api_url
+        self.api_key = api_key
+        # Calls already submitted keep the session they were given
+        self.session = make_session(api_key, self.max_in_flight)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def call_api(self, fn, *args):
+        """Run one API call under the rate limit, retry policy and circuit breaker."""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"AusPost API unavailable after repeated failures; "
+                                       f"retrying in {self.breaker.retry_in():.0f}s.")
+            self.limiter.acquire()
+            retry_after = None
+            try:
+                with self.telemetry.call(fn.__name__):
+                    result = fn(*args)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRY_STATUSES or status == 429:
+                    self.breaker.record_success()  # the API answered; the request was bad or too soon
+                else:
+                    self.breaker.record_failure()
+                if status not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                    raise
+                retry_after = retry_after_seconds(e.response)
+                if status == 429:
+                    # Waited out in limiter.acquire() on the next attempt, together with every other worker
+                    self.limiter.throttle(retry_after if retry_after is not None else backoff_delay(attempt))
+                    attempt += 1
+                    continue
+            except (requests.ConnectionError, requests.Timeout):
+                self.breaker.record_failure()
+                if attempt >= MAX_RETRIES:
+                    raise
+            except Exception:
+                # Bad payloads and other request errors still resolve a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                self.limiter.recover()
+                return result
+            time.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    def quote(self, payload, timeout=API_TIMEOUT, use_cache=True):
+        if self.mode != "api":
+            return self._local_quote(payload, timeout)
+        return self._api_quote(payload, timeout, use_cache)
+
+    def _local_quote(self, payload, timeout):
+        fut = Future()
+        fut.from_cache = fut.coalesced = False
+        fut.source = "local"
+        if self.rates is None:
+            fut.set_exception(RateTableError("No rate table loaded (see Settings)."))
+            return fut
+        try:
+            local = self.rates.quote(payload)
+        except Exception as e:
+            fut.set_exception(e)
+            return fut
+        fut.set_result(local)
+        if self.mode == "verify":
+            self._api_quote(payload, timeout, use_cache=True).add_done_callback(
+                lambda f: self._check(payload, local, f))
+        return fut
+
+    def _check(self, payload, local, fut):
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        api = fut.result()
+        self.verified += 1
+        try:
+            same = abs(float(api[0]) - float(local[0])) < 0.005
+        except (TypeError, ValueError):
+            same = False
+        if not same:
+            self.mismatched += 1
+            self.mismatches.append((build_params(payload), local, api))
+
+    def _api_quote(self, payload, timeout, use_cache):
+        key = cache_key(self.api_url, build_params(payload))
+        if use_cache:
+            hit = self.cache.get(key)
+            if hit is not None:
+                fut = Future()
+                fut.from_cache = True
+                fut.coalesced = False
+                fut.source = "cache"
+                fut.set_result(hit)
+                return fut
+
+        def call(session, api_url):
+            cost, eta = self.call_api(fetch_quote, session, api_url, payload, timeout)
+            self.cache.put(key, cost, eta)
+            return cost, eta
+
+        fut = Future()
+        fut.from_cache = False
+        fut.source = "api"
+        with self._inflight_lock:
+            entry = self._inflight.get(key)
+            if entry is None:
+                entry = self._inflight[key] = [self._pool.submit(call, self.session, self.api_url), 0]
+                entry[0].add_done_callback(lambda f: self._forget(key, f))
+                fut.coalesced = False
+            else:
+                self.coalesced += 1
+                fut.coalesced = True
+            entry[1] += 1
+        leader = entry[0]
+        fut.add_done_callback(lambda f: f.cancelled() and self._abandon(key, leader))
+        leader.add_done_callback(lambda f: _chain_result(f, fut))
+        return fut
+
+    def _forget(self, key, leader):
+        with self._inflight_lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is leader:
+                del self._inflight[key]
+
+    def _abandon(self, key, leader):
+        with self._inflight_lock:
+            entry = self._inflight.get(key)
+            if entry is None or entry[0] is not leader:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+        leader.cancel()
+
+    def resize(self, max_in_flight):
+        max_in_flight = max(1, int(max_in_flight))
+        if max_in_flight == self.max_in_flight:
+            return
+        old = self._pool
+        self.max_in_flight = max_in_flight
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="quote")
+        self.session = make_session(self.api_key, max_in_flight)
+        old.shutdown(wait=False)  # running calls finish on the old pool
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _chain_result(src, dst):
+    """Copy a finished future's outcome onto dst (ignored if dst was cancelled)."""
+    try:
+        if src.cancelled():
+            dst.cancel()
+        elif src.exception() is not None:
+            dst.set_exception(src.exception())
+        else:
+            dst.set_result(src.result())
+    except InvalidStateError:
+        pass
+
+
+# ----------------------------
+# Batch Quoting (CSV in → CSV out)
+# ----------------------------
+# Input columns use CSV_FIELDS names; short aliases are accepted too.
+BATCH_ALIASES = {
+    "from_postcode": ("from_postcode", "from", "from_pc"),
+    "to_postcode": ("to_postcode", "to", "to_pc"),
+    "length_cm": ("length_cm", "length"),
+    "width_cm": ("width_cm", "width"),
+    "height_cm": ("height_cm", "height"),
+    "weight_kg": ("weight_kg", "weight"),
+    "service_code": ("service_code", "service"),
+    "suboption_code": ("suboption_code", "suboption"),
+}
+
+
+def parcel_from_mapping(row, columns=None):
+    """validate_parcel() over a dict keyed by CSV_FIELDS names or BATCH_ALIASES.
+
+    columns: precomputed {target: key in row} (see match_columns); derived from
+    row's keys when omitted.
+    """
+    if columns is None:
+        columns = match_columns(row.keys())
+
+    def get(t):
+        col = columns[t]
+        value = row.get(col) if col is not None else None
+        return "" if value is None else value
+    return validate_parcel(get("from_postcode"), get("to_postcode"), get("length_cm"), get("width_cm"),
+                           get("height_cm"), get("weight_kg"), get("service_code"), get("suboption_code"))
+
+
+def match_columns(keys):
+    """{target field: matching key or None} using BATCH_ALIASES (case-insensitive)."""
+    fields = {(k or "").strip().lower(): k for k in keys}
+    return {target: next((fields[n] for n in names if n in fields), None)
+            for target, names in BATCH_ALIASES.items()}
+
+
+def read_batch_rows(path):
+    """Yield (line_no, raw_row, payload, errors) per data row of a batch CSV."""
+    with open(path, "r", newline="", encoding="utf-8-sig") as fh:
+        reader = csv.DictReader(fh)
+        columns = match_columns(reader.fieldnames or [])
+        for line_no, row in enumerate(reader, start=2):
+            payload, errors = parcel_from_mapping(row, columns)
+            yield line_no, row, payload, errors
+
+
+def count_data_rows(path):
+    with open(path, "r", newline="", encoding="utf-8-sig") as fh:
+        return max(0, sum(1 for _ in csv.reader(fh)) - 1)
+
+
+class BatchWriter:
+    """Streams quoted rows to out_path (CSV_FIELDS) and failures to <out>_failures.csv."""
+
+    def __init__(self, out_path):
+        self.out_path = out_path
+        self.fail_path = os.path.splitext(out_path)[0] + "_failures.csv"
+        self._out = open(out_path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._out, fieldnames=CSV_FIELDS)
+        self._writer.writeheader()
+        self._fail = None
+        self._fail_writer = None
+        self.ok = 0
+        self.failed = 0
+
+    def write(self, record):
+        self._writer.writerow(record)
+        self.ok += 1
+
+    def fail(self, line_no, reason, raw_row):
+        if self._fail_writer is None:
+            self._fail = open(self.fail_path, "w", newline="", encoding="utf-8")
+            self._fail_writer = csv.writer(self._fail)
+            self._fail_writer.writerow(["line", "reason"] + list(raw_row.keys()))
+        self._fail_writer.writerow([line_no, reason] + list(raw_row.values()))
+        self.failed += 1
+
+    def close(self):
+        self._out.close()
+        if self._fail is not None:
+            self._fail.close()
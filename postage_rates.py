@@ -0,0 +1,353 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from bisect import bisect_left, bisect_right
+# --------------------------
+# Local postage rate tables
+# --------------------------
+# Prices parcels without a network call. A rate table (JSON) is compiled once
+# into flat lookup structures:
+#
+#   zones     sorted, non-overlapping postcode ranges -> zone; found by bisect
+#   lanes     (from_zone, to_zone) -> price band, expanded from wildcards
+#   services  weight breaks (kg) + one price list per band, ETA per band,
+#             cubic-weight flag and flat surcharges per suboption code
+#
+# Table layout (see auspost_rates.json):
+#
+#   {
+#     "version": "...",
+#     "cubic_factor": 250,                      # kg per m³
+#     "zones": [[2000, 2234, "SYD"], ...],      # inclusive postcode ranges
+#     "lanes": {"SYD:SYD": "local", "*:NT": "remote", "*:*": "interstate"},
+#     "services": {
+#       "AUS_PARCEL_REGULAR": {
+#         "weight_breaks": [0.5, 1, 3, 5, 10, 22],
+#         "prices": {"local": [...], "interstate": [...]},   # one per break
+#         "eta": {"local": "1-2 business days", ...},
+#         "cubic": true,
+#         "max_length_cm": 105,
+#         "surcharges": {"AUS_PARCEL_REGULAR_SATCHEL_SMALL": -2.5}
+#       }
+#     }
+#   }
+#
+# Lane precedence: "A:B", then "A:*", then "*:B", then "*:*".
+#
+# quote_arrays() prices whole columns at once with numpy (optional dependency,
+# imported on first use) and returns a dict of column arrays that
+# write_columns_csv() / write_columns_parquet() (pyarrow) write directly:
+#
+#   python postage_rates.py parcels.csv quotes.parquet --rates auspost_rates.json
+
+# The sample table shipped next to this module
+DEFAULT_RATE_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "auspost_rates.json")
+
+BULK_COLUMNS = ("from_postcode", "to_postcode", "length_cm", "width_cm", "height_cm", "weight_kg",
+                "service_code", "suboption_code", "from_zone", "to_zone", "cubic_kg", "chargeable_kg",
+                "cost", "eta", "error")
+
+# error column values for rows quote_arrays() could not price
+ERR_POSTCODE = "no_zone"
+ERR_SERVICE = "unknown_service"
+ERR_TOO_LONG = "too_long"
+ERR_TOO_HEAVY = "too_heavy"
+ERR_INVALID = "invalid_input"
+_ERR_NAMES = ("", ERR_INVALID, ERR_POSTCODE, ERR_SERVICE, ERR_TOO_LONG, ERR_TOO_HEAVY)
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("Bulk quoting needs numpy (pip install numpy).") from None
+    return np
+
+
+class RateTableError(ValueError):
+    pass
+
+
+class _Service:
+    __slots__ = ("code", "breaks", "prices", "eta", "cubic", "max_length", "surcharges")
+
+    def __init__(self, code, spec, bands):
+        self.code = code
+        self.breaks = [float(b) for b in spec["weight_breaks"]]
+        if self.breaks != sorted(self.breaks) or not self.breaks:
+            raise RateTableError(f"{code}: weight_breaks must be ascending")
+        self.prices = {}
+        for band, prices in spec["prices"].items():
+            if len(prices) != len(self.breaks):
+                raise RateTableError(f"{code}: band '{band}' needs {len(self.breaks)} prices")
+            self.prices[band] = tuple(float(p) for p in prices)
+        missing = bands - set(self.prices)
+        if missing:
+            raise RateTableError(f"{code}: no prices for band(s) {', '.join(sorted(missing))}")
+        self.eta = dict(spec.get("eta", {}))
+        self.cubic = bool(spec.get("cubic", True))
+        self.max_length = float(spec.get("max_length_cm") or 0)
+        self.surcharges = {k: float(v) for k, v in spec.get("surcharges", {}).items()}
+
+
+class RateTable:
+    def __init__(self, data):
+        self.version = str(data.get("version", ""))
+        self.cubic_factor = float(data.get("cubic_factor", 250))
+
+        ranges = sorted((int(lo), int(hi), str(zone)) for lo, hi, zone in data["zones"])
+        for (lo1, hi1, z1), (lo2, _, z2) in zip(ranges, ranges[1:]):
+            if lo2 <= hi1:
+                raise RateTableError(f"Zone ranges overlap: {z1} ({lo1}-{hi1}) and {z2} (from {lo2})")
+        self._lo = [r[0] for r in ranges]
+        self._hi = [r[1] for r in ranges]
+        self._zone = [r[2] for r in ranges]
+
+        zones = set(self._zone)
+        lanes = data.get("lanes", {})
+        self.lanes = {}
+        for a in zones:
+            for b in zones:
+                band = (lanes.get(f"{a}:{b}") or lanes.get(f"{a}:*")
+                        or lanes.get(f"*:{b}") or lanes.get("*:*"))
+                if band is None:
+                    raise RateTableError(f"No lane for {a} -> {b}")
+                self.lanes[(a, b)] = band
+        bands = set(self.lanes.values())
+
+        self.services = {code: _Service(code, spec, bands) for code, spec in data["services"].items()}
+
+    def _compiled(self, np):
+        """numpy views of the lookups, built once on first bulk call."""
+        c = getattr(self, "_np_cache", None)
+        if c is None:
+            names = sorted(set(self._zone))
+            zid = {z: i for i, z in enumerate(names)}
+            bands = sorted(set(self.lanes.values()))
+            bid = {b: i for i, b in enumerate(bands)}
+            lane = np.empty((len(names), len(names)), dtype=np.int16)
+            for (a, b), band in self.lanes.items():
+                lane[zid[a], zid[b]] = bid[band]
+            c = self._np_cache = {
+                "lo": np.asarray(self._lo, dtype=np.int64),
+                "hi": np.asarray(self._hi, dtype=np.int64),
+                "zone_of_range": np.asarray([zid[z] for z in self._zone], dtype=np.int16),
+                "zone_names": np.asarray(names + [""], dtype=object),   # -1 -> ""
+                "lane": lane,
+                "services": {code: (np.asarray(svc.breaks),
+                                    np.asarray([svc.prices[b] for b in bands]),
+                                    np.asarray([svc.eta.get(b, "No ETA") for b in bands], dtype=object))
+                             for code, svc in self.services.items()},
+            }
+        return c
+
+    def _zones_np(self, np, c, postcodes):
+        pc = np.asarray(postcodes).astype(np.int64)
+        i = np.searchsorted(c["lo"], pc, side="right") - 1
+        safe = np.clip(i, 0, len(c["lo"]) - 1)
+        ok = (i >= 0) & (pc <= c["hi"][safe])
+        return np.where(ok, c["zone_of_range"][safe], -1)
+
+    def quote_arrays(self, from_postcode, to_postcode, length_cm, width_cm, height_cm, weight_kg,
+                     service_code, suboption_code=""):
+        """Vectorised quote(): array-likes (or scalars, broadcast) in, dict of BULK_COLUMNS arrays out.
+
+        Rows that cannot be priced get cost NaN and a code in the error column.
+        """
+        np = _numpy()
+        c = self._compiled(np)
+        n = max(np.size(a) for a in (from_postcode, to_postcode, length_cm, width_cm, height_cm,
+                                     weight_kg, service_code, suboption_code))
+
+        def col(a, dtype=None):
+            return np.broadcast_to(np.asarray(a, dtype=dtype), (n,))
+
+        length, width, height = col(length_cm, float), col(width_cm, float), col(height_cm, float)
+        kg = np.round(col(weight_kg, float) * 1000) / 1000   # same gram rounding as validate_parcel
+        services, subs = col(service_code), col(suboption_code)
+        fz = self._zones_np(np, c, col(from_postcode))
+        tz = self._zones_np(np, c, col(to_postcode))
+
+        cubic = length * width * height / 1_000_000 * self.cubic_factor
+        chargeable = kg.copy()
+        cost = np.full(n, np.nan)
+        eta = np.full(n, "", dtype=object)
+        err = np.zeros(n, dtype=np.int8)   # index into _ERR_NAMES; first error wins
+        err[~((length > 0) & (width > 0) & (height > 0) & (kg > 0))] = 1
+        err[(err == 0) & ((fz < 0) | (tz < 0))] = 2
+
+        band = c["lane"][np.maximum(fz, 0), np.maximum(tz, 0)]
+        longest = np.maximum(np.maximum(length, width), height)
+        codes = [str(service_code)] if np.ndim(service_code) == 0 else np.unique(services)
+        for code in codes:
+            rows = services == code
+            svc = self.services.get(code)
+            if svc is None:
+                err[rows & (err == 0)] = 3
+                continue
+            breaks, prices, etas = c["services"][code]
+            if svc.cubic:
+                chargeable[rows] = np.maximum(kg[rows], cubic[rows])
+            if svc.max_length:
+                err[rows & (err == 0) & (longest > svc.max_length)] = 4
+            idx = np.searchsorted(breaks, chargeable - 1e-9, side="left")
+            err[rows & (err == 0) & (idx >= len(breaks))] = 5
+            ok = rows & (err == 0)
+            cost[ok] = prices[band[ok], idx[ok]]
+            eta[ok] = etas[band[ok]]
+            for sub, amount in svc.surcharges.items():
+                cost[ok & (subs == sub)] += amount
+        np.maximum(cost, 0.0, out=cost, where=~np.isnan(cost))
+
+        return {
+            "from_postcode": col(from_postcode), "to_postcode": col(to_postcode),
+            "length_cm": length, "width_cm": width, "height_cm": height, "weight_kg": kg,
+            "service_code": services, "suboption_code": subs,
+            "from_zone": c["zone_names"][fz], "to_zone": c["zone_names"][tz],
+            "cubic_kg": np.round(cubic, 3), "chargeable_kg": np.round(chargeable, 3),
+            "cost": np.round(cost, 2), "eta": eta, "error": np.asarray(_ERR_NAMES, dtype=object)[err],
+        }
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            return cls(data)
+        except RateTableError:
+            raise
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise RateTableError(f"Could not load rate table {path}: {e}") from e
+
+    def zone_for(self, postcode):
+        try:
+            pc = int(postcode)
+        except (TypeError, ValueError):
+            raise RateTableError(f"Invalid postcode: {postcode!r}")
+        i = bisect_right(self._lo, pc) - 1
+        if i < 0 or pc > self._hi[i]:
+            raise RateTableError(f"No zone for postcode {postcode}")
+        return self._zone[i]
+
+    def chargeable_kg(self, svc, payload):
+        kg = int(payload["weight"]) / 1000
+        if svc.cubic:
+            cubic = payload["length"] * payload["width"] * payload["height"] / 1_000_000 * self.cubic_factor
+            kg = max(kg, cubic)
+        return kg
+
+    def quote(self, payload):
+        """Price a validated payload (validate_parcel layout). Returns (cost, eta) like parse_quote."""
+        svc = self.services.get(payload["service_code"])
+        if svc is None:
+            raise RateTableError(f"Service {payload['service_code']} is not in the rate table")
+        if svc.max_length and max(payload["length"], payload["width"], payload["height"]) > svc.max_length:
+            raise RateTableError(f"Longest side exceeds {svc.max_length:g} cm for {svc.code}")
+        kg = self.chargeable_kg(svc, payload)
+        i = bisect_left(svc.breaks, kg - 1e-9)
+        if i >= len(svc.breaks):
+            raise RateTableError(f"Chargeable weight {kg:.2f} kg exceeds {svc.breaks[-1]:g} kg for {svc.code}")
+        band = self.lanes[(self.zone_for(payload["from_postcode"]), self.zone_for(payload["to_postcode"]))]
+        cost = svc.prices[band][i] + svc.surcharges.get(payload.get("suboption_code", ""), 0.0)
+        return f"{max(cost, 0.0):.2f}", svc.eta.get(band, "No ETA")
+
+
+# ----------------------------
+# Columnar output
+# ----------------------------
+def write_columns_csv(path, columns, chunk=100_000):
+    """Write quote_arrays() output as CSV, converting chunk rows at a time."""
+    names = list(columns)
+    n = len(columns[names[0]]) if names else 0
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(names)
+        for start in range(0, n, chunk):
+            cols = [columns[k][start:start + chunk].tolist() for k in names]
+            writer.writerows(zip(*cols))
+    return n
+
+
+def write_columns_parquet(path, columns):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow).") from None
+    table = pa.table({k: (v.astype(str) if v.dtype.kind in "OU" else v) for k, v in columns.items()})
+    pq.write_table(table, path)
+    return table.num_rows
+
+
+def read_columns_csv(path):
+    """Input CSV (CSV_FIELDS-style names) -> dict of column lists for quote_arrays()."""
+    wanted = ("from_postcode", "to_postcode", "length_cm", "width_cm", "height_cm", "weight_kg",
+              "service_code", "suboption_code")
+    cols = {k: [] for k in wanted}
+    with open(path, "r", newline="", encoding="utf-8-sig") as fh:
+        reader = csv.reader(fh)
+        header = [h.strip().lower() for h in next(reader, [])]
+        pos = {k: header.index(k) for k in wanted if k in header}
+        missing = [k for k in wanted[:-1] if k not in pos]
+        if missing:
+            raise RateTableError(f"Missing column(s): {', '.join(missing)}")
+        for row in reader:
+            for k in wanted:
+                i = pos.get(k)
+                cols[k].append(row[i].strip() if i is not None and i < len(row) else "")
+    return cols
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Price a parcels CSV against a local rate table.")
+    ap.add_argument("parcels", help="input CSV (from_postcode, to_postcode, length_cm, ..., service_code)")
+    ap.add_argument("out", help="output .csv or .parquet")
+    ap.add_argument("--rates", default=DEFAULT_RATE_TABLE_PATH)
+    args = ap.parse_args()
+
+    try:
+        np = _numpy()
+        table = RateTable.load(args.rates)
+        cols = read_columns_csv(args.parcels)
+    except (OSError, RuntimeError, RateTableError) as e:
+        ap.exit(1, f"{e}\n")
+
+    # A cell that is not a number would fail the whole float conversion: report the row and skip it
+    numeric = ("length_cm", "width_cm", "height_cm", "weight_kg")
+    bad = {}
+    for k in numeric:
+        for i, v in enumerate(cols[k]):
+            if v and i not in bad:
+                try:
+                    float(v)
+                except ValueError:
+                    bad[i] = f"{k} {v!r} is not a number"
+    for i in sorted(bad):
+        print(f"line {i + 2}: {bad[i]}; skipped", file=sys.stderr)
+    if bad:
+        cols = {k: [v for i, v in enumerate(vals) if i not in bad] for k, vals in cols.items()}
+
+    def num(values):
+        arr = np.array(values, dtype=object)
+        arr[arr == ""] = "nan"
+        return arr.astype(float)
+
+    pcs = {k: np.where(np.char.isdigit(np.array(cols[k], dtype=str)), cols[k], "-1")
+           for k in ("from_postcode", "to_postcode")}  # non-numeric -> no_zone
+    out = table.quote_arrays(pcs["from_postcode"], pcs["to_postcode"], num(cols["length_cm"]),
+                             num(cols["width_cm"]), num(cols["height_cm"]), num(cols["weight_kg"]),
+                             np.array(cols["service_code"]), np.array(cols["suboption_code"]))
+    out["from_postcode"], out["to_postcode"] = np.array(cols["from_postcode"]), np.array(cols["to_postcode"])
+    writer = write_columns_parquet if args.out.lower().endswith(".parquet") else write_columns_csv
+    try:
+        n = writer(args.out, out)
+    except (OSError, RuntimeError) as e:
+        ap.exit(1, f"{e}\n")
+    unpriced = int((out["error"] != "").sum())
+    print(f"{n - unpriced:,} rows priced, {unpriced:,} unpriced, {len(bad):,} skipped -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from perf_metrics import Metrics
+from postage_engine import (
+    DEFAULT_MAX_IN_FLIGHT, DEFAULT_RATE_LIMIT, DEFAULT_RATE_TABLE_PATH, PRICING_MODES, QUOTE_HISTORY_PATH,
+    QuoteCache, QuoteEngine, QuoteHistory, describe_error, load_config, make_record, parcel_from_mapping,
+)
+from postage_rates import RateTable, RateTableError
+# --------------------------
+# Postage quoting HTTP service
+# --------------------------
+# A small asyncio HTTP/1.1 (keep-alive) JSON service over postage_engine, for
+# systems that cannot drive the Tk calculator. Every connection shares one
+# QuoteEngine: one TTL/LRU cache, one pooled keep-alive session to AusPost, one
+# rate limiter / circuit breaker, and single-flight for identical quotes. API
+# calls run on the engine's thread pool (--max-in-flight workers); the event
+# loop only awaits their futures.
+#
+#   POST /quote    {"from_postcode": "3000", "to_postcode": "2000", "length_cm": 20,
+#                   "width_cm": 15, "height_cm": 10, "weight_kg": 1.2,
+#                   "service_code": "AUS_PARCEL_REGULAR", "suboption_code": ""}
+#                  -> {"cost": "21.85", "eta": "...", "source": "api|cache|local"}
+#   POST /quotes   {"parcels": [{...}, ...]} -> {"results": [{"index": 0, ...}, ...]}
+#   GET  /health   GET /stats
+#
+# Field names follow CSV_FIELDS; the batch CSV aliases (from, to, weight, ...)
+# work too. Try it offline:
+#
+#   python mock_auspost.py --port 8765 --latency 80
+#   python postage_service.py --api-url http://127.0.0.1:8765/calc --api-key test
+#   python loadtest_postage.py --url http://127.0.0.1:8080 --concurrency 32 --duration 20
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_BULK_PARCELS = 10000
+ROUTES = ("/health", "/stats", "/quote", "/quotes")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PostageService:
+    def __init__(self, engine, history=None, metrics=None):
+        self.engine = engine
+        self.history = history
+        self.metrics = metrics if metrics is not None else Metrics(enabled=True)
+        self.started = time.time()
+
+    # ---------- HTTP ----------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    req = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if req is None:
+                    break
+                method, path, headers, body = req
+                keep_alive = headers.get("connection", "").lower() != "close"
+                t0 = time.perf_counter()
+                try:
+                    status, obj = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, obj = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, obj = 500, {"error": f"Internal error: {e}"}
+                self.metrics.observe(f"{method} {path}" if path in ROUTES else "unmatched",
+                                     time.perf_counter() - t0)
+                self.metrics.count(f"http_{status}")
+                await self._respond(writer, status, obj, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), urlsplit(target).path.rstrip("/") or "/", headers, body
+
+    @staticmethod
+    async def _respond(writer, status, obj, keep_alive):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        if path == "/health" and method == "GET":
+            return 200, {"status": "ok", "circuit": self.engine.breaker.state, "pricing": self.engine.mode}
+        if path == "/stats" and method == "GET":
+            return 200, self.stats()
+        if path == "/quote" and method == "POST":
+            return await self.quote_one(self._json(body))
+        if path == "/quotes" and method == "POST":
+            return await self.quote_many(self._json(body))
+        if path in ROUTES:
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"No route for {path}")
+
+    @staticmethod
+    def _json(body):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    # ---------- QUOTING ----------
+    async def _quote(self, payload, use_cache):
+        """(result dict, history record or None) for one validated payload."""
+        fut = self.engine.quote(payload, use_cache=use_cache)
+        try:
+            cost, eta = await asyncio.wrap_future(fut)
+        except RateTableError as e:
+            return {"status": 422, "error": str(e)}, None
+        except Exception as e:
+            return {"status": 502, "error": describe_error(e)}, None
+        return {"cost": cost, "eta": eta, "source": fut.source}, make_record(payload, cost, eta)
+
+    async def _record(self, records):
+        records = [r for r in records if r is not None]
+        if self.history is not None and records:
+            await asyncio.get_running_loop().run_in_executor(None, self.history.add_many, records)
+
+    async def quote_one(self, data):
+        payload, errors = parcel_from_mapping(data)
+        if errors:
+            return 400, {"errors": errors}
+        result, record = await self._quote(payload, not data.get("bypass_cache"))
+        await self._record([record])
+        return result.pop("status", 200), result
+
+    async def quote_many(self, data):
+        parcels = data.get("parcels")
+        if not isinstance(parcels, list):
+            raise HTTPError(400, "Expected {\"parcels\": [...]}")
+        if len(parcels) > MAX_BULK_PARCELS:
+            raise HTTPError(413, f"At most {MAX_BULK_PARCELS} parcels per request")
+        use_cache = not data.get("bypass_cache")
+        results = [None] * len(parcels)
+        pending = []
+        for i, parcel in enumerate(parcels):
+            payload, errors = parcel_from_mapping(parcel) if isinstance(parcel, dict) else \
+                (None, ["Parcel must be a JSON object."])
+            if errors:
+                results[i] = {"index": i, "status": 400, "errors": errors}
+            else:
+                pending.append((i, self._quote(payload, use_cache)))
+        done = await asyncio.gather(*(coro for _, coro in pending))
+        for (i, _), (result, _) in zip(pending, done):
+            results[i] = {"index": i, **result}
+        await self._record([record for _, record in done])
+        self.metrics.count("bulk_parcels", len(parcels))
+        return 200, {"results": results,
+                     "ok": sum("cost" in r for r in results), "failed": sum("cost" not in r for r in results)}
+
+    def stats(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "pricing": self.engine.mode,
+            "max_in_flight": self.engine.max_in_flight,
+            "circuit": self.engine.breaker.state,
+            "cache": self.engine.cache.stats(),
+            "coalesced": self.engine.coalesced,
+            "api_calls": self.engine.telemetry.summary(300),
+            "metrics": self.metrics.snapshot(),
+        }
+
+
+# ----------------------------
+# Startup
+# ----------------------------
+def build_engine(api_url, api_key, max_in_flight=DEFAULT_MAX_IN_FLIGHT, rate_limit=DEFAULT_RATE_LIMIT,
+                 pricing="api", rate_table=DEFAULT_RATE_TABLE_PATH, cache_path=None):
+    cache = QuoteCache()
+    if cache_path:
+        cache.load(cache_path)
+    engine = QuoteEngine(api_url, api_key, max_in_flight, cache=cache, rate_limit=rate_limit)
+    if pricing != "api":
+        engine.set_pricing(pricing, RateTable.load(rate_table))
+    return engine
+
+
+async def start_server(service, host="127.0.0.1", port=8080):
+    return await asyncio.start_server(service.handle, host, port, limit=64 * 1024)
+
+
+def serve_in_thread(service, host="127.0.0.1", port=0):
+    """Run the service on its own event loop thread (tests, load tests). Returns (loop, port)."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    box = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(start_server(service, host, port))
+        box["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return loop, box["port"]
+
+
+def main():
+    cfg = load_config()
+    ap = argparse.ArgumentParser(description="Async HTTP service for AusPost postage quotes.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--api-url", default=cfg["api_url"])
+    ap.add_argument("--api-key", default=os.environ.get("AUSPOST_API_KEY", cfg["api_key"]))
+    ap.add_argument("--max-in-flight", type=int, default=cfg["max_in_flight"])
+    ap.add_argument("--rate-limit", type=float, default=cfg["rate_limit"], help="API requests/s (0 = off)")
+    ap.add_argument("--pricing", choices=list(PRICING_MODES), default=cfg["pricing_mode"])
+    ap.add_argument("--rates", default=cfg["rate_table"] or DEFAULT_RATE_TABLE_PATH, help="rate table JSON")
+    ap.add_argument("--cache-file", help="load/save the quote cache here (default: in memory only)")
+    ap.add_argument("--history", nargs="?", const=QUOTE_HISTORY_PATH,
+                    help="record quotes in a QuoteHistory SQLite file (default path if no value)")
+    args = ap.parse_args()
+
+    try:
+        engine = build_engine(args.api_url, args.api_key, args.max_in_flight, args.rate_limit,
+                              args.pricing, args.rates, args.cache_file)
+    except RateTableError as e:
+        ap.exit(1, f"{e}\n")
+    history = QuoteHistory(args.history) if args.history else None
+    service = PostageService(engine, history)
+
+    async def run():
+        server = await start_server(service, args.host, args.port)
+        print(f"Postage service on http://{args.host}:{args.port} "
+              f"({PRICING_MODES[engine.mode]}, {engine.max_in_flight} workers)")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.shutdown()
+        if args.cache_file:
+            engine.cache.save(args.cache_file)
+        if history is not None:
+            history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,78 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import sqlite3, csv, threading, os, io, urllib.request
-import io, os, csv, threading, urllib.request, sqlite3, time
+import csv, threading, os, io, urllib.request
+import io, os, csv, threading, urllib.request, time
+import logging
+from product_store import open_store, JOURNAL_COLS
+from perf_metrics import Metrics
 # --------------------------
 # Product Management Dashboard
 # --------------------------
-# Standard library only. Dark "Tokyo Night"-like style.
+# Standard library only by default (SQLite); PostgreSQL needs psycopg2, and
+# SQLAlchemy is used for pooling when installed. Dark "Tokyo Night"-like style.
 # Features:
 # - Import from CSV (upsert by SKU)
 # - Toggle Table <-> Card views
 # - Double-click (table) / click (card) opens detail/edit dialog
 # - Search/filter, sorting, pagination
 # - Export visible page to CSV (optional)
+# - Storage via product_store: SQLite by default, PostgreSQL with PRODUCTS_DB_URL
+# - Hidden diagnostics panel (Ctrl+Shift+D): timing spans, cache hit rates, rows/s
 #
 # Expected CSV headers: sku,name,price,stock,category,status,image_path,description
 #   - image_path supports local PNG/GIF, or URL (PNG/GIF).
 #   - Extra columns are ignored.
 
+log = logging.getLogger(__name__)
+
 DB_FILE = "products.db"
+DB_URL = os.environ.get("PRODUCTS_DB_URL", f"sqlite:///{DB_FILE}")
+
+# Off unless PRODUCTS_METRICS=1 or switched on in the diagnostics panel
+METRICS = Metrics(enabled=os.environ.get("PRODUCTS_METRICS") == "1")
+
+# Reason codes written to the rejects file
+REJECT_MISSING_SKU = "MISSING_SKU"
+REJECT_MISSING_NAME = "MISSING_NAME"
+REJECT_ROW_ERROR = "ROW_ERROR"
+
+
+class RejectsWriter:
+    """Streams rejected import rows to <source>.rejects.csv as they happen.
+
+    Columns are _line, _reason, _detail followed by the source's own header and
+    the raw cells, so the file can be fixed and re-imported directly (the
+    underscore columns are not in the header map and get ignored). Only the
+    per-reason counts are kept in memory.
+    """
+
+    def __init__(self, source_path, headers):
+        self.path = os.path.splitext(source_path)[0] + ".rejects.csv"
+        self.headers = list(headers)
+        self.reasons = {}
+        self.total = 0
+        self._fh = None
+        self._writer = None
+        if os.path.exists(self.path):
+            os.remove(self.path)  # don't leave a stale report from an earlier run
+
+    def reject(self, line_no, reason, detail, raw_row):
+        if self._writer is None:
+            self._fh = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._fh)
+            self._writer.writerow(["_line", "_reason", "_detail"] + self.headers)
+        self._writer.writerow([line_no, reason, detail] + list(raw_row))
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        self.total += 1
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def summary(self):
+        return {"path": self.path if self.total else None, "total": self.total, "reasons": dict(self.reasons)}
+
 
 class ProductDashboard:
     def __init__(self, root):
@@ -77,34 +132,84 @@ class ProductDashboard:
 
     # ---------- DB ----------
     def _setup_db(self):
-        self.conn = sqlite3.connect(DB_FILE)
-        self.conn.row_factory = sqlite3.Row
-        cur = self.conn.cursor()
+        # Backend comes from product_store; SQLite file unless PRODUCTS_DB_URL says otherwise
+        self.store = open_store(DB_URL)
+        self.conn = self.store.acquire()  # long-lived UI-thread connection
+        self.store.setup_schema(self.conn)
+
+    # ---------- CHANGE JOURNAL ----------
+    # Every write (edit, delete, import) opens a row in change_batches first;
+    # triggers (see product_store) then copy the pre-image of each touched
+    # product into product_changes, stamped with that batch id.
+    #
+    # Only the first pre-image per (batch, product) is kept and updates that
+    # change nothing are not logged, so re-importing the same feed costs no
+    # journal writes. Old batches are compacted after each import.
+    JOURNAL_KEEP_BATCHES = 20
+
+    def _begin_change_batch(self, conn, label):
+        """Open a journal batch; must run inside the transaction that makes the changes."""
+        return self.store.begin_batch(conn, label)
+
+    def _compact_journal(self, conn):
+        """Drop batches beyond the retention window (and anything already undone)."""
+        cur = conn.cursor()
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sku TEXT UNIQUE,
-                name TEXT,
-                price REAL,
-                stock INTEGER,
-                category TEXT,
-                status TEXT,
-                image_path TEXT,
-                description TEXT
-            )
-        """)
-        self.conn.execute("PRAGMA journal_mode=WAL;")
-        self.conn.execute("PRAGMA synchronous=NORMAL;")
-        self.conn.commit()
+            SELECT id FROM change_batches
+            WHERE undone = 0
+            ORDER BY id DESC LIMIT 1 OFFSET ?
+        """, (self.JOURNAL_KEEP_BATCHES - 1,))
+        row = cur.fetchone()
+        cutoff = row[0] if row else 0
+        cur.execute("DELETE FROM product_changes WHERE batch_id < ? OR batch_id IN "
+                    "(SELECT id FROM change_batches WHERE undone = 1)", (cutoff,))
+        cur.execute("DELETE FROM change_batches WHERE id < ? OR undone = 1", (cutoff,))
+        conn.commit()
 
+    def _undo_to_batch(self, conn, batch_id):
+        """Roll the catalogue back to just before batch_id, newest batch first.
+
+        The rollback is itself journaled as a new batch, so it can be undone too.
+        """
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        cur.execute("SELECT id FROM change_batches WHERE id >= ? AND undone = 0 ORDER BY id DESC", (batch_id,))
+        targets = [r[0] for r in cur.fetchall()]
+        if not targets:
+            conn.rollback()
+            return 0
+        self._begin_change_batch(conn, f"Undo to #{batch_id}")
+        cols = ", ".join(JOURNAL_COLS)
+        # Correlated subqueries (one indexed lookup on UNIQUE(batch_id, product_id) per column) rather
+        # than UPDATE ... FROM, which needs SQLite 3.33
+        journaled = "FROM product_changes AS c WHERE c.batch_id=? AND c.product_id = products.id"
+        assign = ", ".join(f"{c}=(SELECT c.{c} {journaled})" for c in JOURNAL_COLS)
+        for bid in targets:
+            cur.execute("""
+                DELETE FROM products WHERE id IN
+                (SELECT product_id FROM product_changes WHERE batch_id=? AND op='I')
+            """, (bid,))
+            cur.execute(f"""
+                UPDATE products SET {assign}
+                WHERE id IN (SELECT product_id FROM product_changes WHERE batch_id=? AND op IN ('U','D'))
+            """, (bid,) * (len(JOURNAL_COLS) + 1))
+            cur.execute(f"""
+                INSERT INTO products (id, {cols})
+                SELECT c.product_id, {", ".join(f"c.{x}" for x in JOURNAL_COLS)}
+                FROM product_changes AS c
+                WHERE c.batch_id=? AND c.op IN ('U','D')
+                AND NOT EXISTS (SELECT 1 FROM products p WHERE p.id = c.product_id)
+            """, (bid,))
+        cur.executemany("UPDATE change_batches SET undone=1 WHERE id=?", [(b,) for b in targets])
+        conn.commit()
+        return len(targets)
 
     def _get_db_connection(self):
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        # Match PRAGMAs for consistency
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        return conn
+        """Borrow a pooled connection for a worker thread; hand back with _release_db_connection."""
+        return self.store.acquire()
+
+    def _release_db_connection(self, conn):
+        self.store.release(conn)
 
     # ---------- UI ----------
     def _setup_ui(self):
@@ -120,6 +225,7 @@ class ProductDashboard:
 
         ttk.Button(self.left, text="Import CSV", command=self.import_csv).pack(padx=12, pady=4, fill="x")
         ttk.Button(self.left, text="Export Visible to CSV", command=self.export_csv).pack(padx=12, pady=4, fill="x")
+        ttk.Button(self.left, text="Change History / Undo", command=self._open_history_dialog).pack(padx=12, pady=4, fill="x")
 
         # View toggle
         tk.Label(self.left, text="View Mode", bg=self.colors["bg"], fg=self.colors["fg_muted"]).pack(padx=12, pady=(12, 0), anchor="w")
@@ -198,20 +304,29 @@ class ProductDashboard:
         # Start with table
         self._show_table()
 
+        # Hidden diagnostics panel
+        self.root.bind("<Control-Shift-D>", lambda e: self._open_diagnostics_panel())
+
     # ---------- DATA LOAD / FILTER / SORT ----------
+    @METRICS.timed("load_data")
     def _load_data(self):
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT id, sku, name, price, stock, category, status, image_path, description
-            FROM products
-            ORDER BY id ASC
-        """)
-        rows = [dict(r) for r in cur.fetchall()]
+        with METRICS.span("load_data.sql"):
+            cur = self.conn.cursor()
+            cur.execute("""
+                SELECT id, sku, name, price, stock, category, status, image_path, description
+                FROM products
+                ORDER BY id ASC
+            """)
+            rows = [dict(r) for r in cur.fetchall()]
+            # End the read transaction; on PostgreSQL the long-lived UI connection
+            # would otherwise sit "idle in transaction" holding its snapshot
+            self.conn.rollback()
         self.all_data = rows
         self._apply_search()
         self.stats_label.config(text=f"Products: {len(self.all_data)}")
         self.status_label.config(text="Loaded products")
 
+    @METRICS.timed("apply_search")
     def _apply_search(self):
         q = self.search_text.get().strip().lower()
         if not q:
@@ -231,6 +346,7 @@ class ProductDashboard:
         self.search_text.set("")
         self._apply_search()
 
+    @METRICS.timed("sort")
     def sort_by_column(self, col):
         # Toggle sort order if same col
         reverse = self.sort_column == col and not self.sort_reverse
@@ -281,6 +397,7 @@ class ProductDashboard:
         self.cards_frame.pack(fill=tk.BOTH, expand=True)
 
     # ---------- TABLE ----------
+    @METRICS.timed("update_table")
     def _update_table(self):
         for row in self.tree.get_children():
             self.tree.delete(row)
@@ -310,6 +427,7 @@ class ProductDashboard:
             w.destroy()
         # keep images to avoid flicker; they’re re-used by id in image_cache
 
+    @METRICS.timed("update_cards")
     def _update_cards(self):
         self._clear_cards()
         start, end = self._page_slice()
@@ -359,6 +477,7 @@ class ProductDashboard:
         for c in range(cols):
             self.cards_inner.grid_columnconfigure(c, weight=1)
 
+    @METRICS.timed("thumbnail")
     def _get_thumbnail_for_product(self, r, max_w, max_h):
         """
         Load and lightly downscale a PNG/GIF using Tkinter PhotoImage.
@@ -366,7 +485,9 @@ class ProductDashboard:
         """
         pid = r["id"]
         if pid in self.image_cache:
+            METRICS.count("thumb_cache_hit")
             return self.image_cache[pid]
+        METRICS.count("thumb_cache_miss")
 
         path = (r.get("image_path") or "").strip()
         if not path:
@@ -375,14 +496,16 @@ class ProductDashboard:
         try:
             if path.startswith("http://") or path.startswith("https://"):
                 # Download to memory (only PNG/GIF supported by PhotoImage)
-                with urllib.request.urlopen(path, timeout=5) as resp:
-                    data = resp.read()
+                with METRICS.span("thumbnail.fetch"):
+                    with urllib.request.urlopen(path, timeout=5) as resp:
+                        data = resp.read()
                 img = tk.PhotoImage(data=data)
             else:
                 if not os.path.exists(path):
                     return None
                 img = tk.PhotoImage(file=path)
         except Exception:
+            METRICS.count("thumb_load_error")
             return None
 
         # Downscale via subsample if needed (integer factor)
@@ -811,6 +934,156 @@ class ProductDashboard:
 
     #     threading.Thread(target=worker, daemon=True).start()
 
+    @METRICS.timed("import_file")
+    def _import_file(self, conn, path):
+        """Upsert every row of a CSV file into products on conn (no UI access).
+
+        Returns (inserted, updated, skipped, rejects) where rejects is the
+        RejectsWriter summary. Raises on unreadable files or a missing header
+        after rolling back.
+        """
+        self._ensure_db_indexes(conn)
+        text, enc, fh = self._open_csv_text(path)
+        rejects = None
+        try:
+            # Sniff CSV dialect, read header
+            csv.field_size_limit(10**7)
+            dialect = self._sniff_dialect(text)
+
+            reader = csv.reader(text, dialect=dialect)
+            raw_headers = next(reader, None)
+            if not raw_headers:
+                raise ValueError("File has no header row.")
+
+            headers_norm = [self._normalize_header(h) for h in raw_headers]
+            headers_norm = self._dedupe_headers(headers_norm)
+            target_map = self._build_header_map(headers_norm)
+
+            # Single transaction on the caller's connection
+            cur = conn.cursor()
+            cur.execute("BEGIN")
+            self._begin_change_batch(conn, f"Import {os.path.basename(path)}")
+
+            have_upsert = True
+            upsert_sql = """
+                INSERT INTO products (sku, name, price, stock, category, status, image_path, description)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sku) DO UPDATE SET
+                name=excluded.name,
+                price=excluded.price,
+                stock=excluded.stock,
+                category=excluded.category,
+                status=excluded.status,
+                image_path=excluded.image_path,
+                description=excluded.description
+            """
+
+            batch, BATCH_SIZE = [], 500
+            inserted = updated = skipped = 0
+            rejects = RejectsWriter(path, raw_headers)
+            line_no = 1
+
+            # Re-create reader to start after header
+            text.seek(0)
+            reader = csv.reader(text, dialect=dialect)
+            _ = next(reader, None)
+
+            def flush_batch():
+                nonlocal inserted, updated,have_upsert
+                if not batch:
+                    return
+                with METRICS.span("import_flush", rows=len(batch)):
+                    try:
+                        if have_upsert:
+                            cur.executemany(upsert_sql, batch)
+                        else:
+                            # (fallback manual upsert here if needed)
+                            pass
+                    except self.store.OperationalError:
+                        # SQLite too old for ON CONFLICT -> manual path
+                        have_upsert = False
+                        for tpl in batch:
+                            sku = tpl[0]
+                            cur.execute("SELECT id FROM products WHERE sku=?", (sku,))
+                            if cur.fetchone():
+                                cur.execute("""
+                                    UPDATE products
+                                    SET name=?, price=?, stock=?, category=?, status=?, image_path=?, description=?
+                                    WHERE sku=?""",
+                                    (tpl[1], tpl[2], tpl[3], tpl[4], tpl[5], tpl[6], tpl[7], sku)
+                                )
+                                updated += 1
+                            else:
+                                cur.execute("""
+                                    INSERT INTO products (sku, name, price, stock, category, status, image_path, description)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", tpl)
+                                inserted += 1
+                batch.clear()
+
+            for row in reader:
+                line_no += 1
+                try:
+                    vals = [self._sanitize_cell(row[i]) if i < len(row) else "" for i in range(len(headers_norm))]
+                    def get_by_target(t):
+                        idx = target_map.get(t, None)
+                        return vals[idx] if idx is not None and idx < len(vals) else ""
+
+                    sku = get_by_target("sku")
+                    name = get_by_target("name")
+                    if not sku or not name:
+                        skipped += 1
+                        if not sku:
+                            rejects.reject(line_no, REJECT_MISSING_SKU, "SKU is empty or not mapped", row)
+                        else:
+                            rejects.reject(line_no, REJECT_MISSING_NAME, "Name is empty or not mapped", row)
+                        continue
+
+                    price = self._to_float(get_by_target("price"))
+                    stock = self._to_int(get_by_target("stock"))
+                    category = get_by_target("category")
+                    status = get_by_target("status")
+                    image_path = get_by_target("image_path")
+                    description = get_by_target("description")
+
+                    batch.append((sku, name, price, stock, category, status, image_path, description))
+                    if len(batch) >= BATCH_SIZE:
+                        flush_batch()
+                except Exception as e:
+                    skipped += 1
+                    rejects.reject(line_no, REJECT_ROW_ERROR, f"{type(e).__name__}: {e}", row)
+
+            flush_batch()
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            if rejects is not None:
+                rejects.close()
+            try:
+                text.detach()
+            except Exception:
+                pass
+            try:
+                fh.close()
+            except Exception:
+                pass
+
+        try:
+            self._compact_journal(conn)
+        except Exception:
+            # The import is already committed; old batches are retried after the next one
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            METRICS.count("journal_compact_error")
+            log.warning("Journal maintenance: compacting change batches after import failed", exc_info=True)
+        return inserted, updated, skipped, rejects.summary()
+
     def import_csv(self):
         path = filedialog.askopenfilename(
             title="Select products CSV",
@@ -820,151 +1093,30 @@ class ProductDashboard:
             return
 
         def worker():
-            # 1) Open a separate connection for this thread
-            conn = None
+            # Separate pooled connection for this thread
+            conn = self._get_db_connection()
             try:
-                conn = self._get_db_connection()
-                self._ensure_db_indexes(conn)
-
-                # 2) Open text stream with robust encoding handling
-                try:
-                    text, enc, fh = self._open_csv_text(path)  # from the previous helper I gave you
-                except Exception as e:
-                    self.root.after(0, lambda: messagebox.showerror("Import CSV", f"Failed to open file:\n{e}"))
-                    return
-
-                try:
-                    # 3) Sniff CSV dialect, read header, etc. (same as previous version)
-                    csv.field_size_limit(10**7)
-                    dialect = self._sniff_dialect(text)
-
-                    reader = csv.reader(text, dialect=dialect)
-                    raw_headers = next(reader, None)
-                    if not raw_headers:
-                        raise ValueError("File has no header row.")
-
-                    headers_norm = [self._normalize_header(h) for h in raw_headers]
-                    headers_norm = self._dedupe_headers(headers_norm)
-                    target_map = self._build_header_map(headers_norm)
-
-                    # 4) Start a transaction on the **worker connection**
-                    cur = conn.cursor()
-                    cur.execute("BEGIN")
-
-                    have_upsert = True
-                    upsert_sql = """
-                        INSERT INTO products (sku, name, price, stock, category, status, image_path, description)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        ON CONFLICT(sku) DO UPDATE SET
-                        name=excluded.name,
-                        price=excluded.price,
-                        stock=excluded.stock,
-                        category=excluded.category,
-                        status=excluded.status,
-                        image_path=excluded.image_path,
-                        description=excluded.description
-                    """
-
-                    batch, BATCH_SIZE = [], 500
-                    inserted = updated = skipped = 0
-                    error_lines = []
-                    line_no = 1
-
-                    # Re-create reader to start after header
-                    text.seek(0)
-                    reader = csv.reader(text, dialect=dialect)
-                    _ = next(reader, None)
-
-                    def flush_batch():
-                        nonlocal inserted, updated,have_upsert
-                        if not batch:
-                            return
-                        try:
-                            if have_upsert:
-                                cur.executemany(upsert_sql, batch)
-                            else:
-                                # (fallback manual upsert here if needed)
-                                pass
-                        except sqlite3.OperationalError:
-                            # SQLite too old for ON CONFLICT -> manual path
-                            nonlocal have_upsert
-                            have_upsert = False
-                            for tpl in batch:
-                                sku = tpl[0]
-                                cur.execute("SELECT id FROM products WHERE sku=?", (sku,))
-                                if cur.fetchone():
-                                    cur.execute("""
-                                        UPDATE products
-                                        SET name=?, price=?, stock=?, category=?, status=?, image_path=?, description=?
-                                        WHERE sku=?""",
-                                        (tpl[1], tpl[2], tpl[3], tpl[4], tpl[5], tpl[6], tpl[7], sku)
-                                    )
-                                    updated += 1
-                                else:
-                                    cur.execute("""
-                                        INSERT INTO products (sku, name, price, stock, category, status, image_path, description)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", tpl)
-                                    inserted += 1
-                        batch.clear()
-
-                    for row in reader:
-                        line_no += 1
-                        try:
-                            vals = [self._sanitize_cell(row[i]) if i < len(row) else "" for i in range(len(headers_norm))]
-                            def get_by_target(t):
-                                idx = target_map.get(t, None)
-                                return vals[idx] if idx is not None and idx < len(vals) else ""
-
-                            sku = get_by_target("sku")
-                            name = get_by_target("name")
-                            if not sku or not name:
-                                skipped += 1
-                                error_lines.append(f"[Line {line_no}] Missing SKU or Name; row skipped.")
-                                continue
-
-                            price = self._to_float(get_by_target("price"))
-                            stock = self._to_int(get_by_target("stock"))
-                            category = get_by_target("category")
-                            status = get_by_target("status")
-                            image_path = get_by_target("image_path")
-                            description = get_by_target("description")
-
-                            batch.append((sku, name, price, stock, category, status, image_path, description))
-                            if len(batch) >= BATCH_SIZE:
-                                flush_batch()
-                        except Exception as e:
-                            skipped += 1
-                            error_lines.append(f"[Line {line_no}] {e}")
-
-                    flush_batch()
-                    conn.commit()
-
-                except Exception as e:
-                    try:
-                        conn.rollback()
-                    except Exception:
-                        pass
-                    # bounce error UI back to main thread
-                    self.root.after(0, lambda: messagebox.showerror("Import CSV", f"Failed to import:\n{e}"))
-                finally:
-                    try:
-                        text.detach()
-                    except Exception:
-                        pass
-                    try:
-                        fh.close()
-                    except Exception:
-                        pass
-
-                # UI refresh must be in main thread
-                self.root.after(0, self._load_data)
-                self.root.after(0, lambda: self._set_status("Import complete"))
+                _, _, skipped, rejects = self._import_file(conn, path)
+            except Exception as e:
+                msg = f"Failed to import:\n{e}"
+                # bounce error UI back to main thread
+                self.root.after(0, lambda: messagebox.showerror("Import CSV", msg))
+                self.root.after(0, lambda: self._set_status("Import failed"))
+                return
             finally:
-                try:
-                    if conn is not None:
-                        conn.close()
-                except Exception:
-                    pass
+                self._release_db_connection(conn)
+
+            # UI refresh must be in main thread
+            self.root.after(0, self._load_data)
+            if rejects["total"]:
+                reasons = "\n".join(f"  {code}: {n:,}" for code, n in sorted(rejects["reasons"].items()))
+                self.root.after(0, lambda: self._set_status(f"Import complete: {skipped:,} rows rejected"))
+                self.root.after(0, lambda: messagebox.showinfo(
+                    "Import CSV",
+                    f"{rejects['total']:,} rows were rejected:\n{reasons}\n\n"
+                    f"Fix and re-import them from:\n{rejects['path']}"))
+            else:
+                self.root.after(0, lambda: self._set_status("Import complete"))
 
         # IMPORTANT: start the thread!
         threading.Thread(target=worker, daemon=True).start()
@@ -984,17 +1136,20 @@ class ProductDashboard:
             return
         start, end = self._page_slice()
         rows = self.filtered_data[start:end]
-        headers = ["sku", "name", "price", "stock", "category", "status", "image_path", "description"]
         try:
-            with open(path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                for r in rows:
-                    writer.writerow([r.get(h, "") for h in headers])
+            self._write_csv(path, rows)
             self._set_status(f"Exported {len(rows)} rows")
         except Exception as e:
             messagebox.showerror("Export CSV", f"Failed to export:\n{e}")
 
+    def _write_csv(self, path, rows):
+        headers = ["sku", "name", "price", "stock", "category", "status", "image_path", "description"]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            for r in rows:
+                writer.writerow([r.get(h, "") for h in headers])
+
     # ---------- DETAIL / EDIT ----------
     def _open_detail_dialog(self, product_row):
         d = tk.Toplevel(self.root)
@@ -1060,6 +1215,7 @@ class ProductDashboard:
             return
 
         cur = self.conn.cursor()
+        self._begin_change_batch(self.conn, f"Edit #{pid}")
         cur.execute("""
             UPDATE products
             SET name=?, price=?, stock=?, category=?, status=?, image_path=?, description=?
@@ -1086,12 +1242,138 @@ class ProductDashboard:
         if not messagebox.askyesno("Delete Product", "Are you sure you want to delete this product?"):
             return
         cur = self.conn.cursor()
+        self._begin_change_batch(self.conn, f"Delete #{pid}")
         cur.execute("DELETE FROM products WHERE id=?", (pid,))
         self.conn.commit()
         self._set_status("Deleted")
         dialog.destroy()
         self._load_data()
 
+    # ---------- HISTORY / UNDO ----------
+    def _open_history_dialog(self):
+        d = tk.Toplevel(self.root)
+        d.title("Change History")
+        d.configure(bg=self.colors["bg"])
+        d.geometry("640x420")
+        d.transient(self.root)
+
+        cols = ("id", "label", "created_at", "changes", "state")
+        tree = ttk.Treeview(d, columns=cols, show="headings")
+        headings = {"id": "#", "label": "Change", "created_at": "Time", "changes": "Rows", "state": "State"}
+        for cid in cols:
+            tree.heading(cid, text=headings[cid])
+            tree.column(cid, width=240 if cid == "label" else 90, anchor="w")
+        tree.pack(fill=tk.BOTH, expand=True, padx=12, pady=(12, 6))
+
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT b.id, b.label, b.created_at, b.undone, COUNT(c.id) AS changes
+            FROM change_batches b LEFT JOIN product_changes c ON c.batch_id = b.id
+            GROUP BY b.id
+            ORDER BY b.id DESC
+        """)
+        for r in cur.fetchall():
+            tree.insert("", "end", iid=str(r["id"]), values=(
+                r["id"], r["label"] or "", r["created_at"] or "", r["changes"],
+                "undone" if r["undone"] else ""
+            ))
+        self.conn.rollback()  # end the read transaction (see _load_data)
+
+        def undo_selected():
+            sel = tree.selection()
+            if not sel:
+                return
+            bid = int(sel[0])
+            if not messagebox.askyesno("Undo", f"Roll back change #{bid} and everything after it?", parent=d):
+                return
+            d.destroy()
+            self._set_status("Rolling back...")
+
+            def worker():
+                conn = self._get_db_connection()
+                try:
+                    n = self._undo_to_batch(conn, bid)
+                    msg = f"Rolled back {n} change(s)"
+                except Exception as e:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    err = e
+                    self.root.after(0, lambda: messagebox.showerror("Undo", f"Failed to roll back:\n{err}"))
+                    msg = "Rollback failed"
+                finally:
+                    self._release_db_connection(conn)
+                self.root.after(0, lambda: (self.image_cache.clear(), self._load_data(), self._set_status(msg)))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        btns = tk.Frame(d, bg=self.colors["bg"])
+        btns.pack(fill="x", padx=12, pady=(0, 12))
+        ttk.Button(btns, text="Undo to Selected", command=undo_selected).pack(side="left")
+        ttk.Button(btns, text="Close", command=d.destroy).pack(side="right")
+
+    # ---------- DIAGNOSTICS ----------
+    def _open_diagnostics_panel(self):
+        d = tk.Toplevel(self.root)
+        d.title("Diagnostics")
+        d.configure(bg=self.colors["bg"])
+        d.geometry("760x460")
+        d.transient(self.root)
+
+        enabled = tk.BooleanVar(value=METRICS.enabled)
+        top = tk.Frame(d, bg=self.colors["bg"])
+        top.pack(fill="x", padx=12, pady=(12, 6))
+        ttk.Checkbutton(top, text="Collect metrics", variable=enabled,
+                        command=lambda: setattr(METRICS, "enabled", enabled.get())).pack(side="left")
+        summary = tk.Label(top, bg=self.colors["bg"], fg=self.colors["fg_muted"], anchor="w")
+        summary.pack(side="left", padx=12)
+
+        cols = ("span", "count", "p50", "p90", "p99", "max", "total", "rows_s")
+        tree = ttk.Treeview(d, columns=cols, show="headings")
+        headings = {"span": "Span", "count": "Count", "p50": "~p50 ms", "p90": "~p90 ms", "p99": "~p99 ms",
+                    "max": "Max ms", "total": "Total ms", "rows_s": "Rows/s"}
+        for cid in cols:
+            tree.heading(cid, text=headings[cid])
+            tree.column(cid, width=180 if cid == "span" else 75, anchor="w" if cid == "span" else "e")
+        tree.pack(fill=tk.BOTH, expand=True, padx=12, pady=6)
+
+        def fmt(v):
+            return "" if v is None else (f"{v:,.2f}" if isinstance(v, float) else f"{v:,}")
+
+        def refresh():
+            snap = METRICS.snapshot()
+            for i in tree.get_children():
+                tree.delete(i)
+            for name, h in snap["spans"].items():
+                tput = snap["throughput"].get(name, {})
+                tree.insert("", "end", values=(
+                    name, fmt(h["count"]), fmt(h["p50_ms"]), fmt(h["p90_ms"]), fmt(h["p99_ms"]),
+                    fmt(h["max_ms"]), fmt(h["total_ms"]), fmt(tput.get("rows_per_s")),
+                ))
+            rate = METRICS.hit_rate("thumb_cache")
+            summary.config(text=f"Since {snap['since']}  |  Thumbnail cache hit rate: "
+                                + ("n/a" if rate is None else f"{rate:.0%}"))
+
+        def export():
+            path = filedialog.asksaveasfilename(title="Export metrics", defaultextension=".json",
+                                                filetypes=[("JSON files", "*.json")], parent=d)
+            if not path:
+                return
+            try:
+                METRICS.export_json(path)
+                self._set_status(f"Metrics exported to {path}")
+            except Exception as e:
+                messagebox.showerror("Export Metrics", f"Failed to export:\n{e}", parent=d)
+
+        btns = tk.Frame(d, bg=self.colors["bg"])
+        btns.pack(fill="x", padx=12, pady=(0, 12))
+        ttk.Button(btns, text="Refresh", command=refresh).pack(side="left")
+        ttk.Button(btns, text="Reset", command=lambda: (METRICS.reset(), refresh())).pack(side="left", padx=8)
+        ttk.Button(btns, text="Export JSON", command=export).pack(side="left")
+        ttk.Button(btns, text="Close", command=d.destroy).pack(side="right")
+        refresh()
+
     # ---------- UTIL ----------
     def _set_status(self, text):
         self.status_label.config(text=text)
@@ -0,0 +1,401 @@
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from urllib.parse import urlparse, unquote
+# --------------------------
+# Product Store
+# --------------------------
+# Storage backends for the product catalogue used by prod_dash.py.
+#
+#   open_store("sqlite:///products.db")              -> SQLiteStore (default, stdlib only)
+#   open_store("postgresql://user:pw@host/catalog")  -> PostgresStore (needs psycopg2;
+#                                                       pools via SQLAlchemy if installed)
+#
+# Every store hands out pooled DB-API connections (acquire/release, or the
+# connection() context manager) and owns the dialect-specific bits: schema and
+# journal DDL, PRAGMAs / session settings, and opening a change batch.
+#
+# The dashboard writes its SQL with "?" placeholders. Drivers using the
+# "format" paramstyle get a thin wrapper that rewrites them to "%s".
+#
+# DBAPIStore takes any DB-API connect callable; subclasses add the schema. The
+# SQLite backend doubles as the local stand-in for the shared catalogue: WAL,
+# busy_timeout and the pool let several importers and viewers use one file.
+
+JOURNAL_COLS = ("sku", "name", "price", "stock", "category", "status", "image_path", "description")
+
+
+class DBAPIStore(ABC):
+    """Connection pool over a DB-API 2.0 connect callable; subclasses provide the schema."""
+
+    dialect = "generic"
+    paramstyle = "qmark"
+    OperationalError = sqlite3.OperationalError
+
+    def __init__(self, connect, max_size=8, paramstyle=None, errors=None):
+        self._connect = connect
+        self.max_size = max_size
+        if paramstyle:
+            self.paramstyle = paramstyle
+        if errors is not None:
+            self.OperationalError = errors.OperationalError
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    # ---------- POOL ----------
+    def _new_connection(self):
+        conn = self._connect()
+        if self.paramstyle in ("format", "pyformat"):
+            conn = _FormatConnection(conn)
+        return conn
+
+    def acquire(self, timeout=30):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                try:
+                    return self._new_connection()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        try:
+            conn.rollback()  # never hand out a connection mid-transaction
+        except Exception:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    # ---------- SCHEMA / JOURNAL ----------
+    @abstractmethod
+    def setup_schema(self, conn):
+        """Create the products, change_batches and product_changes tables plus journal triggers, then commit."""
+
+    def begin_batch(self, conn, label):
+        """Open a change batch inside conn's current transaction; return its id."""
+        cur = conn.cursor()
+        cur.execute("INSERT INTO change_batches (label, created_at) VALUES (?, ?) RETURNING id",
+                    (label, time.strftime("%Y-%m-%d %H:%M:%S")))
+        return cur.fetchone()[0]
+
+
+class SQLiteStore(DBAPIStore):
+    dialect = "sqlite"
+
+    def __init__(self, path, max_size=8):
+        self.path = path
+        super().__init__(self._open, max_size=max_size)
+
+    def _open(self):
+        # Pooled connections move between the UI thread and import workers.
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        # Wait for a concurrent writer instead of failing with "database is locked"
+        conn.execute("PRAGMA busy_timeout=5000;")
+        return conn
+
+    def begin_batch(self, conn, label):
+        # lastrowid rather than INSERT ... RETURNING, which needs SQLite 3.35
+        cur = conn.cursor()
+        cur.execute("INSERT INTO change_batches (label, created_at) VALUES (?, ?)",
+                    (label, time.strftime("%Y-%m-%d %H:%M:%S")))
+        return cur.lastrowid
+
+    def setup_schema(self, conn):
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sku TEXT UNIQUE,
+                name TEXT,
+                price REAL,
+                stock INTEGER,
+                category TEXT,
+                status TEXT,
+                image_path TEXT,
+                description TEXT
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS change_batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                label TEXT,
+                created_at TEXT,
+                undone INTEGER DEFAULT 0
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS product_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch_id INTEGER,
+                op TEXT,              -- 'I' insert, 'U' update, 'D' delete
+                product_id INTEGER,
+                sku TEXT,
+                name TEXT,
+                price REAL,
+                stock INTEGER,
+                category TEXT,
+                status TEXT,
+                image_path TEXT,
+                description TEXT,
+                UNIQUE (batch_id, product_id) ON CONFLICT IGNORE
+            )
+        """)
+        # SQLite has a single writer, so the newest batch is the running one.
+        old_cols = ", ".join(f"OLD.{c}" for c in JOURNAL_COLS)
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in JOURNAL_COLS)
+        cols = ", ".join(JOURNAL_COLS)
+        batch = "(SELECT MAX(id) FROM change_batches)"
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_ai AFTER INSERT ON products
+            BEGIN
+                INSERT INTO product_changes (batch_id, op, product_id)
+                VALUES ({batch}, 'I', NEW.id);
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_au AFTER UPDATE ON products
+            WHEN {changed}
+            BEGIN
+                INSERT INTO product_changes (batch_id, op, product_id, {cols})
+                VALUES ({batch}, 'U', OLD.id, {old_cols});
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_ad AFTER DELETE ON products
+            BEGIN
+                INSERT INTO product_changes (batch_id, op, product_id, {cols})
+                VALUES ({batch}, 'D', OLD.id, {old_cols});
+            END
+        """)
+        conn.commit()
+
+
+class PostgresStore(DBAPIStore):
+    dialect = "postgresql"
+    paramstyle = "format"
+
+    def __init__(self, url, max_size=8):
+        self.url = url
+        try:
+            import psycopg2
+            import psycopg2.extras
+        except ImportError:
+            raise RuntimeError("PostgreSQL backend requires psycopg2 (pip install psycopg2-binary).")
+        try:
+            import sqlalchemy
+        except ImportError:
+            sqlalchemy = None
+
+        cursor_factory = psycopg2.extras.DictCursor  # rows support r[0] and dict(r)
+        self._engine = None
+        if sqlalchemy is not None:
+            # SQLAlchemy owns pooling (with pre-ping) when it is installed. It only
+            # knows the "postgresql" scheme; psycopg2 and Heroku-style URLs also use "postgres".
+            scheme, rest = url.split("://", 1)
+            if scheme.split("+", 1)[0].lower() == "postgres":
+                url = "postgresql" + scheme[len("postgres"):] + "://" + rest
+            self._engine = sqlalchemy.create_engine(
+                url, pool_size=max_size, pool_pre_ping=True,
+                connect_args={"cursor_factory": cursor_factory},
+            )
+            connect = None
+        else:
+            p = urlparse(url)
+
+            def connect():
+                return psycopg2.connect(
+                    host=p.hostname, port=p.port or 5432, dbname=p.path.lstrip("/"),
+                    user=unquote(p.username or ""), password=unquote(p.password or ""),
+                    cursor_factory=cursor_factory,
+                )
+        super().__init__(connect, max_size=max_size, errors=psycopg2)
+
+    def acquire(self, timeout=30):
+        if self._engine is None:
+            return super().acquire(timeout)
+        return _FormatConnection(self._engine.raw_connection())
+
+    def release(self, conn):
+        if self._engine is None:
+            return super().release(conn)
+        conn.close()  # checks back into the SQLAlchemy pool, which rolls back
+
+    def close(self):
+        super().close()
+        if self._engine is not None:
+            self._engine.dispose()
+
+    def setup_schema(self, conn):
+        cols = ", ".join(JOURNAL_COLS)
+        old_cols = ", ".join(f"OLD.{c}" for c in JOURNAL_COLS)
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                id SERIAL PRIMARY KEY,
+                sku TEXT UNIQUE,
+                name TEXT,
+                price DOUBLE PRECISION,
+                stock INTEGER,
+                category TEXT,
+                status TEXT,
+                image_path TEXT,
+                description TEXT
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS change_batches (
+                id SERIAL PRIMARY KEY,
+                label TEXT,
+                created_at TEXT,
+                undone INTEGER DEFAULT 0
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS product_changes (
+                id BIGSERIAL PRIMARY KEY,
+                batch_id INTEGER,
+                op TEXT,
+                product_id INTEGER,
+                sku TEXT,
+                name TEXT,
+                price DOUBLE PRECISION,
+                stock INTEGER,
+                category TEXT,
+                status TEXT,
+                image_path TEXT,
+                description TEXT,
+                UNIQUE (batch_id, product_id)
+            )
+        """)
+        # Many writers: the batch id travels in a transaction-local setting.
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION products_journal() RETURNS trigger AS $$
+            DECLARE
+                bid INTEGER := NULLIF(current_setting('products.batch_id', true), '')::INTEGER;
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO product_changes (batch_id, op, product_id)
+                    VALUES (bid, 'I', NEW.id) ON CONFLICT DO NOTHING;
+                    RETURN NEW;
+                ELSIF TG_OP = 'UPDATE' THEN
+                    IF ROW({old_cols}) IS NOT DISTINCT FROM ROW({", ".join(f"NEW.{c}" for c in JOURNAL_COLS)}) THEN
+                        RETURN NEW;
+                    END IF;
+                    INSERT INTO product_changes (batch_id, op, product_id, {cols})
+                    VALUES (bid, 'U', OLD.id, {old_cols}) ON CONFLICT DO NOTHING;
+                    RETURN NEW;
+                END IF;
+                INSERT INTO product_changes (batch_id, op, product_id, {cols})
+                VALUES (bid, 'D', OLD.id, {old_cols}) ON CONFLICT DO NOTHING;
+                RETURN OLD;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS trg_products_journal ON products")
+        cur.execute("""
+            CREATE TRIGGER trg_products_journal
+            AFTER INSERT OR UPDATE OR DELETE ON products
+            FOR EACH ROW EXECUTE FUNCTION products_journal()
+        """)
+        conn.commit()
+
+    def begin_batch(self, conn, label):
+        bid = super().begin_batch(conn, label)
+        conn.cursor().execute("SELECT set_config('products.batch_id', ?, true)", (str(bid),))
+        return bid
+
+
+class _FormatCursor:
+    """Cursor proxy rewriting '?' placeholders for format-paramstyle drivers."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, params=()):
+        if sql.strip().upper() == "BEGIN":
+            return self  # the driver opens transactions implicitly
+        return self._cur.execute(_to_format(sql), params)
+
+    def executemany(self, sql, seq):
+        return self._cur.executemany(_to_format(sql), seq)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+
+class _FormatConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _FormatCursor(self._conn.cursor())
+
+    def execute(self, sql, params=()):
+        cur = self.cursor()
+        cur.execute(sql, params)
+        return cur
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+_format_cache = {}
+
+
+def _to_format(sql):
+    out = _format_cache.get(sql)
+    if out is None:
+        out = _format_cache[sql] = sql.replace("%", "%%").replace("?", "%s")
+    return out
+
+
+def open_store(url, max_size=8):
+    """Build a store from a URL; a bare path is treated as a SQLite file."""
+    if "://" not in url:
+        return SQLiteStore(url, max_size=max_size)
+    scheme = url.split("://", 1)[0].split("+", 1)[0].lower()
+    if scheme == "sqlite":
+        return SQLiteStore(url.split(":///", 1)[1] or ":memory:", max_size=max_size)
+    if scheme in ("postgres", "postgresql"):
+        return PostgresStore(url, max_size=max_size)
+    raise ValueError(f"Unsupported catalogue URL: {url}")
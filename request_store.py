@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+# --------------------------
+# Request history store (SQLite)
+# --------------------------
+# History for my_api_client.py. Sends append one row, so they cost the same at
+# a hundred entries or a million, and the History pane reads one page at a
+# time, newest first, by id (keyset paging). Rows are indexed by method, URL
+# and time for the pane's filters.
+#
+# delete() only marks the row (deleted = 1). A background thread purges
+# marked rows a batch at a time and hands the pages back with incremental
+# vacuum, so deleting never waits on a rewrite.
+#
+# The old request_history.json list is imported once, the first time the
+# database is opened next to it.
+
+PAGE_SIZE = 200
+COMPACT_DELAY = 2.0    # seconds to gather deletes before purging
+COMPACT_BATCH = 500    # rows purged per transaction
+
+
+class RequestStore:
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                name TEXT NOT NULL,
+                entry TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_requests_method ON requests(method, id);
+            CREATE INDEX IF NOT EXISTS idx_requests_url ON requests(url, id);
+            CREATE INDEX IF NOT EXISTS idx_requests_ts ON requests(ts);
+            CREATE INDEX IF NOT EXISTS idx_requests_deleted ON requests(deleted) WHERE deleted = 1;
+        """)
+        if legacy_json:
+            self._import_legacy(legacy_json)
+        self._pending = threading.Event()
+        self._closing = threading.Event()
+        self._compactor = threading.Thread(target=self._compact_loop, daemon=True, name="history-compact")
+        self._compactor.start()
+        if self.conn.execute("SELECT 1 FROM requests WHERE deleted = 1 LIMIT 1").fetchone():
+            self._pending.set()  # left over from the last session
+
+    def _import_legacy(self, path):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        entries = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = []
+        ts = os.path.getmtime(path) if entries else time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT INTO requests (ts, method, url, name, entry) VALUES (?, ?, ?, ?, ?)",
+                                  (self._row(e, ts) for e in entries if isinstance(e, dict)))
+            self.conn.execute("PRAGMA user_version = 1")
+
+    @staticmethod
+    def _row(entry, ts):
+        method = entry.get("method", "GET")
+        url = entry.get("url", "")
+        return ts, method, url, entry.get("name") or f"{method} {url}", json.dumps(entry)
+
+    # ---------- WRITING ----------
+    def add(self, entry):
+        """Append one history entry; returns its id."""
+        with self._lock, self.conn:
+            return self.conn.execute("INSERT INTO requests (ts, method, url, name, entry) VALUES (?, ?, ?, ?, ?)",
+                                     self._row(entry, time.time())).lastrowid
+
+    def delete(self, entry_id):
+        """Hide an entry now; the row itself is purged by the background compactor."""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE requests SET deleted = 1 WHERE id = ?", (entry_id,))
+        self._pending.set()
+
+    # ---------- READING ----------
+    @staticmethod
+    def _where(method=None, url_prefix=None, since=None):
+        clauses, args = ["deleted = 0"], []
+        if method:
+            clauses.append("method = ?")
+            args.append(method)
+        if url_prefix:
+            clauses.append("url >= ? AND url < ?")  # prefix range, so idx_requests_url is used
+            args += [url_prefix, url_prefix + "\U0010ffff"]
+        if since:
+            clauses.append("ts >= ?")
+            args.append(since)
+        return " AND ".join(clauses), args
+
+    def page(self, before_id=None, limit=PAGE_SIZE, **filters):
+        """Newest-first [(id, name)] with id < before_id, matching method / url_prefix / since."""
+        where, args = self._where(**filters)
+        if before_id is not None:
+            where += " AND id < ?"
+            args.append(before_id)
+        with self._lock:
+            rows = self.conn.execute(f"SELECT id, name FROM requests WHERE {where} ORDER BY id DESC LIMIT ?",
+                                     args + [limit]).fetchall()
+        return [(r["id"], r["name"]) for r in rows]
+
+    def count(self, **filters):
+        where, args = self._where(**filters)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM requests WHERE {where}", args).fetchone()[0]
+
+    def get(self, entry_id):
+        with self._lock:
+            row = self.conn.execute("SELECT entry FROM requests WHERE id = ? AND deleted = 0",
+                                    (entry_id,)).fetchone()
+        return json.loads(row["entry"]) if row else None
+
+    def iter_entries(self, chunk=1000):
+        """Every live entry, oldest first, chunk rows at a time."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute("SELECT id, entry FROM requests WHERE deleted = 0 AND id > ? "
+                                         "ORDER BY id LIMIT ?", (last_id, chunk)).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield json.loads(r["entry"])
+            last_id = rows[-1]["id"]
+
+    # ---------- COMPACTION ----------
+    def compact(self):
+        """Purge deleted rows in batches (releasing the lock between them); returns rows purged."""
+        purged = 0
+        while not self._closing.is_set():
+            with self._lock, self.conn:
+                n = self.conn.execute("DELETE FROM requests WHERE id IN "
+                                      "(SELECT id FROM requests WHERE deleted = 1 LIMIT ?)",
+                                      (COMPACT_BATCH,)).rowcount
+            purged += n
+            if n < COMPACT_BATCH:
+                break
+        if purged:
+            with self._lock:
+                # executescript steps the pragma to completion; execute() frees a single page
+                self.conn.executescript("PRAGMA incremental_vacuum;")
+        return purged
+
+    def _compact_loop(self):
+        while True:
+            self._pending.wait()
+            if self._closing.wait(COMPACT_DELAY):  # let a burst of deletes land first
+                return
+            self._pending.clear()
+            try:
+                self.compact()
+            except sqlite3.Error:
+                pass  # retried after the next delete
+
+    def close(self):
+        self._closing.set()
+        self._pending.set()
+        self._compactor.join()
+        with self._lock:
+            self.conn.close()
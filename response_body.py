@@ -0,0 +1,135 @@
+import codecs
+import os
+import re
+import shutil
+import tempfile
+# --------------------------
+# Response bodies for the API client
+# --------------------------
+# my_api_client.py streams each response body into a ResponseBody instead of
+# holding it as one bytes object. The body goes to the file the user picked
+# or to a spooled temp file, which stays in memory up to PREVIEW_LIMIT and
+# moves to disk beyond that. Bodies up to PREVIEW_LIMIT are shown whole.
+# Larger bodies are shown one page at a time (about PAGE_BYTES, cut at a
+# line end).
+#
+# pretty_json() re-indents JSON as a stream of tokens, CHUNK bytes at a time.
+# A 50 MB export is formatted in constant memory without building the object
+# tree. It does not validate: non-JSON text comes out re-spaced but otherwise
+# intact.
+
+PREVIEW_LIMIT = 2 * 1024 * 1024   # bytes shown whole (and kept in memory while streaming)
+PAGE_BYTES = 256 * 1024           # bytes per preview page above the limit
+CHUNK = 256 * 1024                # bytes read per pretty_json step
+
+# A string, one structural character, a run of anything else (numbers,
+# true/false/null), or whitespace
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\],:]|[^\s"{}\[\],:]+|\s+', re.S)
+
+
+class ResponseBody:
+    """A response body held in a file (path) or a spooled temp file, read back a page at a time."""
+
+    def __init__(self, path=None, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.size = 0
+        self.file = open(path, "w+b") if path else tempfile.SpooledTemporaryFile(PREVIEW_LIMIT)
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def read_all(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def text(self):
+        return self.read_all().decode(self.encoding, errors="replace")
+
+    def page(self, offset, limit=PAGE_BYTES):
+        """(text, next offset or None) for about `limit` bytes from `offset`, ending at a line break if any."""
+        self.file.seek(offset)
+        data = self.file.read(limit + 1)  # one byte over, to see where the next page would start
+        if len(data) <= limit:
+            return data.decode(self.encoding, errors="replace"), None
+        cut = data.rfind(b"\n", 0, limit) + 1
+        if not cut:
+            cut = limit
+            while cut > 1 and data[cut] & 0xC0 == 0x80:  # one long line: don't split a UTF-8 character
+                cut -= 1
+        return data[:cut].decode(self.encoding, errors="replace"), offset + cut
+
+    def save_as(self, path):
+        self.file.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(self.file, out, CHUNK)
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        """Close and, for a body written to the user's file, remove the partial file."""
+        self.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def pretty_json(src, dst, indent=4, progress=None):
+    """Re-indent the JSON in ResponseBody src into ResponseBody dst (UTF-8).
+
+    Output matches json.dumps(..., indent=indent) for valid JSON. progress, if
+    given, is called with the source bytes consumed after each chunk and may
+    raise to abandon the job.
+    """
+    decoder = codecs.getincrementaldecoder(src.encoding)(errors="replace")
+    pad = " " * indent
+    depth = 0
+    after_open = False  # last token was { or [; a close straight after stays on the same line
+    consumed = 0
+    buf = ""
+    src.file.seek(0)
+    while True:
+        raw = src.file.read(CHUNK)
+        eof = not raw
+        consumed += len(raw)
+        buf += decoder.decode(raw, final=eof)
+        out = []
+        pos, end = 0, len(buf)
+        while pos < end:
+            m = _TOKEN.match(buf, pos)
+            if m is None or (m.end() == end and not eof):
+                break  # unterminated string or a token that may continue in the next chunk
+            tok = m.group()
+            pos = m.end()
+            c = tok[0]
+            if c.isspace():
+                continue
+            if c in "}]":
+                depth = max(0, depth - 1)
+                if not after_open:
+                    out.append("\n" + pad * depth)
+                out.append(tok)
+                after_open = False
+                continue
+            if after_open:
+                out.append("\n" + pad * depth)
+                after_open = False
+            if c in "{[":
+                out.append(tok)
+                depth += 1
+                after_open = True
+            elif c == ",":
+                out.append(",\n" + pad * depth)
+            elif c == ":":
+                out.append(": ")
+            else:
+                out.append(tok)
+        if eof:
+            out.append(buf[pos:])  # not JSON past this point; keep it as it was
+        buf = buf[pos:]
+        dst.write("".join(out).encode("utf-8"))
+        if progress is not None:
+            progress(consumed)
+        if eof:
+            return dst